@@ -4,3 +4,24 @@ from django.apps import AppConfig
 class MyappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'myapp'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate, post_save, post_delete, pre_delete
+        from .services.search import ensure_fts_index
+        from .services import catalogue, read_models
+        post_migrate.connect(ensure_fts_index, sender=self)
+
+        # writes that bypass save() (F() updates, bulk upserts) invalidate explicitly
+        for model, receiver in (
+            ("Category", read_models.on_category_change),
+            ("Product", read_models.on_product_change),
+            ("Wallet", read_models.on_wallet_change),
+        ):
+            post_save.connect(receiver, sender=f"myapp.{model}")
+            post_delete.connect(receiver, sender=f"myapp.{model}")
+
+        # the catalogue snapshot's change log; bulk imports log their rows themselves
+        post_save.connect(catalogue.on_product_change, sender="myapp.Product")
+        post_delete.connect(catalogue.on_product_change, sender="myapp.Product")
+        post_save.connect(catalogue.on_category_change, sender="myapp.Category")
+        pre_delete.connect(catalogue.on_category_delete, sender="myapp.Category")
@@ -0,0 +1,123 @@
+"""
+Async versions of the read-heavy endpoints, routed in place of the sync
+ones when the app is served over ASGI (settings.ASYNC_API). They answer
+GET on the event loop with the async ORM; any other method on the same URL
+is handed to the sync DRF view, which keeps its own auth and CSRF checks.
+"""
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.utils.http import parse_etags
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from .pagination import KeysetPagination
+from .serializers import ProductSerializer
+from .services.cart import acart_snapshot, snapshot_etag
+from .services.read_models import product_detail, wallet_summary
+from .services.recommendation import aget_stored_recommendations, recommend_for_user
+from .views import CartViewSet, ProductDetail, ProductListCreate, get_wallet, recommend
+
+NOT_AUTHENTICATED = {"detail": "Authentication credentials were not provided."}
+
+
+def render(data, status=200, headers=None):
+    # the same bytes DRF's JSONRenderer would send from the sync view
+    return HttpResponse(JSONRenderer().render(data), status=status, content_type="application/json", headers=headers)
+
+def reads(sync_view):
+    """Serves GET/HEAD from the decorated coroutine and every other method from ``sync_view``."""
+    sync_view = sync_to_async(sync_view)
+
+    def decorator(view):
+        @csrf_exempt
+        @wraps(view)
+        async def dispatch(request, *args, **kwargs):
+            if request.method in ("GET", "HEAD"):
+                return await view(request, *args, **kwargs)
+            return await sync_view(request, *args, **kwargs)
+        return dispatch
+    return decorator
+
+def authenticated(view):
+    # Session auth only: basic auth still works on the sync views.
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return render(NOT_AUTHENTICATED, status=403)
+        return await view(request, user, *args, **kwargs)
+    return wrapper
+
+
+# ------------------------------------------
+# PRODUCTS
+# ------------------------------------------
+
+@reads(ProductListCreate.as_view())
+async def product_list(request):
+    request = Request(request)
+    # the sync view's ?fields= parsing and column pruning
+    view = ProductListCreate(request=request, format_kwarg=None)
+    paginator = KeysetPagination()
+    try:
+        fields = view.get_requested_fields()
+        page = await paginator.apaginate_queryset(view.get_queryset(), request)
+    except APIException as e:
+        # bad ?fields= or ?cursor=, answered as DRF would
+        return render(e.detail if isinstance(e.detail, (dict, list)) else {"detail": e.detail}, status=e.status_code)
+    return render({"next": paginator.get_next_link(), "results": ProductSerializer(page, many=True, fields=fields).data})
+
+@reads(ProductDetail.as_view())
+async def product(request, pk):
+    # cache first; the cache API is sync in every backend Django ships
+    data = await sync_to_async(product_detail)(pk)
+    if data is None:
+        return render({"detail": "Not found."}, status=404)
+    return render(data)
+
+
+# ------------------------------------------
+# CART, WALLET, RECOMMENDATION
+# ------------------------------------------
+
+@reads(CartViewSet.as_view({"get": "list", "post": "create"}))
+@authenticated
+async def cart(request, user):
+    snapshot = await acart_snapshot(user)
+    etag = snapshot_etag(snapshot)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if_none_match = parse_etags(request.headers.get("If-None-Match", ""))
+    if etag in if_none_match or "*" in if_none_match:
+        return HttpResponse(status=304, headers=headers)
+    return render(snapshot, headers=headers)
+
+@reads(get_wallet)
+@authenticated
+async def wallet(request, user):
+    data = await sync_to_async(wallet_summary)(user.id)
+    if data is None:
+        return render({"detail": "No wallet found"}, status=404)
+    return render(data)
+
+@reads(recommend)
+@authenticated
+async def recommendations(request, user):
+    stored = await aget_stored_recommendations(user)
+    if stored is not None:
+        return render(stored)
+    # the live fallback is a handful of aggregates; run them off the loop
+    return render(await sync_to_async(recommend_for_user)(user=user, exclude_bought=False))
+
+
+# ------------------------------------------
+# AUTH
+# ------------------------------------------
+
+async def check_auth(request):
+    user = await request.auser()
+    if user.is_authenticated:
+        return render({"authenticated": True, "username": user.username, "is_admin": user.is_staff})
+    return render({"authenticated": False})
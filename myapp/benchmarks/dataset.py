@@ -0,0 +1,149 @@
+import random
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from ..models import Address, Category, Order, OrderItem, Product, Wallet
+from ..services.purchase_history import snapshot
+from ..services.sales import record_sales, PAID
+from .utils import make_users
+
+ADJECTIVES = ["fresh", "organic", "smoked", "crunchy", "sweet", "spicy", "frozen", "dried", "whole", "salted"]
+NOUNS = [
+    "apples", "bread", "cheese", "yogurt", "salmon", "almonds", "coffee", "pasta", "tomatoes", "honey",
+    "butter", "rice", "lentils", "spinach", "chocolate", "olives", "granola", "tea", "mushrooms", "berries",
+]
+BATCH_SIZE = 5000
+
+
+class Dataset:
+    """Rows made by ``seed``: customers with a wallet and an address, an admin, and the catalogue."""
+
+    def __init__(self, prefix, users, admin, addresses, categories, products):
+        self.prefix = prefix
+        self.users = users
+        self.admin = admin
+        self.addresses = addresses  # {user id: address id}
+        self.categories = categories
+        self.products = products
+
+    def delete(self):
+        users = [u.pk for u in self.users] + ([self.admin.pk] if self.admin else [])
+        # items, then orders, as bulk deletes; cascading from the users would load every order
+        OrderItem.objects.filter(order__user__in=users).delete()
+        Order.objects.filter(user__in=users).delete()
+        # users take their carts, wallets and addresses with them
+        Product.objects.filter(pk__in=[p.pk for p in self.products]).delete()
+        Category.objects.filter(pk__in=[c.pk for c in self.categories]).delete()
+        User.objects.filter(pk__in=users).delete()
+
+
+def seed(prefix, users=20, products=500, categories=20, orders=2000, items=3, rng=None):
+    """
+    Generates a shop at the given scale under ``prefix``: paid orders spread
+    over the past 90 days (rolled up like checkout would), wallets with
+    enough balance to pay for every checkout a run makes, and effectively
+    unlimited stock.
+    """
+    rng = rng or random.Random(0)
+    customers = make_users(prefix, users)
+    admin = User.objects.create_user(username=f"{prefix}-admin", is_staff=True)
+    Wallet.objects.bulk_create([
+        Wallet(user=u, balance=Decimal("1000000"), wallet_address=f"{prefix}-{u.pk}") for u in customers
+    ])
+    addresses = Address.objects.bulk_create([
+        Address(user=u, line1=f"{i} Jalan Bench", city="KL", state="WP", postal_code="50000", phone="0123")
+        for i, u in enumerate(customers)
+    ])
+
+    category_rows = Category.objects.bulk_create([Category(name=f"{prefix} {i}") for i in range(categories)])
+    product_rows = []
+    for start in range(0, products, BATCH_SIZE):
+        product_rows += Product.objects.bulk_create([
+            Product(
+                name=f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {prefix}-{i}",
+                category=rng.choice(category_rows), price=Decimal(rng.randint(100, 3000)) / 100, stock=10_000_000,
+            )
+            for i in range(start, min(start + BATCH_SIZE, products))
+        ])
+
+    for start in range(0, orders, BATCH_SIZE):
+        make_orders(rng, customers, product_rows, min(BATCH_SIZE, orders - start), items)
+
+    return Dataset(prefix, customers, admin, {a.user_id: a.pk for a in addresses}, category_rows, product_rows)
+
+@transaction.atomic
+def make_orders(rng, users, products, count, items):
+    now = timezone.now()
+    baskets = [
+        [(p, rng.randint(1, 4)) for p in rng.sample(products, min(len(products), rng.randint(1, 2 * items - 1)))]
+        for _ in range(count)
+    ]
+    orders = Order.objects.bulk_create([
+        Order(
+            user=rng.choice(users), total_amount=sum(q * p.price for p, q in basket),
+            status="delivered", payment_status=PAID,
+        )
+        for basket in baskets
+    ])
+
+    lines, by_day, sales = [], defaultdict(list), defaultdict(list)
+    for order, basket in zip(orders, baskets):
+        day = rng.randrange(90)
+        by_day[day].append(order.pk)
+        for product, quantity in basket:
+            lines.append(OrderItem(
+                order=order, product=product, product_name=product.name, unit_price=product.price,
+                quantity=quantity, subtotal=quantity * product.price, **snapshot(order, product),
+            ))
+            sales[day].append((product.pk, product.category_id, quantity, quantity * product.price))
+    OrderItem.objects.bulk_create(lines, batch_size=BATCH_SIZE)
+
+    for day, ids in by_day.items():
+        created_at = now - timedelta(days=day)
+        Order.objects.filter(pk__in=ids).update(created_at=created_at)
+        OrderItem.objects.filter(order_id__in=ids).update(created_at=created_at)
+        record_sales(timezone.localdate(created_at), sales[day])
+
+
+def seed_history(prefix, order_items=1_000_000, items=3, users=5000, products=5000, categories=50, days=730, rng=None):
+    """
+    A long paid-order history alone, for the index and purchase-history
+    benchmarks: ``order_items`` items in orders of ``items`` spread over the
+    past ``days``, and a quarter of the catalogue out of stock. No
+    addresses, wallets or rollups, and no admin.
+    """
+    rng = rng or random.Random(0)
+    customers = make_users(prefix, users)
+    category_rows = Category.objects.bulk_create([Category(name=f"{prefix} {i}") for i in range(categories)])
+    product_rows = Product.objects.bulk_create([
+        Product(
+            name=f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {prefix}-{i}", category=rng.choice(category_rows),
+            price=Decimal(rng.randint(100, 3000)) / 100, stock=0 if rng.random() < 0.25 else 100,
+        )
+        for i in range(products)
+    ], batch_size=BATCH_SIZE)
+
+    now = timezone.now()
+    orders = order_items // items
+    for start in range(0, orders, BATCH_SIZE):
+        with transaction.atomic():
+            chunk = Order.objects.bulk_create([
+                Order(user=rng.choice(customers), total_amount=Decimal("20.00"), status="delivered", payment_status=PAID)
+                for _ in range(start, min(start + BATCH_SIZE, orders))
+            ])
+            # auto_now_add overrides created_at on create, so it is set afterwards, on both tables
+            for order in chunk:
+                order.created_at = now - timedelta(days=rng.uniform(0, days))
+            Order.objects.bulk_update(chunk, ["created_at"])
+            OrderItem.objects.bulk_create([
+                OrderItem(
+                    order=order, product=product, product_name=product.name, unit_price=product.price,
+                    quantity=rng.randint(1, 3), subtotal=product.price, **snapshot(order, product),
+                )
+                for order in chunk for product in rng.sample(product_rows, items)
+            ])
+
+    return Dataset(prefix, customers, None, {}, category_rows, product_rows)
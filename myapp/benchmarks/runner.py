@@ -0,0 +1,188 @@
+import json
+import random
+import subprocess
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+from django.conf import settings
+from django.db import connection
+from django.middleware.csrf import get_token
+from django.test import Client, RequestFactory
+from django.utils import timezone
+from .utils import count_queries, percentile
+
+
+class Recorder:
+    """(seconds, queries, status) per endpoint label; safe to share between threads."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.lock = threading.Lock()
+
+    def add(self, label, seconds, queries, status):
+        with self.lock:
+            self.samples[label].append((seconds, queries, status))
+
+    def clear(self):
+        with self.lock:
+            self.samples.clear()
+
+    def summary(self, elapsed):
+        endpoints = {}
+        for label, samples in sorted(self.samples.items()):
+            ms = [s * 1000 for s, _, _ in samples]
+            queries = [q for _, q, _ in samples if q is not None]
+            endpoints[label] = {
+                "requests": len(samples),
+                "errors": sum(status >= 400 for _, _, status in samples),
+                "rps": round(len(samples) / elapsed, 2),
+                "p50_ms": round(percentile(ms, 50), 2),
+                "p95_ms": round(percentile(ms, 95), 2),
+                "p99_ms": round(percentile(ms, 99), 2),
+                # None against a live server, whose queries cannot be seen from here
+                "queries_mean": round(sum(queries) / len(queries), 2) if queries else None,
+                "queries_max": max(queries) if queries else None,
+            }
+        return endpoints
+
+
+class InProcessClient:
+    """Django's test client logged in as ``user``; every request also counts its queries."""
+
+    def __init__(self, user, recorder):
+        self.user = user
+        self.recorder = recorder
+        self.client = Client(HTTP_HOST="localhost")
+        self.client.force_login(user)
+
+    def call(self, label, method, path, data=None):
+        with count_queries() as queries:
+            started = time.perf_counter()
+            if method == "GET":
+                response = self.client.get(path)
+            else:
+                response = self.client.generic(method, path, json.dumps(data), content_type="application/json")
+            seconds = time.perf_counter() - started
+        self.recorder.add(label, seconds, queries[0], response.status_code)
+        return response
+
+
+class LiveClient:
+    """An HTTP session against a running server that serves the same database, logged in as ``user``."""
+
+    def __init__(self, user, recorder, base_url):
+        self.user = user
+        self.recorder = recorder
+        login = Client()
+        login.force_login(user)
+        # session auth on unsafe methods wants a CSRF cookie and the matching header
+        request = RequestFactory().get("/")
+        token = get_token(request)
+        self.http = httpx.Client(
+            base_url=base_url, timeout=60, headers={"X-CSRFToken": token},
+            cookies={
+                settings.SESSION_COOKIE_NAME: login.cookies[settings.SESSION_COOKIE_NAME].value,
+                settings.CSRF_COOKIE_NAME: request.META["CSRF_COOKIE"],
+            },
+        )
+
+    def call(self, label, method, path, data=None):
+        started = time.perf_counter()
+        try:
+            status = self.http.request(method, path, json=data).status_code
+        except httpx.HTTPError:
+            status = 599
+        self.recorder.add(label, time.perf_counter() - started, None, status)
+
+
+def run(data, scenarios, iterations, make_client, concurrency=1, seed=0):
+    """
+    Each iteration, every seeded customer runs each scenario once, admin
+    scenarios as the admin. Customers are spread over ``concurrency``
+    threads and each one's requests stay in order. Returns seconds taken.
+    """
+    def journey(customer):
+        rng = random.Random(seed * 100_003 + customer.pk)
+        for _ in range(iterations):
+            for scenario, as_admin in scenarios:
+                scenario(clients[data.admin.pk if as_admin else customer.pk], data, rng)
+
+    # log everybody in up front, so the timed part is requests only
+    clients = {user.pk: make_client(user) for user in [*data.users, data.admin]}
+
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(journey, data.users))
+    else:
+        for customer in data.users:
+            journey(customer)
+    return time.perf_counter() - started
+
+
+# ------------------------------------------
+# RESULTS
+# ------------------------------------------
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def results(recorder, elapsed, **meta):
+    endpoints = recorder.summary(elapsed)
+    total = sum(e["requests"] for e in endpoints.values())
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "created_at": timezone.now().isoformat(),
+            "database": connection.vendor,
+            "seconds": round(elapsed, 3),
+            "requests": total,
+            "rps": round(total / elapsed, 2),
+            **meta,
+        },
+        "endpoints": endpoints,
+    }
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+def save_results(doc, path):
+    with open(path, "w") as f:
+        json.dump(doc, f, indent=2, sort_keys=True)
+
+def check(current, baseline=None, max_regression=None, max_query_increase=None, max_p95_ms=None, max_queries=None):
+    """
+    Threshold failures as messages: any errors, p95 over ``max_p95_ms``,
+    mean queries over ``max_queries`` and, against a baseline, p95 more than
+    ``max_regression`` (a fraction) slower or mean queries more than
+    ``max_query_increase`` higher. Endpoints new since the baseline only
+    face the absolute limits.
+    """
+    failures = []
+    for label, now in current["endpoints"].items():
+        if now["errors"]:
+            failures.append(f"{label}: {now['errors']} of {now['requests']} requests failed")
+        if max_p95_ms is not None and now["p95_ms"] > max_p95_ms:
+            failures.append(f"{label}: p95 {now['p95_ms']} ms over {max_p95_ms} ms")
+        if max_queries is not None and (now["queries_mean"] or 0) > max_queries:
+            failures.append(f"{label}: {now['queries_mean']} queries per request over {max_queries}")
+
+        before = (baseline or {}).get("endpoints", {}).get(label)
+        if before is None:
+            continue
+        if max_regression is not None and now["p95_ms"] > before["p95_ms"] * (1 + max_regression):
+            failures.append(f"{label}: p95 {before['p95_ms']} -> {now['p95_ms']} ms")
+        if (
+            max_query_increase is not None and None not in (now["queries_mean"], before["queries_mean"])
+            and now["queries_mean"] > before["queries_mean"] + max_query_increase
+        ):
+            failures.append(f"{label}: queries per request {before['queries_mean']} -> {now['queries_mean']}")
+    return failures
@@ -0,0 +1,54 @@
+"""
+User journeys the API benchmark replays. Each scenario takes a client for
+one user, the seeded Dataset and a Random, and makes its requests through
+``client.call(label, method, path, data)``; the label names the endpoint in
+the results, so requests to different ids of one route add up together.
+"""
+from .dataset import NOUNS
+
+
+def browse(client, data, rng):
+    product = rng.choice(data.products)
+    client.call("GET /api/catalogue/", "GET", "/api/catalogue/")
+    client.call("GET /api/categories/", "GET", "/api/categories/")
+    client.call("GET /api/products/", "GET", "/api/products/?page_size=50")
+    client.call("GET /api/products/search/", "GET", f"/api/products/search/?q={rng.choice(NOUNS)}")
+    client.call("GET /api/products/<pk>/", "GET", f"/api/products/{product.pk}/")
+    client.call("GET /api/products/<pk>/related/", "GET", f"/api/products/{product.pk}/related/")
+
+def add_to_cart(client, data, rng):
+    for product in rng.sample(data.products, 3):
+        client.call("POST /api/cart/", "POST", "/api/cart/", {"product_id": product.pk, "quantity": 1})
+    client.call("GET /api/cart/", "GET", "/api/cart/")
+
+def checkout(payment):
+    def scenario(client, data, rng):
+        lines = [{"product_id": p.pk, "quantity": rng.randint(1, 3)} for p in rng.sample(data.products, 4)]
+        client.call("PUT /api/cart/sync/", "PUT", "/api/cart/sync/", {"items": lines})
+        client.call(
+            f"POST /api/orders/place/ ({payment})", "POST", "/api/orders/place/",
+            {"address_id": data.addresses[client.user.pk], "payment": payment},
+        )
+        client.call("GET /api/orders/", "GET", "/api/orders/")
+    return scenario
+
+def recommendation(client, data, rng):
+    client.call("GET /api/recommendation/", "GET", "/api/recommendation/")
+    client.call("GET /api/wallet/", "GET", "/api/wallet/")
+    client.call("GET /api/check-auth/", "GET", "/api/check-auth/")
+
+def admin_reports(client, data, rng):
+    client.call("GET /api/admin/reports/sales/", "GET", "/api/admin/reports/sales/?group_by=category&period=week")
+    client.call("GET /api/admin/reports/sales/ (products)", "GET", "/api/admin/reports/sales/")
+    client.call("GET /api/admin/orders/", "GET", "/api/admin/orders/?page_size=50")
+
+
+SCENARIOS = {
+    # name: (scenario, runs as the admin)
+    "browse": (browse, False),
+    "add_to_cart": (add_to_cart, False),
+    "checkout_wallet": (checkout("wallet"), False),
+    "checkout_paypal": (checkout("paypal"), False),
+    "recommendation": (recommendation, False),
+    "admin_reports": (admin_reports, True),
+}
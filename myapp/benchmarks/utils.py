@@ -0,0 +1,52 @@
+import math
+import resource
+import sys
+import uuid
+from contextlib import contextmanager
+from django.db import connection
+from django.contrib.auth.models import User
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[k]
+
+def peak_memory_mb(children=False):
+    if not children:
+        # ru_maxrss survives fork+exec, so a command started by a large parent
+        # would report the parent's size; Linux's VmHWM starts fresh at exec.
+        try:
+            with open("/proc/self/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            pass
+
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes everywhere else
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def bench_prefix():
+    return f"bench-{uuid.uuid4().hex[:8]}"
+
+def make_users(prefix, n):
+    return User.objects.bulk_create([User(username=f"{prefix}-{i}") for i in range(n)])
+
+@contextmanager
+def count_queries():
+    """
+    Counts statements run inside the block. Unlike CaptureQueriesContext it
+    has no cap, so it stays right for listings that issue thousands.
+    """
+    counter = [0]
+
+    def wrapper(execute, sql, params, many, context):
+        counter[0] += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(wrapper):
+        yield counter
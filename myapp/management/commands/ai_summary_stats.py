@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from myapp.models import AISummaryCache, AISummaryJob
+from myapp.services.ai_cache import summary_cache_stats, SUMMARY_VERSION
+
+
+class Command(BaseCommand):
+    help = (
+        "Report the AI summary cache per prompt/model version: model calls made, calls saved "
+        "and hit rate, plus the job queue by status."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--prune-stale", action="store_true", help="delete entries from old prompt/model versions")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'version':<18}  {'model calls':>11}  {'calls saved':>11}  {'hit rate':>8}")
+        for row in summary_cache_stats():
+            marker = " (current)" if row["current"] else ""
+            self.stdout.write(
+                f"{row['version']:<18}  {row['model_calls']:>11}  {row['calls_saved']:>11}  "
+                f"{row['hit_rate']:>8.1%}{marker}"
+            )
+
+        queue = dict(AISummaryJob.objects.values_list("status").annotate(n=Count("id")))
+        self.stdout.write("Queue: " + ", ".join(f"{status} {queue.get(status, 0)}" for status, _ in AISummaryJob.STATUS_CHOICES))
+
+        if options["prune_stale"]:
+            deleted, _ = AISummaryCache.objects.exclude(version=SUMMARY_VERSION).delete()
+            self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} entries from old versions"))
@@ -0,0 +1,69 @@
+import random
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from myapp.benchmarks.dataset import seed
+from myapp.benchmarks.plans import LabelledClient, QueryLog, explain, service_lookups
+from myapp.benchmarks.runner import Recorder, run
+from myapp.benchmarks.scenarios import SCENARIOS
+from myapp.benchmarks.utils import bench_prefix
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a small shop, replay the API benchmark scenarios and the recommendation lookups, "
+        "and EXPLAIN every distinct statement they ran (SQLite or PostgreSQL). Lists the "
+        "statements that read a table by full scan; ones that ask for every row (no WHERE, no "
+        "LIMIT) are expected and only shown with --all. With --strict, exits non-zero on any "
+        "other scan of a table not given to --allow. Creates its own rows and removes them afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=5)
+        parser.add_argument("--products", type=int, default=200)
+        parser.add_argument("--orders", type=int, default=500)
+        parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+        parser.add_argument("--allow", default="", help="comma-separated tables whose scans are accepted")
+        parser.add_argument("--all", action="store_true", help="print every statement with its plan")
+        parser.add_argument("--strict", action="store_true")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        names = options["scenarios"].split(",")
+        unknown = set(names) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenario: {', '.join(sorted(unknown))}")
+        if connection.vendor not in ("sqlite", "postgresql"):
+            raise CommandError(f"Plans can only be read on SQLite and PostgreSQL, not {connection.vendor}")
+        allowed = set(filter(None, options["allow"].split(",")))
+
+        log = QueryLog()
+        scale = {k: options[k] for k in ("users", "products", "orders")}
+        data = seed(bench_prefix(), rng=random.Random(options["seed"]), **scale)
+        try:
+            with connection.execute_wrapper(log):
+                run(data, [SCENARIOS[name] for name in names], 1, lambda user: LabelledClient(user, Recorder(), log))
+                for label, lookup in service_lookups(data):
+                    log.source = label
+                    lookup()
+            # planned while the seeded rows are still there
+            statements = [explain(statement) for statement in log.statements.values()]
+        finally:
+            data.delete()
+
+        flagged = 0
+        for statement in statements:
+            missed = [t for t in statement.scans if t not in allowed]
+            if missed and not statement.whole_table:
+                flagged += 1
+            elif not options["all"]:
+                continue
+            tag = f"SCAN {', '.join(statement.scans)}" if statement.scans else "indexed"
+            self.stdout.write(f"{tag}  x{statement.count}  {statement.source}")
+            self.stdout.write(f"    {statement.sql}")
+            for line in statement.plan:
+                self.stdout.write(f"      {line}")
+
+        summary = f"{len(statements)} distinct statements, {flagged} with a full table scan"
+        if flagged and options["strict"]:
+            raise CommandError(summary)
+        self.stdout.write(self.style.WARNING(summary) if flagged else self.style.SUCCESS(summary))
@@ -0,0 +1,24 @@
+import time
+from django.core.management.base import BaseCommand
+from myapp.services.purchase_history import backfill
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy each order's user and time, and the product's category, onto OrderItems that "
+        "lack them or disagree with their order, one pk range per transaction. Run it once "
+        "after migrating to 0019; it is safe to interrupt and rerun."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        updated = backfill(
+            options["chunk_size"],
+            progress=lambda upto, n: self.stderr.write(f"  through item #{upto}: {n} updated"),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Updated {updated} order items in {time.perf_counter() - started:.1f}s"
+        ))
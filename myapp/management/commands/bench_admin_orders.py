@@ -0,0 +1,127 @@
+import random
+import statistics
+import time
+import tracemalloc
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIRequestFactory, force_authenticate
+from myapp.benchmarks.utils import bench_prefix, count_queries, make_users
+from myapp.models import Address, Order, OrderItem, Product
+from myapp.pagination import KeysetPagination
+from myapp.serializers import OrderSerializer
+from myapp.services.orders import admin_orders, export_orders
+from myapp.services.purchase_history import snapshot
+from myapp.views import admin_order_list
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the admin order list on order tables of growing size: first page, a filtered "
+        "page, a deep page, the NDJSON export with its peak Python allocation, and the old "
+        "unpaginated listing. Creates its own users, orders and products and removes them afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="1000,10000,100000")
+        parser.add_argument("--items", type=int, default=3, help="items per order")
+        parser.add_argument("--repeat", type=int, default=10)
+        parser.add_argument("--full-list-max", type=int, default=10000, help="skip the unpaginated listing above this size")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        prefix = bench_prefix()
+        users = make_users(prefix, 200)
+        admin = users[0]
+        admin.is_staff = True
+        addresses = Address.objects.bulk_create([
+            Address(user=u, line1="1 Jalan", city="KL", state="WP", postal_code="50000", phone="0123") for u in users
+        ])
+        products = Product.objects.bulk_create([
+            Product(name=f"{prefix} product {i}", price=Decimal(rng.randint(100, 2000)) / 100, stock=100)
+            for i in range(500)
+        ])
+        factory = APIRequestFactory()
+
+        def get(query=""):
+            request = factory.get(f"/api/admin/orders/{query}", HTTP_HOST="localhost")
+            force_authenticate(request, admin)
+            response = admin_order_list(request)
+            response.render()
+            return response
+
+        self.stdout.write(
+            f"{'orders':>8}  {'first ms':>9}  {'filtered ms':>11}  {'deep ms':>8}  {'queries':>7}  "
+            f"{'export rows/s':>13}  {'export peak MB':>14}  {'full list ms':>12}  {'full queries':>12}"
+        )
+        try:
+            created = 0
+            for size in [int(s) for s in options["sizes"].split(",")]:
+                self.create_orders(rng, users, addresses, products, created, size, options["items"])
+                created = size
+
+                ordered = Order.objects.filter(user__in=users).order_by("-created_at", "-id")
+                deep = KeysetPagination.encode_cursor(ordered[max(0, size - KeysetPagination.page_size - 1)])
+                with count_queries() as queries:
+                    get()
+
+                timings = [
+                    self.median_ms(options["repeat"], lambda: get()),
+                    self.median_ms(options["repeat"], lambda: get("?status=shipped&payment_status=paid")),
+                    self.median_ms(options["repeat"], lambda: get(f"?cursor={deep}")),
+                ]
+
+                tracemalloc.start()
+                started = time.perf_counter()
+                for _ in export_orders(admin_orders().filter(user__in=users)):
+                    pass
+                elapsed = time.perf_counter() - started
+                export_peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+                tracemalloc.stop()
+
+                if size <= options["full_list_max"]:
+                    with count_queries() as full_queries:
+                        started = time.perf_counter()
+                        OrderSerializer(Order.objects.filter(user__in=users).order_by("-created_at"), many=True).data
+                        full_ms = (time.perf_counter() - started) * 1000
+                    full = f"{full_ms:>12.1f}  {full_queries[0]:>12}"
+                else:
+                    full = f"{'-':>12}  {'-':>12}"
+
+                self.stdout.write(
+                    f"{size:>8}  {timings[0]:>9.2f}  {timings[1]:>11.2f}  {timings[2]:>8.2f}  "
+                    f"{queries[0]:>7}  {size / elapsed:>13.0f}  {export_peak:>14.1f}  {full}"
+                )
+        finally:
+            Order.objects.filter(user__in=users).delete()
+            Product.objects.filter(pk__in=[p.pk for p in products]).delete()
+            for user in users:
+                user.delete()
+
+    def create_orders(self, rng, users, addresses, products, start, stop, items):
+        statuses = [s for s, _ in Order.STATUS_CHOICES]
+        payments = [s for s, _ in Order.PAYMENT_STATUS]
+        for chunk in range(start, stop, 5000):
+            orders = []
+            for _ in range(chunk, min(chunk + 5000, stop)):
+                i = rng.randrange(len(users))
+                orders.append(Order(
+                    user=users[i], address=addresses[i], total_amount=Decimal("20.00"),
+                    status=rng.choice(statuses), payment_status=rng.choice(payments),
+                ))
+            orders = Order.objects.bulk_create(orders)
+            OrderItem.objects.bulk_create([
+                OrderItem(
+                    order=order, product=product, product_name=product.name, unit_price=product.price,
+                    quantity=1, subtotal=product.price, **snapshot(order, product),
+                )
+                for order in orders for product in rng.sample(products, items)
+            ], batch_size=5000)
+
+    def median_ms(self, repeat, fn):
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - started)
+        return statistics.median(samples) * 1000
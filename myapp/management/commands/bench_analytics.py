@@ -0,0 +1,144 @@
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from myapp.benchmarks.utils import bench_prefix, make_users
+from myapp.models import Category, Order, OrderItem, Product
+from myapp.services.analytics import OrderHistory, export_order_history, reset_order_history
+from myapp.services.purchase_history import snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the offline order-history queries (revenue by month, basket sizes, category mix) "
+        "against the same aggregations through the ORM, on generated history of growing size. "
+        "Both sides read every order in the database, so run it against a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="10000,100000", help="orders, ascending")
+        parser.add_argument("--items", type=int, default=3, help="average lines per order")
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        prefix = bench_prefix()
+        users = make_users(prefix, 100)
+        categories = Category.objects.bulk_create([Category(name=f"{prefix} {i}") for i in range(20)])
+        products = Product.objects.bulk_create([
+            Product(
+                name=f"{prefix} product {i}", category=rng.choice(categories),
+                price=Decimal(rng.randint(100, 2000)) / 100, stock=100,
+            )
+            for i in range(1000)
+        ])
+        root = tempfile.mkdtemp(prefix="analytics-")
+        history = OrderHistory(root)
+        queries = {
+            "revenue/month": (lambda: history.revenue_by_period("month"), self.orm_revenue_by_month),
+            "basket sizes": (history.basket_sizes, self.orm_basket_sizes),
+            "category mix": (lambda: self.mix(history.category_mix()), self.orm_category_mix),
+        }
+
+        self.stdout.write(
+            f"{'orders':>8}  {'lines':>8}  {'export s':>8}  {'query':<14}  {'files ms':>9}  {'orm ms':>9}  {'speedup':>7}"
+        )
+        try:
+            created = 0
+            for size in [int(s) for s in options["sizes"].split(",")]:
+                self.create_orders(rng, users, products, size - created, options["items"])
+                created = size
+
+                # Generated orders are backdated behind the last watermark, so export from scratch.
+                reset_order_history(root, watermark=prefix)
+                started = time.perf_counter()
+                lines = export_order_history(root, settle=timedelta(0), watermark=prefix)[0]
+                export_s = f"{time.perf_counter() - started:.1f}"
+
+                for name, (offline, orm) in queries.items():
+                    if offline() != orm():
+                        raise CommandError(f"{name}: columnar result differs from the ORM")
+                    files_ms = self.median_ms(options["repeat"], offline)
+                    orm_ms = self.median_ms(options["repeat"], orm)
+                    self.stdout.write(
+                        f"{size:>8}  {lines:>8}  {export_s:>8}  {name:<14}  {files_ms:>9.1f}  "
+                        f"{orm_ms:>9.1f}  {orm_ms / files_ms:>6.1f}x"
+                    )
+                    lines = export_s = ""
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+            reset_order_history(root, watermark=prefix)
+            Order.objects.filter(user__in=users).delete()
+            Product.objects.filter(pk__in=[p.pk for p in products]).delete()
+            Category.objects.filter(pk__in=[c.pk for c in categories]).delete()
+            for user in users:
+                user.delete()
+
+    def create_orders(self, rng, users, products, count, items):
+        # Spread over the past year, oldest first, so exports cover many month partitions.
+        now = timezone.now() - timedelta(hours=1)
+        for chunk in range(0, count, 5000):
+            orders = Order.objects.bulk_create([
+                Order(user=rng.choice(users), total_amount=0, payment_status=rng.choice(["paid", "paid", "unpaid"]))
+                for _ in range(min(5000, count - chunk))
+            ])
+            by_day = defaultdict(list)
+            for order in orders:
+                by_day[rng.randrange(365)].append(order)
+            for days_ago, day_orders in by_day.items():
+                created_at = now - timedelta(days=days_ago)
+                Order.objects.filter(pk__in=[o.pk for o in day_orders]).update(created_at=created_at)
+                for order in day_orders:
+                    order.created_at = created_at  # for the items' copy
+
+            OrderItem.objects.bulk_create([
+                OrderItem(
+                    order=order, product=product, product_name=product.name, unit_price=product.price,
+                    quantity=rng.randint(1, 4), subtotal=product.price, **snapshot(order, product),
+                )
+                for order in orders for product in rng.sample(products, rng.randint(1, 2 * items - 1))
+            ], batch_size=5000)
+
+    def orm_revenue_by_month(self):
+        rows = (
+            OrderItem.objects
+            .filter(order__payment_status="paid")
+            .annotate(period=TruncMonth("order__created_at"))
+            .values("period")
+            .annotate(qty=Sum("quantity"), revenue=Sum(F("quantity") * F("unit_price")))
+            .order_by("period")
+        )
+        return [(r["period"].date(), r["qty"], Decimal(r["revenue"]).quantize(Decimal("0.01"))) for r in rows]
+
+    def orm_basket_sizes(self):
+        sizes = Order.objects.filter(payment_status="paid").annotate(n=Count("items")).filter(n__gt=0)
+        return dict(sorted(Counter(sizes.values_list("n", flat=True)).items()))
+
+    def orm_category_mix(self):
+        rows = (
+            OrderItem.objects
+            .filter(order__payment_status="paid")
+            .values("product__category_id")
+            .annotate(revenue=Sum(F("quantity") * F("unit_price")))
+        )
+        return {r["product__category_id"]: Decimal(r["revenue"]).quantize(Decimal("0.01")) for r in rows}
+
+    def mix(self, rows):
+        return {r["category_id"]: r["revenue"] for r in rows}
+
+    def median_ms(self, repeat, fn):
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - started)
+        return statistics.median(samples) * 1000
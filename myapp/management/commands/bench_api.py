@@ -0,0 +1,104 @@
+import random
+from django.core.management.base import BaseCommand, CommandError
+from myapp.benchmarks.dataset import seed
+from myapp.benchmarks.runner import (
+    InProcessClient, LiveClient, Recorder, check, load_results, results, run, save_results,
+)
+from myapp.benchmarks.scenarios import SCENARIOS
+from myapp.benchmarks.utils import bench_prefix
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a shop at the given scale and replay user journeys (browse, add to cart, "
+        "checkout by wallet and by PayPal, recommendations, admin reports) through Django's "
+        "test client, or against a running server with --base-url. Reports requests per "
+        "second, p50/p95/p99 latency and queries per request for every endpoint, saves "
+        "them as JSON with --output, and with --baseline or any --max-* limit fails when a "
+        "threshold is crossed. Creates its own rows and removes them afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=20)
+        parser.add_argument("--products", type=int, default=500)
+        parser.add_argument("--categories", type=int, default=20)
+        parser.add_argument("--orders", type=int, default=2000, help="order history to seed")
+        parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+        parser.add_argument("--iterations", type=int, default=3, help="runs of every scenario per user")
+        parser.add_argument("--warmup", type=int, default=1, help="untimed iterations first")
+        parser.add_argument("--base-url", help="a server on the same database, e.g. http://127.0.0.1:8000")
+        parser.add_argument("--concurrency", type=int, default=1, help="users in parallel (--base-url only)")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="write the results here as JSON")
+        parser.add_argument("--baseline", help="results JSON from an earlier run to compare with")
+        parser.add_argument("--max-regression", type=float, default=25.0, help="allowed p95 slowdown, percent")
+        parser.add_argument("--max-query-increase", type=float, default=0.5, help="allowed rise in mean queries")
+        parser.add_argument("--max-p95-ms", type=float)
+        parser.add_argument("--max-queries", type=float, help="mean queries per request, any endpoint")
+
+    def handle(self, *args, **options):
+        names = options["scenarios"].split(",")
+        unknown = set(names) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenario: {', '.join(sorted(unknown))}")
+        if options["concurrency"] > 1 and not options["base_url"]:
+            raise CommandError("--concurrency needs --base-url; the test client runs one request at a time")
+        baseline = load_results(options["baseline"]) if options["baseline"] else None
+        scenarios = [SCENARIOS[name] for name in names]
+
+        recorder = Recorder()
+        if options["base_url"]:
+            make_client = lambda user: LiveClient(user, recorder, options["base_url"].rstrip("/"))
+        else:
+            make_client = lambda user: InProcessClient(user, recorder)
+
+        scale = {k: options[k] for k in ("users", "products", "categories", "orders")}
+        data = seed(bench_prefix(), rng=random.Random(options["seed"]), **scale)
+        try:
+            if options["warmup"]:
+                run(data, scenarios, options["warmup"], make_client, options["concurrency"], options["seed"])
+                recorder.clear()
+            elapsed = run(data, scenarios, options["iterations"], make_client, options["concurrency"], options["seed"])
+        finally:
+            data.delete()
+
+        doc = results(
+            recorder, elapsed, scale=scale, scenarios=names, iterations=options["iterations"],
+            transport=options["base_url"] or "test client", concurrency=options["concurrency"],
+        )
+        self.report(doc, baseline)
+        if options["output"]:
+            save_results(doc, options["output"])
+            self.stderr.write(f"Results written to {options['output']}")
+
+        limits = (baseline, options["max_p95_ms"], options["max_queries"])
+        if any(limit is not None for limit in limits):
+            failures = check(
+                doc, baseline, options["max_regression"] / 100, options["max_query_increase"],
+                options["max_p95_ms"], options["max_queries"],
+            )
+            for failure in failures:
+                self.stderr.write(f"FAIL {failure}")
+            if failures:
+                raise CommandError(f"{len(failures)} threshold(s) crossed")
+            self.stderr.write("All thresholds met")
+
+    def report(self, doc, baseline):
+        before = (baseline or {}).get("endpoints", {})
+        self.stdout.write(
+            f"{'endpoint':<42}  {'reqs':>5}  {'req/s':>7}  {'p50 ms':>7}  {'p95 ms':>7}  {'p99 ms':>7}  "
+            f"{'queries':>7}  {'errors':>6}" + (f"  {'base p95':>8}  {'change':>7}" if baseline else "")
+        )
+        for label, e in doc["endpoints"].items():
+            queries = "-" if e["queries_mean"] is None else f"{e['queries_mean']:g}"
+            line = (
+                f"{label[:42]:<42}  {e['requests']:>5}  {e['rps']:>7.1f}  {e['p50_ms']:>7.1f}  {e['p95_ms']:>7.1f}  "
+                f"{e['p99_ms']:>7.1f}  {queries:>7}  {e['errors']:>6}"
+            )
+            if label in before:
+                old = before[label]["p95_ms"]
+                line += f"  {old:>8.1f}  {(e['p95_ms'] - old) / old * 100 if old else 0:>+6.0f}%"
+            self.stdout.write(line)
+
+        meta = doc["meta"]
+        self.stdout.write(f"{meta['requests']} requests in {meta['seconds']}s ({meta['rps']} req/s) at {meta['commit']}")
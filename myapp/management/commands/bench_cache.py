@@ -0,0 +1,83 @@
+import statistics
+import time
+from decimal import Decimal
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from myapp.benchmarks.utils import bench_prefix, count_queries, make_users
+from myapp.models import CartItem, Category, Product, Wallet
+
+SETUPS = {
+    # name: (session engine, clear the cache before every request)
+    "db sessions, no cache": ("django.contrib.sessions.backends.db", True),
+    "cached sessions + reads": ("django.contrib.sessions.backends.cached_db", False),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Count database queries and time per request for the hot authenticated endpoints, "
+        "with database sessions and a cold cache against cached sessions and cached read "
+        "models. Creates its own user, wallet and products and removes them afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=50)
+        parser.add_argument("--categories", type=int, default=30)
+
+    def handle(self, *args, **options):
+        prefix = bench_prefix()
+        user, = make_users(prefix, 1)
+        Wallet.objects.create(user=user, balance=Decimal("50.00"), wallet_address=f"{prefix}-wallet")
+        categories = Category.objects.bulk_create([
+            Category(name=f"{prefix} {i}") for i in range(options["categories"])
+        ])
+        products = Product.objects.bulk_create([
+            Product(name=f"{prefix} product {i}", category=categories[i % len(categories)], price=Decimal("2.50"), stock=50)
+            for i in range(10)
+        ])
+        CartItem.objects.bulk_create([CartItem(user=user, product=p, quantity=1) for p in products[:5]])
+        endpoints = {
+            "check-auth": "/api/check-auth/",
+            "categories": "/api/categories/",
+            "product detail": f"/api/products/{products[0].pk}/",
+            "wallet": "/api/wallet/",
+            "cart": "/api/cart/",
+        }
+
+        results = {}
+        try:
+            for setup, (engine, cold) in SETUPS.items():
+                with override_settings(SESSION_ENGINE=engine):
+                    # a fresh client builds its middleware, and so its session store, under the override
+                    client = Client(HTTP_HOST="localhost")
+                    client.force_login(user)
+                    for name, url in endpoints.items():
+                        results[setup, name] = self.measure(client, url, options["repeat"], cold)
+        finally:
+            cache.clear()
+            Product.objects.filter(pk__in=[p.pk for p in products]).delete()
+            Category.objects.filter(pk__in=[c.pk for c in categories]).delete()
+            user.delete()
+
+        before, after = SETUPS
+        self.stdout.write(f"{'endpoint':<15}  {'queries':>7}  {'cached':>6}  {'ms':>7}  {'cached ms':>9}")
+        for name in endpoints:
+            (q0, ms0), (q1, ms1) = results[before, name], results[after, name]
+            self.stdout.write(f"{name:<15}  {q0:>7}  {q1:>6}  {ms0:>7.2f}  {ms1:>9.2f}")
+
+    def measure(self, client, url, repeat, cold):
+        """(queries on the last request, median ms). Warm runs prime the cache first."""
+        if not cold:
+            client.get(url)
+        samples = []
+        for _ in range(repeat):
+            if cold:
+                cache.clear()
+            with count_queries() as queries:
+                started = time.perf_counter()
+                response = client.get(url)
+                samples.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                raise CommandError(f"{url} answered {response.status_code}")
+        return queries[0], statistics.median(samples) * 1000
@@ -0,0 +1,84 @@
+import random
+import statistics
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIRequestFactory
+from myapp.benchmarks.utils import bench_prefix
+from myapp.models import Category, Product
+from myapp.pagination import KeysetPagination
+from myapp.serializers import ProductSerializer
+from myapp.views import ProductListCreate
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the product list endpoint on catalogues of growing size: first, middle and "
+        "last page, a sparse fieldset, and the old unpaginated listing. Creates its own "
+        "products and removes them afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="1000,10000,100000")
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--full-list-max", type=int, default=10000, help="skip the unpaginated listing above this size")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        prefix = bench_prefix()
+        categories = Category.objects.bulk_create([Category(name=f"{prefix}-{i}") for i in range(10)])
+        factory = APIRequestFactory()
+        view = ProductListCreate.as_view()
+        description = "Fresh, locally sourced and carefully packed. " * 20
+
+        def get(query=""):
+            return view(factory.get(f"/api/products/{query}", HTTP_HOST="localhost"))
+
+        self.stdout.write(
+            f"{'products':>9}  {'first ms':>9}  {'middle ms':>9}  {'last ms':>9}  {'fields ms':>9}  {'full list ms':>12}"
+        )
+        try:
+            created = 0
+            for size in [int(s) for s in options["sizes"].split(",")]:
+                Product.objects.bulk_create([
+                    Product(
+                        name=f"{prefix} product {i}", description=description, ai_summary=description[:200],
+                        price=Decimal(rng.randint(100, 5000)) / 100, stock=10, category=rng.choice(categories),
+                    )
+                    for i in range(created, size)
+                ], batch_size=5000)
+                created = size
+
+                ordered = Product.objects.order_by("-created_at", "-id")
+                middle = KeysetPagination.encode_cursor(ordered[size // 2])
+                last = KeysetPagination.encode_cursor(ordered[max(0, size - KeysetPagination.page_size - 1)])
+
+                timings = [
+                    self.median_ms(options["repeat"], lambda: get()),
+                    self.median_ms(options["repeat"], lambda: get(f"?cursor={middle}")),
+                    self.median_ms(options["repeat"], lambda: get(f"?cursor={last}")),
+                    self.median_ms(options["repeat"], lambda: get("?fields=id,name,price,image_url,category_name")),
+                ]
+                if size <= options["full_list_max"]:
+                    full = self.median_ms(3, lambda: ProductSerializer(
+                        Product.objects.all().order_by("-created_at"), many=True
+                    ).data)
+                    full = f"{full:>12.1f}"
+                else:
+                    full = f"{'-':>12}"
+
+                self.stdout.write(f"{size:>9}  " + "  ".join(f"{t:>9.2f}" for t in timings) + f"  {full}")
+        finally:
+            Product.objects.filter(category__in=categories).delete()
+            Category.objects.filter(pk__in=[c.pk for c in categories]).delete()
+
+    def median_ms(self, repeat, fn):
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            response = fn()
+            if hasattr(response, "render"):
+                response.render()
+            samples.append(time.perf_counter() - started)
+        return statistics.median(samples) * 1000
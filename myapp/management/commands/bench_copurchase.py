@@ -0,0 +1,78 @@
+import random
+import subprocess
+import sys
+import time
+from decimal import Decimal
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from myapp.benchmarks.utils import bench_prefix, make_users
+from myapp.models import Category, Product, Order, OrderItem, ProductNeighbor
+from myapp.services.copurchase import MAX_PAIRS
+from myapp.services.purchase_history import snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the co-purchase index build on generated order history of growing size. "
+        "Each build runs in a fresh process so its peak memory is reported on its own. "
+        "Rebuilds the whole index, so run it against a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="100000,1000000,3000000", help="order lines, ascending")
+        parser.add_argument("--products", type=int, default=5000)
+        parser.add_argument("--max-pairs", type=int, default=MAX_PAIRS)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        prefix = bench_prefix()
+        category = Category.objects.create(name=prefix)
+        user, = make_users(prefix, 1)
+        products = Product.objects.bulk_create([
+            Product(name=f"{prefix} product {i}", price=Decimal("1.00"), stock=1, category=category)
+            for i in range(options["products"])
+        ], batch_size=5000)
+        # Long-tailed demand: a few staples appear in most baskets.
+        weights = [1 / (rank + 1) for rank in range(len(products))]
+
+        lines = 0
+        self.stdout.write(f"{'lines':>9}  {'orders':>8}  {'build s':>8}  {'peak MB':>8}  result")
+        try:
+            for size in [int(s) for s in options["sizes"].split(",")]:
+                lines += self.generate(rng, user, products, weights, size - lines)
+                orders = Order.objects.filter(user=user).count()
+
+                started = time.perf_counter()
+                result = subprocess.run(
+                    [sys.executable, str(settings.BASE_DIR / "manage.py"), "build_copurchase_index",
+                     "--max-pairs", str(options["max_pairs"]), "--settle-seconds", "0"],
+                    capture_output=True, text=True, check=True,
+                )
+                elapsed = time.perf_counter() - started
+                peak = result.stdout.rsplit("peak memory ", 1)[-1].strip()
+
+                self.stdout.write(
+                    f"{lines:>9}  {orders:>8}  {elapsed:>8.1f}  {peak:>8}  "
+                    f"{ProductNeighbor.objects.count()} neighbour rows"
+                )
+        finally:
+            Order.objects.filter(user=user).delete()
+            Product.objects.filter(category=category).delete()
+            category.delete()
+            user.delete()
+
+    def generate(self, rng, user, products, weights, lines, orders_per_batch=2000):
+        written = 0
+        while written < lines:
+            orders = Order.objects.bulk_create([Order(user=user) for _ in range(orders_per_batch)])
+            items = []
+            for order in orders:
+                for product in set(rng.choices(products, weights, k=rng.randint(2, 14))):
+                    items.append(OrderItem(
+                        order=order, product=product, product_name=product.name,
+                        unit_price=product.price, quantity=1, subtotal=product.price, **snapshot(order, product),
+                    ))
+            OrderItem.objects.bulk_create(items, batch_size=5000)
+            written += len(items)
+        return written
@@ -0,0 +1,59 @@
+import csv
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from myapp.benchmarks.utils import bench_prefix
+from myapp.models import Category, Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Time import_products on generated CSV files of growing size, first as inserts and "
+        "then as updates of the same SKUs. Each import runs in a fresh process so its peak "
+        "memory is reported on its own. Removes its products afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="10000,50000,200000", help="rows per file")
+        parser.add_argument("--categories", type=int, default=40)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        prefix = bench_prefix()
+        descriptions = [f"{prefix} description {i}. " + "Carefully sourced and packed. " * 8 for i in range(500)]
+
+        self.stdout.write(f"{'rows':>8}  {'file MB':>7}  {'pass':<7}  {'rows/s':>8}  {'peak MB':>8}")
+        try:
+            for size in [int(s) for s in options["sizes"].split(",")]:
+                fd, path = tempfile.mkstemp(suffix=".csv")
+                with os.fdopen(fd, "w", newline="") as f:
+                    writer = csv.writer(f)
+                    writer.writerow(["sku", "name", "category", "price", "stock", "description"])
+                    for i in range(size):
+                        writer.writerow([
+                            f"{prefix}-{i}", f"Product {i}", f"{prefix} category {rng.randrange(options['categories'])}",
+                            f"{rng.randint(50, 5000) / 100:.2f}", rng.randint(0, 100), rng.choice(descriptions),
+                        ])
+                file_mb = os.path.getsize(path) / 1024 / 1024
+
+                try:
+                    for label in ("insert", "update"):
+                        started = time.perf_counter()
+                        result = subprocess.run(
+                            [sys.executable, str(settings.BASE_DIR / "manage.py"), "import_products", path, "--no-summaries"],
+                            capture_output=True, text=True, check=True,
+                        )
+                        elapsed = time.perf_counter() - started
+                        peak = result.stdout.rsplit("peak memory ", 1)[-1].rstrip(")\n")
+                        self.stdout.write(f"{size:>8}  {file_mb:>7.1f}  {label:<7}  {size / elapsed:>8.0f}  {peak:>8}")
+                finally:
+                    os.remove(path)
+                    Product.objects.filter(sku__startswith=prefix).delete()
+        finally:
+            Category.objects.filter(name__startswith=prefix).delete()
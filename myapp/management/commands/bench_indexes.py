@@ -0,0 +1,123 @@
+import random
+import statistics
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import connection, models
+from myapp.benchmarks.dataset import seed_history
+from myapp.benchmarks.utils import bench_prefix
+from myapp.models import Order, Product, Wallet, WalletTransaction
+from myapp.services.recommendation import load_candidates
+
+BATCH_SIZE = 5000
+
+
+def model_index(model, name):
+    return next(index for index in model._meta.indexes if index.name == name)
+
+# (model, index) added by 0018_hot_lookup_indexes, and the single-column FK
+# indexes it replaced, recreated under stand-in names for the "before" run
+ADDED = [
+    (Order, "order_user_created"),
+    (Product, "product_instock_category"),
+    (WalletTransaction, "wallettransaction_wallet_id"),
+]
+REPLACED = [
+    (Order, models.Index(fields=["user"], name="bench_order_user")),
+    (WalletTransaction, models.Index(fields=["wallet"], name="bench_wallettransaction_wallet")),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the lookups 0018_hot_lookup_indexes serves (a customer's orders newest first, "
+        "in-stock recommendation candidates by category, a wallet's latest transactions) on a "
+        "large order history, with those indexes and again with the bare "
+        "foreign-key indexes they replaced. Drops and recreates those indexes while it runs, so "
+        "use a database nothing else is writing to. Creates its own rows and removes them afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--order-items", type=int, default=1_000_000)
+        parser.add_argument("--items", type=int, default=3, help="items per order")
+        parser.add_argument("--users", type=int, default=5000)
+        parser.add_argument("--products", type=int, default=5000)
+        parser.add_argument("--categories", type=int, default=50)
+        parser.add_argument("--transactions", type=int, default=200_000)
+        parser.add_argument("--repeat", type=int, default=25, help="customers timed per lookup")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        prefix = bench_prefix()
+        started = time.perf_counter()
+        data = seed_history(
+            prefix, options["order_items"], options["items"], options["users"], options["products"],
+            options["categories"], rng=rng,
+        )
+        self.create_transactions(rng, prefix, data.users, options["transactions"])
+        self.stderr.write(f"Seeded {options['order_items']} order items in {time.perf_counter() - started:.0f}s")
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+        sample = rng.sample(data.users, min(options["repeat"], len(data.users)))
+        wallets = dict(Wallet.objects.filter(user__in=sample).values_list("user_id", "id"))
+        top_categories = {c.pk for c in data.categories[:3]}
+        popular = {p.pk for p in rng.sample(data.products, 30)}
+        lookups = [
+            ("orders, newest first", lambda u: list(
+                Order.objects.filter(user=u).order_by("-created_at", "-id").values_list("id", flat=True)
+            )),
+            ("load_candidates", lambda u: load_candidates(top_categories, popular)),
+            ("wallet, latest 50", lambda u: list(
+                WalletTransaction.objects.filter(wallet_id=wallets[u.pk]).order_by("-id").values_list("id", flat=True)[:50]
+            )),
+        ]
+
+        try:
+            after = self.time_lookups(lookups, sample)
+            self.swap_indexes(drop_added=True)
+            try:
+                before = self.time_lookups(lookups, sample)
+            finally:
+                self.swap_indexes(drop_added=False)
+        finally:
+            started = time.perf_counter()
+            data.delete()
+            self.stderr.write(f"Removed the seeded rows in {time.perf_counter() - started:.0f}s")
+
+        self.stdout.write(f"{'lookup (median per customer)':<32}  {'before ms':>9}  {'after ms':>8}  {'speedup':>7}")
+        for label, _ in lookups:
+            self.stdout.write(
+                f"{label:<32}  {before[label]:>9.2f}  {after[label]:>8.2f}  {before[label] / after[label]:>6.1f}x"
+            )
+
+    def create_transactions(self, rng, prefix, users, count):
+        wallets = Wallet.objects.bulk_create([
+            Wallet(user=u, balance=0, wallet_address=f"{prefix}-{u.pk}") for u in users
+        ], batch_size=BATCH_SIZE)
+        for start in range(0, count, BATCH_SIZE):
+            WalletTransaction.objects.bulk_create([
+                WalletTransaction(wallet=rng.choice(wallets), amount=Decimal("1.00"), type="deposit")
+                for _ in range(start, min(start + BATCH_SIZE, count))
+            ])
+
+    def swap_indexes(self, drop_added):
+        with connection.schema_editor() as editor:
+            for model, name in ADDED:
+                (editor.remove_index if drop_added else editor.add_index)(model, model_index(model, name))
+            for model, index in REPLACED:
+                (editor.add_index if drop_added else editor.remove_index)(model, index)
+
+    def time_lookups(self, lookups, sample):
+        timings = {}
+        for label, lookup in lookups:
+            lookup(sample[0])  # warm the page cache
+            samples = []
+            for user in sample:
+                started = time.perf_counter()
+                lookup(user)
+                samples.append(time.perf_counter() - started)
+            timings[label] = statistics.median(samples) * 1000
+        return timings
@@ -0,0 +1,84 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, OperationalError
+from myapp.benchmarks.utils import bench_prefix, make_users, percentile
+from myapp.models import Product, CartItem, Address, Order, StockHold
+from myapp.services.checkout import place_order_from_cart, CheckoutError
+from myapp.services.inventory import hold_cart, InsufficientStock
+
+
+class Command(BaseCommand):
+    help = (
+        "Stress test checkout: many workers buy the same SKU concurrently. "
+        "Verifies nothing is oversold and reports orders per second. "
+        "Creates its own users/product and removes them afterwards; point it at a local database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=16)
+        parser.add_argument("--orders", type=int, default=500, help="checkout attempts")
+        parser.add_argument("--stock", type=int, default=300, help="initial stock of the contested SKU")
+        parser.add_argument("--hold", action="store_true", help="place a checkout hold before each order")
+        parser.add_argument("--keep", action="store_true", help="keep the generated rows")
+
+    def handle(self, *args, **options):
+        prefix = bench_prefix()
+        product = Product.objects.create(name=f"{prefix} contested SKU", price=Decimal("3.20"), stock=options["stock"])
+        users = make_users(prefix, options["orders"])
+        addresses = Address.objects.bulk_create([
+            Address(user=u, line1="1 Bench Street", city="KL", state="WP", postal_code="50000", phone="0")
+            for u in users
+        ])
+        CartItem.objects.bulk_create([CartItem(user=u, product=product, quantity=1) for u in users])
+
+        def attempt(i):
+            user, address = users[i], addresses[i]
+            started = time.perf_counter()
+            try:
+                if options["hold"]:
+                    hold_cart(user)
+                place_order_from_cart(user, address, "paypal")
+                outcome = "ok"
+            except (CheckoutError, InsufficientStock):
+                outcome = "rejected"
+            except OperationalError:
+                outcome = "error"
+            finally:
+                connection.close()
+            return outcome, time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+            results = list(pool.map(attempt, range(options["orders"])))
+        elapsed = time.perf_counter() - started
+
+        outcomes = [o for o, _ in results]
+        latencies = [t for _, t in results]
+        placed = outcomes.count("ok")
+        product.refresh_from_db()
+        sold = Order.objects.filter(user__in=users).count()
+
+        self.stdout.write(f"backend        {connection.vendor}")
+        self.stdout.write(f"workers        {options['workers']}")
+        self.stdout.write(f"attempts       {options['orders']}")
+        self.stdout.write(f"placed         {placed}")
+        self.stdout.write(f"rejected       {outcomes.count('rejected')}")
+        self.stdout.write(f"errors         {outcomes.count('error')}")
+        self.stdout.write(f"final stock    {product.stock}")
+        self.stdout.write(f"orders/sec     {placed / elapsed:.1f}")
+        self.stdout.write(f"p50 / p99 ms   {percentile(latencies, 50) * 1000:.1f} / {percentile(latencies, 99) * 1000:.1f}")
+
+        oversold = sold + product.stock != options["stock"] or sold > options["stock"]
+
+        if not options["keep"]:
+            StockHold.objects.filter(product=product).delete()
+            Order.objects.filter(user__in=users).delete()
+            User.objects.filter(pk__in=[u.pk for u in users]).delete()
+            product.delete()
+
+        if oversold:
+            raise CommandError(f"Stock mismatch: {sold} sold + {product.stock} left != {options['stock']}")
+        self.stdout.write(self.style.SUCCESS("No oversell"))
@@ -0,0 +1,132 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Sum
+from django.utils import timezone
+from myapp.benchmarks.dataset import seed_history
+from myapp.benchmarks.utils import bench_prefix
+from myapp.models import OrderItem
+from myapp.services.purchase_history import backfill
+from myapp.services.recommendation import (
+    get_global_product_popularity, get_user_bought_product_ids, get_user_product_counts, get_user_top_categories,
+)
+
+
+# The four recommendation.py queries as they were before the history was
+# copied onto OrderItem: filtered and grouped through the join to Order.
+
+def joined_top_categories(user, days=180, top_k=5):
+    since = timezone.now() - timedelta(days=days)
+    rows = (
+        OrderItem.objects
+        .filter(order__user=user, order__created_at__gte=since, product__isnull=False)
+        .values("product__category_id", "product__category__name")
+        .annotate(qty=Sum("quantity"))
+        .order_by("-qty")[:top_k]
+    )
+    return {r["product__category_id"] for r in rows if r["product__category_id"] is not None}
+
+def joined_bought_product_ids(user, days=365):
+    since = timezone.now() - timedelta(days=days)
+    return set(
+        OrderItem.objects
+        .filter(order__user=user, order__created_at__gte=since, product__isnull=False)
+        .values_list("product_id", flat=True)
+        .distinct()
+    )
+
+def joined_product_counts(user, days=365):
+    since = timezone.now() - timedelta(days=days)
+    rows = (
+        OrderItem.objects
+        .filter(order__user=user, order__created_at__gte=since, product__isnull=False)
+        .values("product_id")
+        .annotate(qty=Sum("quantity"))
+        .order_by("-qty")
+    )
+    return {r["product_id"]: int(r["qty"] or 0) for r in rows}
+
+def joined_global_popularity(days=30, top_n=30):
+    since = timezone.now() - timedelta(days=days)
+    rows = (
+        OrderItem.objects
+        .filter(order__created_at__gte=since, product__isnull=False)
+        .values("product_id")
+        .annotate(qty=Sum("quantity"))
+        .order_by("-qty")[:top_n]
+    )
+    return {r["product_id"]: r["qty"] or 0 for r in rows}
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the four purchase-history queries in recommendation.py on a large order history, "
+        "through the join to Order as they used to run and on the user, created_at and category "
+        "copied onto OrderItem, and check both give the same answers. Also times "
+        "backfill_order_item_history over the whole history. Creates its own rows and removes "
+        "them afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--order-items", type=int, default=1_000_000)
+        parser.add_argument("--items", type=int, default=3, help="items per order")
+        parser.add_argument("--users", type=int, default=5000)
+        parser.add_argument("--products", type=int, default=5000)
+        parser.add_argument("--repeat", type=int, default=25, help="customers timed per query")
+        parser.add_argument("--chunk-size", type=int, default=5000, help="backfill chunk")
+        parser.add_argument("--skip-analyze", action="store_true", help="time without fresh planner statistics")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        started = time.perf_counter()
+        data = seed_history(
+            bench_prefix(), options["order_items"], options["items"], options["users"], options["products"], rng=rng,
+        )
+        self.stderr.write(f"Seeded {options['order_items']} order items in {time.perf_counter() - started:.0f}s")
+        if not options["skip_analyze"]:
+            # planner statistics, as a maintained database has them; without them SQLite
+            # runs the joined global popularity query off the product_id index
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+        sample = rng.sample(data.users, min(options["repeat"], len(data.users)))
+        queries = [
+            # label, before, after, comparable form of the answer
+            ("get_user_top_categories", joined_top_categories, lambda u: get_user_top_categories(u)[0], None),
+            ("get_user_bought_product_ids", joined_bought_product_ids, get_user_bought_product_ids, None),
+            ("get_user_product_counts", joined_product_counts, get_user_product_counts, None),
+            # ties at the cut can fall either way, so only the counts are compared
+            ("get_global_product_popularity", lambda u: joined_global_popularity(),
+             lambda u: get_global_product_popularity(), lambda top: sorted(top.values())),
+        ]
+
+        try:
+            self.stdout.write(f"{'query (median per customer)':<32}  {'joined ms':>9}  {'copied ms':>9}  {'speedup':>7}")
+            for label, before, after, comparable in queries:
+                comparable = comparable or (lambda answer: answer)
+                mismatched = [u.pk for u in sample if comparable(before(u)) != comparable(after(u))]
+                if mismatched:
+                    raise CommandError(f"{label} disagrees with the joined query for users {mismatched}")
+                joined_ms, copied_ms = self.median_ms(before, sample), self.median_ms(after, sample)
+                self.stdout.write(f"{label:<32}  {joined_ms:>9.2f}  {copied_ms:>9.2f}  {joined_ms / copied_ms:>6.1f}x")
+
+            OrderItem.objects.filter(order__user__in=data.users).update(user=None, created_at=None, category=None)
+            started = time.perf_counter()
+            updated = backfill(options["chunk_size"])
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"backfill: {updated} items in {elapsed:.1f}s ({updated / elapsed:.0f} items/s)")
+        finally:
+            data.delete()
+
+    def median_ms(self, query, sample):
+        query(sample[0])  # warm the page cache
+        samples = []
+        for user in sample:
+            started = time.perf_counter()
+            query(user)
+            samples.append(time.perf_counter() - started)
+        return statistics.median(samples) * 1000
@@ -0,0 +1,72 @@
+import random
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from myapp.benchmarks.utils import bench_prefix
+from myapp.models import Category, Product
+from myapp.services.recommendation import handle_recommendation, score_with_loop
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the per-instance get_score loop with the array scoring engine on "
+        "generated candidate sets. Creates its own products and removes them afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="1000,10000,100000")
+        parser.add_argument("--limit", type=int, default=14, help="top-k taken from the candidates")
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        prefix = bench_prefix()
+        categories = Category.objects.bulk_create([Category(name=f"{prefix}-{i}") for i in range(5)])
+        top_category_ids = {categories[0].id, categories[1].id}
+        limit = options["limit"]
+
+        self.stdout.write(f"{'candidates':>10}  {'loop ms':>9}  {'array ms':>9}  {'speedup':>7}")
+        try:
+            for size in [int(s) for s in options["sizes"].split(",")]:
+                Product.objects.filter(category__in=categories).delete()
+                Product.objects.bulk_create([
+                    Product(
+                        name=f"{prefix} product {i}", price=Decimal(rng.randint(100, 5000)) / 100,
+                        stock=1, category=rng.choice(categories), image_url="https://example.com/p.png",
+                    )
+                    for i in range(size)
+                ], batch_size=5000)
+
+                ids = list(Product.objects.filter(category__in=categories).values_list("id", flat=True))
+                user_qty = {pid: rng.randint(1, 6) for pid in rng.sample(ids, min(len(ids), 200))}
+                global_qty = {pid: rng.randint(1, 400) for pid in rng.sample(ids, min(len(ids), 30))}
+                candidates = Product.objects.filter(stock__gt=0, category_id__in=top_category_ids).order_by("id")
+
+                loop_time, expected = self.best_of(
+                    options["repeat"],
+                    lambda: score_with_loop(candidates.all(), top_category_ids, user_qty, global_qty)[:limit],
+                )
+                array_time, items = self.best_of(
+                    options["repeat"],
+                    lambda: handle_recommendation(candidates.all(), top_category_ids, user_qty, global_qty, set(), limit=limit),
+                )
+
+                if items != expected:
+                    raise CommandError(f"Engines disagree at {size} candidates")
+
+                self.stdout.write(
+                    f"{size:>10}  {loop_time * 1000:>9.1f}  {array_time * 1000:>9.1f}  {loop_time / array_time:>6.1f}x"
+                )
+        finally:
+            Product.objects.filter(category__in=categories).delete()
+            Category.objects.filter(pk__in=[c.pk for c in categories]).delete()
+
+    def best_of(self, repeat, fn):
+        best, result = None, None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = fn()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
@@ -0,0 +1,94 @@
+import random
+import statistics
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from myapp.benchmarks.utils import bench_prefix
+from myapp.models import Category, Product
+from myapp.services.search import search_products, filter_products
+
+ADJECTIVES = ["fresh", "organic", "smoked", "crunchy", "sweet", "spicy", "frozen", "dried", "whole", "salted"]
+NOUNS = [
+    "apples", "bread", "cheese", "yogurt", "salmon", "almonds", "coffee", "pasta", "tomatoes", "honey",
+    "butter", "rice", "lentils", "spinach", "chocolate", "olives", "granola", "tea", "mushrooms", "berries",
+]
+FILLER = "sourced from local farms packed daily and delivered chilled to keep it at its best".split()
+
+
+class Command(BaseCommand):
+    help = (
+        "Time /api/products/search queries on a generated catalogue: indexed full-text "
+        "search against an unindexed substring scan, and the query plans of the filter-only "
+        "combinations. Creates its own products and removes them afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=200_000)
+        parser.add_argument("--repeat", type=int, default=10)
+        parser.add_argument("--page-size", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        prefix = bench_prefix()
+        categories = Category.objects.bulk_create([Category(name=f"{prefix}-{i}") for i in range(30)])
+        page = options["page_size"]
+
+        started = time.perf_counter()
+        for start in range(0, options["products"], 10_000):
+            Product.objects.bulk_create([
+                Product(
+                    name=f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i}",
+                    description=" ".join(rng.choices(FILLER + NOUNS, k=40)),
+                    ai_summary=" ".join(rng.choices(FILLER, k=15)),
+                    price=Decimal(rng.randint(50, 5000)) / 100,
+                    stock=rng.choice([0, 0, 3, 10, 50]),
+                    category=rng.choice(categories),
+                )
+                for i in range(start, min(start + 10_000, options["products"]))
+            ])
+        self.stdout.write(f"Generated {options['products']} products in {time.perf_counter() - started:.1f}s")
+
+        category = categories[0].id
+        cases = [
+            ("rare word", {"query": "smoked salmon 77"}),
+            ("common word", {"query": "apples"}),
+            ("prefix", {"query": "choc"}),
+            ("query + filters", {"query": "honey", "category": category, "in_stock": True, "max_price": Decimal(20)}),
+            ("category + price", {"category": category, "min_price": Decimal(5), "max_price": Decimal(10)}),
+            ("in stock + price", {"in_stock": True, "min_price": Decimal(5), "max_price": Decimal("5.50")}),
+            ("category only", {"category": category}),
+        ]
+
+        self.stdout.write(f"{'case':<18}  {'indexed ms':>10}  {'scan ms':>9}  plan")
+        try:
+            for label, params in cases:
+                indexed = self.median_ms(options["repeat"], lambda: list(search_products(**params)[:page]))
+                if params.get("query"):
+                    scan = self.median_ms(max(1, options["repeat"] // 5), lambda: list(self.scan(**params)[:page]))
+                    self.stdout.write(f"{label:<18}  {indexed:>10.2f}  {scan:>9.2f}  full-text index")
+                else:
+                    plan = search_products(**params)[:page].explain().replace("\n", " | ")
+                    self.stdout.write(f"{label:<18}  {indexed:>10.2f}  {'-':>9}  {plan}")
+        finally:
+            Product.objects.filter(category__in=categories).delete()
+            Category.objects.filter(pk__in=[c.pk for c in categories]).delete()
+
+    def scan(self, query="", **filters):
+        # What the endpoint would do without the full-text index: substring
+        # match on every text column.
+        queryset = filter_products(Product.objects.select_related("category").all(), **filters)
+        for word in query.split():
+            queryset = queryset.filter(
+                Q(name__icontains=word) | Q(description__icontains=word) | Q(ai_summary__icontains=word)
+            )
+        return queryset.order_by("-updated_at")
+
+    def median_ms(self, repeat, fn):
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - started)
+        return statistics.median(samples) * 1000
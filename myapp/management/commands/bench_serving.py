@@ -0,0 +1,144 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from decimal import Decimal
+import httpx
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from myapp.benchmarks.utils import bench_prefix, make_users, percentile
+from myapp.models import CartItem, Category, Product, Wallet
+
+SERVERS = {
+    # gunicorn arguments per mode; both get the same --workers
+    "wsgi": ["myproject.wsgi"],
+    "asgi": ["myproject.asgi:application", "-k", "uvicorn_worker.UvicornWorker"],
+}
+ENDPOINTS = (
+    "/api/products/?page_size=50",
+    "/api/products/{product}/",
+    "/api/cart/",
+    "/api/wallet/",
+    "/api/recommendation/",
+    "/api/check-auth/",
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Start the app under gunicorn with sync (WSGI) and uvicorn (ASGI) workers in turn, "
+        "drive the same mix of read endpoints at both with a fixed number of concurrent "
+        "clients, and report requests per second and tail latency. Serves the configured "
+        "database, so run it against a scratch one; creates its own rows and removes them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--modes", default="wsgi,asgi")
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--concurrency", type=int, default=32, help="clients with a request in flight")
+        parser.add_argument("--duration", type=float, default=10.0, help="seconds per mode")
+        parser.add_argument("--warmup", type=float, default=2.0)
+        parser.add_argument("--port", type=int, default=8765)
+
+    def handle(self, *args, **options):
+        modes = options["modes"].split(",")
+        unknown = set(modes) - set(SERVERS)
+        if unknown:
+            raise CommandError(f"Unknown mode: {', '.join(sorted(unknown))}")
+
+        prefix = bench_prefix()
+        user, = make_users(prefix, 1)
+        Wallet.objects.create(user=user, balance=Decimal("100.00"), wallet_address=f"{prefix}-wallet")
+        category = Category.objects.create(name=prefix)
+        products = Product.objects.bulk_create([
+            Product(name=f"{prefix} product {i}", category=category, price=Decimal("3.20"), stock=100)
+            for i in range(200)
+        ])
+        CartItem.objects.bulk_create([CartItem(user=user, product=p, quantity=2) for p in products[:8]])
+        # a real session row the server processes can read
+        client = Client()
+        client.force_login(user)
+        cookies = {settings.SESSION_COOKIE_NAME: client.cookies[settings.SESSION_COOKIE_NAME].value}
+        paths = [p.format(product=products[0].pk) for p in ENDPOINTS]
+
+        results = {}
+        try:
+            for mode in modes:
+                self.stderr.write(f"{mode}: {options['workers']} workers, {options['concurrency']} clients")
+                with self.server(mode, options["workers"], options["port"]) as base_url:
+                    asyncio.run(self.load(base_url, paths, cookies, options["concurrency"], options["warmup"]))
+                    results[mode] = asyncio.run(
+                        self.load(base_url, paths, cookies, options["concurrency"], options["duration"])
+                    )
+        finally:
+            Product.objects.filter(pk__in=[p.pk for p in products]).delete()
+            category.delete()
+            user.delete()
+
+        self.stdout.write(
+            f"{'mode':<5}  {'endpoint':<28}  {'req/s':>7}  {'p50 ms':>7}  {'p95 ms':>7}  {'p99 ms':>7}  {'errors':>6}"
+        )
+        for mode, (latencies, errors) in results.items():
+            rows = [(path, latencies[path], errors[path]) for path in paths]
+            rows.append(("all", [t for path in paths for t in latencies[path]], sum(errors.values())))
+            for path, samples, failed in rows:
+                ms = [t * 1000 for t in samples]
+                self.stdout.write(
+                    f"{mode:<5}  {path[:28]:<28}  {len(samples) / options['duration']:>7.0f}  "
+                    f"{percentile(ms, 50):>7.1f}  {percentile(ms, 95):>7.1f}  {percentile(ms, 99):>7.1f}  {failed:>6}"
+                )
+
+    @contextmanager
+    def server(self, mode, workers, port):
+        process = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", *SERVERS[mode], "--workers", str(workers),
+             "--bind", f"127.0.0.1:{port}", "--log-level", "warning"],
+            cwd=settings.BASE_DIR, env=os.environ.copy(),
+        )
+        try:
+            base_url = f"http://127.0.0.1:{port}"
+            self.wait_until_up(base_url, process)
+            yield base_url
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+    def wait_until_up(self, base_url, process, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError("The server exited during startup")
+            try:
+                if httpx.get(f"{base_url}/api/check-auth/").status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.2)
+        raise CommandError(f"No answer from {base_url} after {timeout}s")
+
+    async def load(self, base_url, paths, cookies, concurrency, duration):
+        """Each client walks the endpoint list for ``duration`` seconds. Returns ({path: [seconds]}, errors)."""
+        latencies, errors = defaultdict(list), Counter()
+        deadline = time.perf_counter() + duration
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+        async with httpx.AsyncClient(base_url=base_url, cookies=cookies, limits=limits, timeout=60) as client:
+            async def run(offset):
+                n = offset
+                while time.perf_counter() < deadline:
+                    path = paths[n % len(paths)]
+                    n += 1
+                    started = time.perf_counter()
+                    try:
+                        failed = (await client.get(path)).status_code >= 400
+                    except httpx.HTTPError:
+                        failed = True
+                    latencies[path].append(time.perf_counter() - started)
+                    errors[path] += failed
+
+            await asyncio.gather(*(run(i) for i in range(concurrency)))
+        return latencies, errors
@@ -0,0 +1,90 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, OperationalError
+from django.db.models import Sum
+from myapp.benchmarks.utils import bench_prefix, make_users, percentile
+from myapp.models import Wallet, WalletTransaction
+from myapp.services.wallet import credit, debit, InsufficientBalance
+
+
+class Command(BaseCommand):
+    help = (
+        "Run parallel top-ups and payments against a few wallets and check that the final "
+        "balances equal the ledger. Creates its own users/wallets and removes them afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=16)
+        parser.add_argument("--wallets", type=int, default=4)
+        parser.add_argument("--ops", type=int, default=2000, help="total ledger operations")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--keep", action="store_true", help="keep the generated rows")
+
+    def handle(self, *args, **options):
+        prefix = bench_prefix()
+        users = make_users(prefix, options["wallets"])
+        Wallet.objects.bulk_create([
+            Wallet(user=u, balance=0, wallet_address=f"{prefix}-{u.pk}") for u in users
+        ])
+
+        rng = random.Random(options["seed"])
+        plan = [
+            (rng.choice(users), rng.random() < 0.5, Decimal(rng.randint(1, 2000)) / 100)
+            for _ in range(options["ops"])
+        ]
+
+        def run(op):
+            user, is_topup, amount = op
+            started = time.perf_counter()
+            try:
+                if is_topup:
+                    credit(user, amount, "bench top-up")
+                else:
+                    debit(user, amount, "bench payment")
+                outcome = "ok"
+            except InsufficientBalance:
+                outcome = "declined"
+            except OperationalError:
+                outcome = "error"
+            finally:
+                connection.close()
+            return outcome, time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+            results = list(pool.map(run, plan))
+        elapsed = time.perf_counter() - started
+
+        outcomes = [o for o, _ in results]
+        latencies = [t for _, t in results]
+
+        mismatches = []
+        for wallet in Wallet.objects.filter(user__in=users):
+            ledger = {
+                row["type"]: row["total"]
+                for row in wallet.transactions.values("type").annotate(total=Sum("amount"))
+            }
+            expected = ledger.get("deposit", 0) - ledger.get("payment", 0)
+            if wallet.balance != expected or wallet.balance < 0:
+                mismatches.append((wallet.pk, wallet.balance, expected))
+
+        self.stdout.write(f"backend        {connection.vendor}")
+        self.stdout.write(f"workers        {options['workers']}")
+        self.stdout.write(f"wallets        {options['wallets']}")
+        self.stdout.write(f"applied        {outcomes.count('ok')}")
+        self.stdout.write(f"declined       {outcomes.count('declined')}")
+        self.stdout.write(f"errors         {outcomes.count('error')}")
+        self.stdout.write(f"ops/sec        {len(plan) / elapsed:.1f}")
+        self.stdout.write(f"p50 / p99 ms   {percentile(latencies, 50) * 1000:.1f} / {percentile(latencies, 99) * 1000:.1f}")
+
+        if not options["keep"]:
+            WalletTransaction.objects.filter(wallet__user__in=users).delete()
+            User.objects.filter(pk__in=[u.pk for u in users]).delete()
+
+        if mismatches:
+            raise CommandError(f"Balance drift (wallet, balance, ledger): {mismatches}")
+        self.stdout.write(self.style.SUCCESS("Balances match the ledger"))
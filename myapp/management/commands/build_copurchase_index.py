@@ -0,0 +1,36 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from myapp.benchmarks.utils import peak_memory_mb
+from myapp.services.copurchase import rebuild_index, update_index, SETTLE, TOP_N, MAX_PAIRS
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the 'frequently bought together' index from order history. "
+        "Run a full rebuild nightly and --incremental every few minutes to fold in new orders."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--incremental", action="store_true", help="only process orders after the last run")
+        parser.add_argument("--top-n", type=int, default=TOP_N)
+        parser.add_argument("--max-pairs", type=int, default=MAX_PAIRS, help="cap on pairs held in memory")
+        parser.add_argument(
+            "--settle-seconds", type=int, default=int(SETTLE.total_seconds()),
+            help="leave orders placed this recently to the next run",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+
+        settle = timedelta(seconds=options["settle_seconds"])
+        if options["incremental"]:
+            counter = update_index(options["top_n"], options["max_pairs"], settle=settle)
+        else:
+            counter = rebuild_index(options["top_n"], options["max_pairs"], settle=settle)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {counter.orders} orders, {len(counter.counts)} pairs "
+            f"(count floor {counter.floor}) in {time.perf_counter() - started:.1f}s, "
+            f"peak memory {peak_memory_mb():.0f} MB"
+        ))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from myapp.services.purchase_history import find_stale
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the user and created_at copied onto every OrderItem with its order and list "
+        "the items that are missing them or disagree. Exits non-zero if any do; "
+        "backfill_order_item_history repairs them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=100, help="list at most this many")
+
+    def handle(self, *args, **options):
+        stale = 0
+        for pk, field, stored, expected in find_stale():
+            stale += 1
+            if stale <= options["limit"]:
+                self.stdout.write(f"item #{pk} {field}: stored {stored} order {expected}")
+
+        if stale:
+            raise CommandError(f"{stale} order item fields disagree with their order")
+        self.stdout.write(self.style.SUCCESS("Order item history matches Order"))
@@ -0,0 +1,131 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q, Sum
+from django.utils import timezone
+from myapp.benchmarks.utils import peak_memory_mb
+from myapp.models import Product, OrderItem, UserRecommendation
+from myapp.services.features import rank_categories, CATEGORY_DAYS, PRODUCT_DAYS
+from myapp.services.recommendation import (
+    get_global_product_popularity, recommend_from_candidates, to_json_items, num
+)
+from myapp.services.scoring import Candidates
+
+# Shared, read-only state for worker processes, set once by the initializer.
+_candidates = None
+_global_qty = None
+_options = None
+
+
+def _init_worker(candidates, global_qty, options):
+    global _candidates, _global_qty, _options
+    _candidates, _global_qty, _options = candidates, global_qty, options
+
+def _recommend_chunk(users):
+    return [
+        (user_id, to_json_items(recommend_from_candidates(
+            _candidates, top_category_ids, user_qty, _global_qty, _options["limit"], _options["exclude_bought"]
+        )))
+        for user_id, top_category_ids, user_qty in users
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Precompute recommendations for every user with orders in the last year and store "
+        "them in UserRecommendation. Order history is read in bulk passes and scoring is "
+        "fanned out over a process pool."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4, help="worker processes; 1 runs inline")
+        parser.add_argument("--chunk-size", type=int, default=500, help="users per worker task")
+        parser.add_argument("--limit", type=int, default=20)
+        parser.add_argument("--exclude-bought", action="store_true")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        self.generated_at = timezone.now()
+        worker_options = {"limit": options["limit"], "exclude_bought": options["exclude_bought"]}
+
+        global_qty = get_global_product_popularity(top_n=num)
+        candidates = Candidates.from_queryset(Product.objects.filter(stock__gt=0).order_by("id"))
+        chunks = self.user_chunks(options["chunk_size"])
+        users = 0
+
+        if options["workers"] <= 1:
+            _init_worker(candidates, global_qty, worker_options)
+            for chunk in chunks:
+                users += self.save(_recommend_chunk(chunk))
+        else:
+            # Scoring needs no database. Close the connection and start the
+            # workers before streaming order history, so no child process
+            # inherits an open connection.
+            connection.close()
+            with ProcessPoolExecutor(
+                max_workers=options["workers"],
+                initializer=_init_worker,
+                initargs=(candidates, global_qty, worker_options),
+            ) as pool:
+                pool.submit(int).result()
+                pending = set()
+                for chunk in chunks:
+                    pending.add(pool.submit(_recommend_chunk, chunk))
+                    if len(pending) >= options["workers"] * 2:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        users += sum(self.save(f.result()) for f in done)
+                users += sum(self.save(f.result()) for f in pending)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated recommendations for {users} users in {elapsed:.1f}s "
+            f"({users / elapsed if elapsed else 0:.0f} users/s, "
+            f"peak memory {peak_memory_mb():.0f} MB main / {peak_memory_mb(children=True):.0f} MB worker)"
+        ))
+
+    def user_chunks(self, chunk_size):
+        # One pass over the order history, grouped by user: 365-day product
+        # counts plus 180-day category totals, same windows as the live path.
+        # Reads the copies on OrderItem, so categories are the ones at purchase.
+        now = timezone.now()
+        rows = (
+            OrderItem.objects
+            .filter(created_at__gte=now - timedelta(days=PRODUCT_DAYS), product__isnull=False)
+            .values("user_id", "product_id", "category_id")
+            .annotate(
+                qty=Sum("quantity"),
+                recent_qty=Sum("quantity", filter=Q(created_at__gte=now - timedelta(days=CATEGORY_DAYS))),
+            )
+            .order_by("user_id")
+        )
+
+        chunk, user_id, user_qty, category_qty = [], None, {}, {}
+        for row in rows.iterator(chunk_size=5000):
+            if row["user_id"] != user_id:
+                if user_id is not None:
+                    chunk.append((user_id, rank_categories(category_qty), user_qty))
+                    if len(chunk) >= chunk_size:
+                        yield chunk
+                        chunk = []
+                user_id, user_qty, category_qty = row["user_id"], {}, {}
+
+            user_qty[row["product_id"]] = int(row["qty"] or 0)
+            if row["recent_qty"]:
+                cid = row["category_id"]
+                category_qty[cid] = category_qty.get(cid, 0) + row["recent_qty"]
+
+        if user_id is not None:
+            chunk.append((user_id, rank_categories(category_qty), user_qty))
+        if chunk:
+            yield chunk
+
+    def save(self, results):
+        UserRecommendation.objects.bulk_create(
+            [UserRecommendation(user_id=uid, items=items, generated_at=self.generated_at) for uid, items in results],
+            update_conflicts=True,
+            unique_fields=["user"],
+            update_fields=["items", "generated_at"],
+        )
+        return len(results)
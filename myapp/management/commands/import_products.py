@@ -0,0 +1,48 @@
+import sys
+import time
+from django.core.management.base import BaseCommand, CommandError
+from myapp.benchmarks.utils import peak_memory_mb
+from myapp.services.product_io import ProductImporter, ImportFileError, iter_rows, detect_format, FORMATS, CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = (
+        "Create or update products from a CSV or JSONL file, matched by sku. The file is "
+        "streamed, so memory stays flat with its size. Use - to read standard input."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=FORMATS, help="default: from the file extension, else csv")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+        parser.add_argument("--no-summaries", action="store_true", help="do not queue AI summaries")
+
+    def handle(self, *args, **options):
+        fmt = options["format"] or detect_format(options["path"])
+        importer = ProductImporter(chunk_size=options["chunk_size"], summaries=not options["no_summaries"])
+        started = time.perf_counter()
+
+        try:
+            if options["path"] == "-":
+                importer.run(iter_rows(sys.stdin.buffer, fmt))
+            else:
+                with open(options["path"], "rb") as f:
+                    importer.run(iter_rows(f, fmt))
+        except OSError as e:
+            raise CommandError(e)
+        except ImportFileError as e:
+            report = importer.report()
+            raise CommandError(
+                f"{e}. Stopped after {report['rows']} rows ({report['created']} created, {report['updated']} updated)"
+            )
+
+        elapsed = time.perf_counter() - started
+        report = importer.report()
+        for error in report["error_details"]:
+            self.stderr.write(f"line {error['line']}: {error['error']}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report['rows']} rows ({report['created']} created, {report['updated']} updated, "
+            f"{report['errors']} errors, {report['summaries_queued']} summaries queued) in {elapsed:.1f}s "
+            f"({report['rows'] / elapsed if elapsed else 0:.0f} rows/s, peak memory {peak_memory_mb():.0f} MB)"
+        ))
@@ -0,0 +1,93 @@
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from myapp.models import Wallet, WalletTransaction
+from myapp.services.wallet import signed_amount
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild Wallet.balance from the WalletTransaction ledger in one streaming pass "
+        "ordered by (wallet, id). Run it while wallets are quiet: transactions written "
+        "during the pass are not reflected in the rebuilt balance."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--wallet", type=int, action="append", dest="wallets", help="limit to these wallet ids")
+        parser.add_argument("--chunk-size", type=int, default=2000)
+        parser.add_argument("--snapshots", action="store_true", help="also rewrite balance_after on every transaction")
+        parser.add_argument("--dry-run", action="store_true", help="report mismatches without writing")
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.pending = {}
+        self.snapshots = []
+        self.checked = self.fixed = 0
+
+        ledger = WalletTransaction.objects.order_by("wallet_id", "id")
+        wallets = Wallet.objects.all()
+        if options["wallets"]:
+            ledger = ledger.filter(wallet_id__in=options["wallets"])
+            wallets = wallets.filter(pk__in=options["wallets"])
+
+        current_wallet, balance = None, Decimal("0")
+        rows = ledger.values_list("id", "wallet_id", "type", "amount").iterator(chunk_size=options["chunk_size"])
+        for tx_id, wallet_id, tx_type, amount in rows:
+            if wallet_id != current_wallet:
+                if current_wallet is not None:
+                    self.collect(current_wallet, balance)
+                current_wallet, balance = wallet_id, Decimal("0")
+
+            balance += signed_amount(tx_type, amount)
+            if options["snapshots"]:
+                self.snapshots.append(WalletTransaction(id=tx_id, balance_after=balance))
+                if len(self.snapshots) >= options["chunk_size"]:
+                    self.flush_snapshots()
+
+        if current_wallet is not None:
+            self.collect(current_wallet, balance)
+        self.flush()
+        self.flush_snapshots()
+
+        # Wallets without a single ledger entry must be empty.
+        empty = wallets.filter(transactions__isnull=True).exclude(balance=0)
+        for wallet_id, stored in empty.values_list("id", "balance"):
+            self.report(wallet_id, stored, Decimal("0"))
+        if not options["dry_run"]:
+            empty.update(balance=0)
+
+        verb = "Would fix" if options["dry_run"] else "Fixed"
+        self.stdout.write(self.style.SUCCESS(f"Checked {self.checked} wallets. {verb} {self.fixed}."))
+
+    def collect(self, wallet_id, balance):
+        self.pending[wallet_id] = balance
+        if len(self.pending) >= 500:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+
+        with transaction.atomic():
+            stale = []
+            for wallet in Wallet.objects.select_for_update().filter(pk__in=self.pending.keys()).only("id", "balance"):
+                expected = self.pending[wallet.pk]
+                self.checked += 1
+                if wallet.balance != expected:
+                    self.report(wallet.pk, wallet.balance, expected)
+                    wallet.balance = expected
+                    stale.append(wallet)
+
+            if stale and not self.options["dry_run"]:
+                Wallet.objects.bulk_update(stale, ["balance"])
+
+        self.pending = {}
+
+    def flush_snapshots(self):
+        if self.snapshots and not self.options["dry_run"]:
+            WalletTransaction.objects.bulk_update(self.snapshots, ["balance_after"])
+        self.snapshots = []
+
+    def report(self, wallet_id, stored, expected):
+        self.fixed += 1
+        self.stdout.write(f"wallet {wallet_id}: stored {stored} ledger {expected}")
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from myapp.services.inventory import release_expired_holds
+
+
+class Command(BaseCommand):
+    help = "Return stock held by expired checkout holds. Run periodically (e.g. every minute from cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        released = release_expired_holds(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Released {released} expired holds"))
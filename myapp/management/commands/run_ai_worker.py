@@ -0,0 +1,25 @@
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand
+from myapp.services.ai_jobs import run_worker, BATCH_SIZE, CONCURRENCY
+
+
+class Command(BaseCommand):
+    help = (
+        "Process queued AI summary jobs. Runs until stopped; --once drains the jobs that "
+        "are due and exits. Several workers can run side by side."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="jobs claimed per query")
+        parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="summaries in flight at once")
+        parser.add_argument("--poll-interval", type=float, default=2.0, help="seconds to wait when the queue is empty")
+        parser.add_argument("--once", action="store_true")
+
+    def handle(self, *args, **options):
+        processed = async_to_sync(run_worker)(
+            batch_size=options["batch_size"],
+            concurrency=options["concurrency"],
+            once=options["once"],
+            poll_interval=options["poll_interval"],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} summary jobs"))
@@ -0,0 +1,71 @@
+import logging
+import random
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connection
+from .services.metrics import QueryStats, registry
+
+logger = logging.getLogger(__name__)
+
+
+class RequestMetricsMiddleware:
+    """
+    Times every request and counts it by view, method and status, and adds
+    a Server-Timing header. A METRICS_SAMPLE_RATE share of requests also has
+    its queries counted and timed through connection.execute_wrapper, and
+    is flagged when one statement runs METRICS_DUPLICATE_THRESHOLD times or
+    more. Aggregates are served at /api/admin/metrics/.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        started, queries = time.perf_counter(), self.sample()
+        if queries is None:
+            response = self.get_response(request)
+        else:
+            with connection.execute_wrapper(queries):
+                response = self.get_response(request)
+        return self.finish(request, response, started, queries)
+
+    async def __acall__(self, request):
+        started, queries = time.perf_counter(), self.sample()
+        if queries is None:
+            response = await self.get_response(request)
+        else:
+            # the async ORM runs on a thread that shares this context's connection
+            with connection.execute_wrapper(queries):
+                response = await self.get_response(request)
+        return self.finish(request, response, started, queries)
+
+    def sample(self):
+        rate = settings.METRICS_SAMPLE_RATE
+        return QueryStats() if rate >= 1 or random.random() < rate else None
+
+    def finish(self, request, response, started, queries):
+        seconds = time.perf_counter() - started
+        match = request.resolver_match
+        view = match.view_name if match else "unmatched"
+
+        timing = f"app;dur={seconds * 1000:.1f}"
+        duplicate = False
+        if queries is not None:
+            timing += f', db;dur={queries.seconds * 1000:.1f};desc="{queries.count} queries"'
+            repeated = queries.repeats()
+            if repeated and repeated[1] >= settings.METRICS_DUPLICATE_THRESHOLD:
+                duplicate = True
+                logger.warning("%s ran one statement %d times: %s", view, repeated[1], repeated[0])
+        response["Server-Timing"] = timing
+
+        registry.record(view, request.method, response.status_code, seconds, queries, duplicate)
+        return response
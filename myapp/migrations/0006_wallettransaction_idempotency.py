@@ -0,0 +1,27 @@
+# Generated by Django 6.0.3 on 2026-10-18 13:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0005_stockhold'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wallettransaction',
+            name='balance_after',
+            field=models.DecimalField(blank=True, decimal_places=10, max_digits=18, null=True),
+        ),
+        migrations.AddField(
+            model_name='wallettransaction',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='wallettransaction',
+            constraint=models.UniqueConstraint(fields=('wallet', 'idempotency_key'), name='unique_wallet_idempotency_key'),
+        ),
+    ]
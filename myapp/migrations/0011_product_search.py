@@ -0,0 +1,45 @@
+# Generated by Django 6.0.3 on 2026-10-18 14:26
+
+from django.db import migrations, models
+
+
+def search_index():
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+    # Same expression as myapp.services.search.search_vector()
+    return GinIndex(SearchVector("name", "description", "ai_summary", config="english"), name="product_search_gin")
+
+
+# Postgres only. The SQLite FTS5 table is managed by
+# myapp.services.search.ensure_fts_index after every migrate.
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.add_index(apps.get_model("myapp", "Product"), search_index())
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.remove_index(apps.get_model("myapp", "Product"), search_index())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0010_product_created_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'price'], name='product_category_price'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('stock__gt', 0)), fields=['price'], name='product_instock_price'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', '-created_at', '-id'], name='product_category_created'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0.3 on 2026-10-18 14:50
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0011_product_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AISummaryJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ai_jobs', to='myapp.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'run_after'], name='aisummaryjob_status_run_after')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status', 'pending')), fields=('product',), name='unique_pending_ai_job')],
+            },
+        ),
+    ]
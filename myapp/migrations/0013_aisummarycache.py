@@ -0,0 +1,28 @@
+# Generated by Django 6.0.3 on 2026-10-18 14:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0012_aisummaryjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AISummaryCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64)),
+                ('version', models.CharField(max_length=16)),
+                ('summary', models.TextField()),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_hit_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'unique_together': {('version', 'content_hash')},
+            },
+        ),
+    ]
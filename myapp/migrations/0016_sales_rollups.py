@@ -0,0 +1,42 @@
+# Generated by Django 6.0.3 on 2026-10-18 15:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0015_order_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategorySalesDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('quantity', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('category', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='myapp.category')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='categorysalesdaily_day')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('category__isnull', False)), fields=('category', 'day'), name='unique_category_sales_day'), models.UniqueConstraint(condition=models.Q(('category__isnull', True)), fields=('day',), name='unique_uncategorised_sales_day')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductSalesDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('quantity', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='myapp.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='productsalesdaily_day')],
+                'unique_together': {('product', 'day')},
+            },
+        ),
+    ]
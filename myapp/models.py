@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 # ============ CATEGORY ============
 class Category(models.Model):
@@ -12,6 +13,7 @@ class Category(models.Model):
 
 # ============ PRODUCT ============
 class Product(models.Model):
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)  # external key for bulk import
     name = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     ai_summary = models.TextField(blank=True)  
@@ -22,6 +24,19 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # keyset pagination of the catalogue, newest first
+            models.Index(fields=["-created_at", "-id"], name="product_created_id"),
+            # search filters: category + price range, in-stock + price range,
+            # and category browsing without a query
+            models.Index(fields=["category", "price"], name="product_category_price"),
+            models.Index(fields=["price"], condition=models.Q(stock__gt=0), name="product_instock_price"),
+            models.Index(fields=["category", "-created_at", "-id"], name="product_category_created"),
+            # recommendation candidates: in-stock products of the user's top categories
+            models.Index(fields=["category"], condition=models.Q(stock__gt=0), name="product_instock_category"),
+        ]
+
     def __str__(self):
         return f"{self.name} ({self.stock} left)"
 
@@ -47,12 +62,21 @@ class WalletTransaction(models.Model):
         ("refund", "Refund")
     ]
 
-    wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE, related_name="transactions")
+    # indexed by wallettransaction_wallet_id below, which also keeps each ledger in id order
+    wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE, related_name="transactions", db_index=False)
     amount = models.DecimalField(max_digits=18, decimal_places=10)
     type = models.CharField(max_length=20, choices=TRANSACTION_TYPES)
     reference = models.CharField(max_length=255, blank=True) # e.g. Order ID
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True)
+    balance_after = models.DecimalField(max_digits=18, decimal_places=10, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["wallet", "idempotency_key"], name="unique_wallet_idempotency_key"),
+        ]
+        indexes = [models.Index(fields=["wallet", "id"], name="wallettransaction_wallet_id")]
+
 
 # ============ USER ADDRESSES ============
 class Address(models.Model):
@@ -100,7 +124,7 @@ class Order(models.Model):
         ("refunded", "Refunded"),
     ]
 
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)  # led by order_user_created
     address = models.ForeignKey(Address, on_delete=models.SET_NULL, null=True)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     shipping_fee = models.DecimalField(max_digits=10, decimal_places=2, default=0)
@@ -109,6 +133,16 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # admin order browsing, newest first, unfiltered or by status
+            models.Index(fields=["-created_at", "-id"], name="order_created_id"),
+            models.Index(fields=["status", "-created_at", "-id"], name="order_status_created"),
+            models.Index(fields=["payment_status", "-created_at", "-id"], name="order_payment_created"),
+            # a customer's own orders, newest first, and their recent purchase history
+            models.Index(fields=["user", "-created_at", "-id"], name="order_user_created"),
+        ]
+
     def __str__(self):
         return f"Order #{self.id} by {self.user.username} - {self.status}"
 
@@ -121,11 +155,179 @@ class OrderItem(models.Model):
     unit_price = models.DecimalField(max_digits=10, decimal_places=2)
     quantity = models.PositiveIntegerField()
     subtotal = models.DecimalField(max_digits=10, decimal_places=2)
+    # Copied at checkout so purchase-history queries read this table alone:
+    # the order's user and time, and the category the product had then.
+    # Null on rows from before 0019 until backfill_order_item_history runs.
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, db_index=False, related_name="+")
+    created_at = models.DateTimeField(null=True)
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, related_name="+")
+
+    class Meta:
+        indexes = [
+            # a customer's purchases in a window, and everybody's in a window
+            models.Index(fields=["user", "created_at"], name="orderitem_user_created"),
+            models.Index(fields=["created_at"], name="orderitem_created"),
+        ]
 
     def __str__(self):
         return f"Order #{self.order.id} - {self.product_name} (x{self.quantity})"
 
 
+# ============ STOCK HOLDS ============
+class StockHold(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="stock_holds")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.user.username} holds {self.product.name} (x{self.quantity})"
+
+
+# ============ RECOMMENDATION FEATURES ============
+# Daily per-user and global purchase counts, kept up to date at checkout so
+# recommendations never aggregate raw OrderItem history on the request path.
+class UserProductStat(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    day = models.DateField()
+    quantity = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("user", "product", "day")
+        indexes = [models.Index(fields=["user", "day"], name="userproductstat_user_day")]
+
+
+class ProductPopularity(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    day = models.DateField()
+    quantity = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("product", "day")
+        indexes = [models.Index(fields=["day"], name="productpopularity_day")]
+
+
+class UserRecommendation(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="recommendation")
+    items = models.JSONField(default=list)
+    generated_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Recommendations for {self.user.username} ({len(self.items)})"
+
+
+# ============ CO-PURCHASE INDEX ============
+class ProductNeighbor(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="neighbors")
+    neighbor = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    score = models.PositiveIntegerField(default=0)  # orders containing both products
+
+    class Meta:
+        unique_together = ("product", "neighbor")
+        indexes = [models.Index(fields=["product", "-score"], name="productneighbor_product_score")]
+
+
+# ============ SALES ROLLUPS ============
+# Paid sales per day (the order's local date), kept in step with
+# Order.payment_status so reports never aggregate raw OrderItem history.
+class ProductSalesDaily(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    day = models.DateField()
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ("product", "day")
+        indexes = [models.Index(fields=["day"], name="productsalesdaily_day")]
+
+
+class CategorySalesDaily(models.Model):
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True)  # null: uncategorised
+    day = models.DateField()
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["category", "day"], condition=models.Q(category__isnull=False), name="unique_category_sales_day"
+            ),
+            models.UniqueConstraint(
+                fields=["day"], condition=models.Q(category__isnull=True), name="unique_uncategorised_sales_day"
+            ),
+        ]
+        indexes = [models.Index(fields=["day"], name="categorysalesdaily_day")]
+
+
+# ============ CATALOGUE CHANGES ============
+class CatalogueChange(models.Model):
+    # One row per product touched; the id is the catalogue version clients
+    # ask for deltas against. product_id is null for a category-only change
+    # and outlives the product, so deletions show up in deltas too.
+    product_id = models.BigIntegerField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"v{self.pk}: product #{self.product_id}"
+
+
+# ============ BATCH JOBS ============
+class JobWatermark(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    value = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+
+class AISummaryJob(models.Model):
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="ai_jobs")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            # at most one waiting job per product; re-enqueueing is a no-op
+            models.UniqueConstraint(
+                fields=["product"], condition=models.Q(status="pending"), name="unique_pending_ai_job"
+            ),
+        ]
+        indexes = [models.Index(fields=["status", "run_after"], name="aisummaryjob_status_run_after")]
+
+    def __str__(self):
+        return f"AI summary for product #{self.product_id} - {self.status}"
+
+
+class AISummaryCache(models.Model):
+    content_hash = models.CharField(max_length=64)  # sha256 of the normalized description
+    version = models.CharField(max_length=16)  # prompt + model; a new prompt misses every old entry
+    summary = models.TextField()
+    hits = models.PositiveIntegerField(default=0)  # model calls saved
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_hit_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ("version", "content_hash")
+
+    def __str__(self):
+        return f"{self.version}:{self.content_hash[:12]} ({self.hits} hits)"
+
+
 # ============ OPTIONAL: INVENTORY LOG (Admin only) ============
 class InventoryLog(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
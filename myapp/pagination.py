@@ -0,0 +1,115 @@
+import base64
+import binascii
+from datetime import datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Newest-first cursor pagination on (created_at, id).
+
+    The cursor is the last row of the previous page, so every page is one
+    index range scan no matter how deep it is, and rows inserted while a
+    client is paging never shift or repeat items.
+    """
+
+    page_size = 50
+    max_page_size = 200
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.cut_page(list(self.page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request):
+        return self.cut_page([row async for row in self.page_queryset(queryset, request)])
+
+    def page_queryset(self, queryset, request):
+        # one row past the page, to tell whether there is a next one
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by("-created_at", "-id")
+        cursor = self.decode_cursor(request)
+        if cursor:
+            created_at, pk = cursor
+            # created_at <= c AND NOT (created_at = c AND id >= pk): the first
+            # term bounds the index range, the second breaks ties on id.
+            queryset = queryset.filter(created_at__lte=created_at).exclude(created_at=created_at, id__gte=pk)
+        return queryset[:self.page_size + 1]
+
+    def cut_page(self, page):
+        self.next_row = page[self.page_size - 1] if len(page) > self.page_size else None
+        return page[:self.page_size]
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_next_link(self):
+        if self.next_row is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_row))
+
+    @staticmethod
+    def encode_cursor(row):
+        raw = f"{row.created_at.isoformat()}|{row.pk}"
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            created_at, pk = base64.urlsafe_b64decode(encoded.encode()).decode().split("|")
+            return datetime.fromisoformat(created_at), int(pk)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound("Invalid cursor")
+
+
+class OffsetPagination(BasePagination):
+    """
+    Limit/offset pages without a total count, for ranked results such as
+    search where there is no stable key to seek on. Clients only get a
+    ``next`` link, and deep pages are capped.
+    """
+
+    page_size = 20
+    max_page_size = 100
+    max_offset = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_int(request, "page_size", self.page_size, 1, self.max_page_size)
+        self.offset = self.get_int(request, "offset", 0, 0, self.max_offset)
+
+        page = list(queryset[self.offset:self.offset + self.limit + 1])
+        self.has_next = len(page) > self.limit and self.offset + self.limit <= self.max_offset
+        return page[:self.limit]
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    @staticmethod
+    def get_int(request, name, default, low, high):
+        try:
+            value = int(request.query_params.get(name, default))
+        except ValueError:
+            return default
+        return max(low, min(value, high))
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, "offset", self.offset + self.limit)
@@ -3,7 +3,7 @@ from django.contrib.auth.models import User
 from .models import (
     Category, Product, CartItem, Order, OrderItem, Address
 )
-from .services.ai import ai_summarize
+from .services.ai_jobs import enqueue_summaries
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
@@ -19,24 +19,28 @@ class ProductSerializer(serializers.ModelSerializer):
         fields = "__all__"
         read_only_fields = ["id", "created_at", "updated_at"]
 
-    def create(self, validated_data):
-        if validated_data.get("description") and not validated_data.get("ai_summary"):
-            ai_summary = ai_summarize(validated_data["description"])
-            if ai_summary:
-                validated_data["ai_summary"] = ai_summary
+    def __init__(self, *args, fields=None, **kwargs):
+        # Optional sparse fieldset, e.g. ProductSerializer(qs, many=True, fields=["id", "name"])
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
 
-        return super().create(validated_data)
+    # Summaries are written later by the run_ai_worker queue, not during the request.
+    def create(self, validated_data):
+        product = super().create(validated_data)
+        if product.description and not product.ai_summary:
+            enqueue_summaries([product.pk])
+        return product
     
     def update(self, instance, validated_data):
-        if "description" in validated_data and instance.description != validated_data.get("description"):
-            try:
-                ai_summary = ai_summarize(validated_data["description"])
-                if ai_summary:
-                    instance.ai_summary = ai_summary
-            except Exception as e:
-                pass
-
-        return super().update(instance, validated_data)
+        description_changed = validated_data.get("description", instance.description) != instance.description
+        # the admin form sends the old summary back; only a new one counts as an edit
+        summary_edited = validated_data.get("ai_summary", instance.ai_summary) != instance.ai_summary
+        product = super().update(instance, validated_data)
+        if description_changed and not summary_edited:
+            enqueue_summaries([product.pk])
+        return product
 
 
 class CartItemSerializer(serializers.ModelSerializer):
@@ -67,7 +71,7 @@ class AddressSerializer(serializers.ModelSerializer):
 class OrderItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = OrderItem
-        fields = "__all__"
+        exclude = ["user", "created_at", "category"]  # copies of the order's, for history queries
 
 
 class OrderSerializer(serializers.ModelSerializer):
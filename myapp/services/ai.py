@@ -1,25 +1,66 @@
-from google import genai
+from functools import lru_cache
 from django.conf import settings
+from django.utils.module_loading import import_string
 
-client = genai.Client(api_key=settings.GOOGLE_API_KEY)
+SUMMARY_MODEL = "gemini-2.0-flash-lite"
+
+PROMPT = """
+    Write a one-sentence professional ecommerce product summary.
+    Make it appealing, specific, and natural (not generic).
+
+    Product description:
+    {description}
+"""
+
+
+@lru_cache(maxsize=1)
+def get_client():
+    # Created on first use, so importing this module needs no API key.
+    from google import genai
+    return genai.Client(api_key=settings.GOOGLE_API_KEY)
 
 def ai_summarize(product_description):
+    from .ai_cache import content_hash, lookup_summaries, store_summaries
+
+    key = content_hash(product_description)
+    cached = lookup_summaries([key]).get(key)
+    if cached is not None:
+        return cached
+
     try:
-        prompt = f"""
-            Write a one-sentence professional ecommerce product summary.
-            Make it appealing, specific, and natural (not generic).
-
-            Product description:
-            {product_description}   
-        """
-        
-        response = client.models.generate_content(
-            model="gemini-2.0-flash-lite",
-            contents=prompt
+        response = get_client().models.generate_content(
+            model=SUMMARY_MODEL,
+            contents=PROMPT.format(description=product_description)
         )
 
-        return response.text.strip() if response.text else None
+        summary = response.text.strip() if response.text else None
     except Exception as e:
         print(f"AI error: {e}")
         return None
-    
\ No newline at end of file
+
+    if summary:
+        store_summaries({key: summary})
+    return summary
+
+
+class GeminiSummarizer:
+    """Async summarizer used by the background worker. Errors propagate so the job can be retried."""
+
+    async def summarize(self, description):
+        response = await get_client().aio.models.generate_content(
+            model=SUMMARY_MODEL,
+            contents=PROMPT.format(description=description),
+        )
+        return response.text.strip() if response.text else None
+
+
+class FakeSummarizer:
+    """Local stand-in for tests and development: no network, deterministic output."""
+
+    async def summarize(self, description):
+        first_sentence = description.strip().split(".")[0].strip()
+        return f"{first_sentence}." if first_sentence else None
+
+
+def get_summarizer():
+    return import_string(settings.AI_SUMMARIZER)()
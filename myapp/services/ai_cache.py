@@ -0,0 +1,128 @@
+import hashlib
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from django.conf import settings
+from django.db import models
+from django.db.models import Case, When, F, Sum, Count
+from django.utils import timezone
+from ..models import AISummaryCache
+from .ai import PROMPT, SUMMARY_MODEL
+
+# Changes whenever the prompt or model does, so old entries simply stop matching.
+SUMMARY_VERSION = hashlib.sha256(f"{SUMMARY_MODEL}\n{PROMPT}".encode()).hexdigest()[:16]
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize(description):
+    # Case, Unicode form and spacing differences do not change the summary.
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", description)).strip().casefold()
+
+def content_hash(description):
+    return hashlib.sha256(normalize(description).encode()).hexdigest()
+
+
+class SummaryLRU:
+    """Small thread-safe LRU of (version, hash) -> summary in front of the table."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, summary):
+        if self.maxsize <= 0:
+            return
+        with self.lock:
+            self.entries[key] = summary
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+_lru = SummaryLRU(getattr(settings, "AI_SUMMARY_LRU_SIZE", 1024))
+
+
+def clear_lru():
+    _lru.clear()
+
+def lookup_summaries(hashes, version=None):
+    """
+    Returns {hash: summary} for the cached hashes. The LRU answers what it
+    can and one query answers the rest; hit counters for the whole batch are
+    bumped in a single UPDATE.
+    """
+    version = version or SUMMARY_VERSION
+    counts = {}
+    for key in hashes:
+        counts[key] = counts.get(key, 0) + 1
+
+    found = {}
+    for key in counts:
+        summary = _lru.get((version, key))
+        if summary is not None:
+            found[key] = summary
+
+    missing = [key for key in counts if key not in found]
+    if missing:
+        rows = AISummaryCache.objects.filter(version=version, content_hash__in=missing).values_list("content_hash", "summary")
+        for key, summary in rows:
+            found[key] = summary
+            _lru.put((version, key), summary)
+
+    record_hits({key: counts[key] for key in found}, version)
+    return found
+
+def record_hits(counts, version=None):
+    """Adds {hash: n} model calls saved, in one UPDATE."""
+    if not counts:
+        return
+    version = version or SUMMARY_VERSION
+    whens = [When(content_hash=key, then=F("hits") + n) for key, n in counts.items()]
+    AISummaryCache.objects.filter(version=version, content_hash__in=counts.keys()).update(
+        hits=Case(*whens, default=F("hits"), output_field=models.PositiveIntegerField()),
+        last_hit_at=timezone.now(),
+    )
+
+def store_summaries(summaries, version=None):
+    """Saves {hash: summary} from fresh model calls."""
+    version = version or SUMMARY_VERSION
+    AISummaryCache.objects.bulk_create(
+        [AISummaryCache(content_hash=key, version=version, summary=summary) for key, summary in summaries.items()],
+        ignore_conflicts=True,
+    )
+    for key, summary in summaries.items():
+        _lru.put((version, key), summary)
+
+def summary_cache_stats():
+    """Per-version entries (one model call each) and hits (model calls saved)."""
+    rows = (
+        AISummaryCache.objects
+        .values("version")
+        .annotate(entries=Count("id"), hits=Sum("hits"))
+        .order_by("version")
+    )
+    stats = []
+    for row in rows:
+        lookups = row["entries"] + (row["hits"] or 0)
+        stats.append({
+            "version": row["version"],
+            "current": row["version"] == SUMMARY_VERSION,
+            "model_calls": row["entries"],
+            "calls_saved": row["hits"] or 0,
+            "hit_rate": round((row["hits"] or 0) / lookups, 4) if lookups else 0.0,
+        })
+    return stats
@@ -0,0 +1,157 @@
+import asyncio
+import random
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+from django.db import transaction, IntegrityError
+from django.db.models import F, Q
+from django.utils import timezone
+from ..models import AISummaryJob, Product
+from .ai import get_summarizer
+from .ai_cache import content_hash, lookup_summaries, store_summaries, record_hits
+from .read_models import invalidate_products
+
+BATCH_SIZE = 20
+CONCURRENCY = 5
+MAX_ATTEMPTS = 5
+BACKOFF_SECONDS = 30  # doubled after every failed attempt
+SUMMARY_TIMEOUT = 60
+LOCK_TIMEOUT = timedelta(minutes=10)  # a running job older than this is presumed orphaned
+
+
+def enqueue_summaries(product_ids):
+    """Queue a summary for each product. A product already waiting keeps one job, now due immediately."""
+    product_ids = list(product_ids)
+    if not product_ids:
+        return
+
+    AISummaryJob.objects.bulk_create([AISummaryJob(product_id=pid) for pid in product_ids], ignore_conflicts=True)
+    # the description changed again, so earlier failures no longer count
+    AISummaryJob.objects.filter(product_id__in=product_ids, status="pending").update(
+        run_after=timezone.now(), attempts=0, last_error=""
+    )
+
+@transaction.atomic
+def claim_jobs(batch_size=BATCH_SIZE, now=None):
+    now = now or timezone.now()
+    ready = Q(status="pending", run_after__lte=now) | Q(status="running", locked_at__lt=now - LOCK_TIMEOUT)
+    jobs = list(
+        AISummaryJob.objects
+        .select_for_update(skip_locked=True, of=("self",))
+        .select_related("product")
+        .filter(ready)
+        .order_by("run_after", "id")[:batch_size]
+    )
+    if not jobs:
+        return []
+
+    AISummaryJob.objects.filter(pk__in=[j.pk for j in jobs]).update(
+        status="running", locked_at=now, attempts=F("attempts") + 1
+    )
+    for job in jobs:
+        job.attempts += 1
+        # what the summary is written for; a later edit makes it stale
+        job.description = job.product.description
+        job.content_hash = content_hash(job.description)
+        job.shared_call = False
+
+    cached = lookup_summaries([job.content_hash for job in jobs if job.description.strip()])
+    for job in jobs:
+        job.cached_summary = cached.get(job.content_hash)
+    return jobs
+
+def retry_delay(attempts):
+    return timedelta(seconds=BACKOFF_SECONDS * 2 ** (attempts - 1) * random.uniform(1, 1.5))
+
+@transaction.atomic
+def finish_jobs(results, now=None):
+    """Write back (job, summary, error) results from summarize_jobs."""
+    now = now or timezone.now()
+    done, summarized = [], []
+    fresh = [(job, summary) for job, summary, error in results if error is None and summary and job.cached_summary is None]
+    store_summaries({job.content_hash: summary for job, summary in fresh})
+    shared = {}
+    for job, _ in fresh:
+        if job.shared_call:
+            shared[job.content_hash] = shared.get(job.content_hash, 0) + 1
+    record_hits(shared)
+
+    for job, summary, error in results:
+        if error is None:
+            if summary:
+                # Skipped if the description was edited meanwhile; that edit queued a new job.
+                Product.objects.filter(pk=job.product_id, description=job.description).update(
+                    ai_summary=summary, updated_at=now
+                )
+                summarized.append(job.product_id)
+            done.append(job.pk)
+            continue
+
+        message = f"{type(error).__name__}: {error}"[:1000]
+        if job.attempts >= MAX_ATTEMPTS:
+            AISummaryJob.objects.filter(pk=job.pk).update(status="failed", last_error=message)
+            continue
+
+        try:
+            with transaction.atomic():
+                AISummaryJob.objects.filter(pk=job.pk).update(
+                    status="pending", run_after=now + retry_delay(job.attempts), locked_at=None, last_error=message
+                )
+        except IntegrityError:
+            # a newer job for the same product is already waiting
+            done.append(job.pk)
+
+    AISummaryJob.objects.filter(pk__in=done).update(status="done", locked_at=None)
+    invalidate_products(summarized)
+
+async def call_model(description, summarizer, semaphore, timeout=SUMMARY_TIMEOUT):
+    async with semaphore:
+        return await asyncio.wait_for(summarizer.summarize(description), timeout)
+
+async def summarize_job(job, summarizer, semaphore, calls):
+    if not job.description.strip():
+        return job, None, None
+    if job.cached_summary is not None:
+        return job, job.cached_summary, None
+
+    # Jobs with the same description share one model call.
+    call = calls.get(job.content_hash)
+    job.shared_call = call is not None
+    if call is None:
+        call = calls[job.content_hash] = asyncio.ensure_future(call_model(job.description, summarizer, semaphore))
+    try:
+        summary = await asyncio.shield(call)
+    except Exception as e:
+        return job, None, e
+    return job, summary, None
+
+async def run_worker(batch_size=BATCH_SIZE, concurrency=CONCURRENCY, once=False, poll_interval=2.0, summarizer=None):
+    """
+    Claim jobs in batches and summarize up to ``concurrency`` at a time.
+    New batches are claimed as soon as slots free up, so one slow call does
+    not hold back the rest. With ``once`` it returns when no job is due.
+    """
+    summarizer = summarizer or get_summarizer()
+    semaphore = asyncio.Semaphore(concurrency)
+    calls = {}  # content hash -> model call in progress
+    in_flight = set()
+    processed = 0
+
+    while True:
+        if len(in_flight) < concurrency:
+            jobs = await sync_to_async(claim_jobs)(batch_size)
+            in_flight |= {asyncio.ensure_future(summarize_job(job, summarizer, semaphore, calls)) for job in jobs}
+
+        if not in_flight:
+            if once:
+                return processed
+            await asyncio.sleep(poll_interval)
+            continue
+
+        finished, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+        results = [task.result() for task in finished]
+        await sync_to_async(finish_jobs)(results)
+        processed += len(finished)
+        # stored in the cache by now, or failed and due for a retry
+        for job, _, _ in results:
+            if job.content_hash in calls and calls[job.content_hash].done():
+                del calls[job.content_hash]
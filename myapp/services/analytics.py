@@ -0,0 +1,275 @@
+import os
+import shutil
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from pathlib import Path
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+from ..models import OrderItem, JobWatermark
+
+WATERMARK = "analytics_export"
+TABLE = "order_lines"
+ROWS_PER_PART = 1_000_000
+CHUNK_SIZE = 5000
+# Orders younger than this are left for the next run, so a checkout still
+# committing when the export starts is not skipped past by the watermark.
+SETTLE = timedelta(minutes=1)
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+PERIODS = ("day", "week", "month")
+
+# One row per OrderItem. created_at is UTC microseconds, day the local date
+# the sales reports use; a deleted product or missing category is -1.
+COLUMNS = {
+    "order_id": np.int64,
+    "user_id": np.int64,
+    "product_id": np.int64,
+    "category_id": np.int64,
+    "created_at": "datetime64[us]",
+    "day": "datetime64[D]",
+    "quantity": np.int64,
+    "revenue_cents": np.int64,
+    "paid": np.bool_,
+}
+ITEM_FIELDS = (
+    "order_id", "order__user_id", "product_id", "product__category_id", "order__created_at",
+    "quantity", "unit_price", "order__payment_status",
+)
+
+
+def to_micros(moment):
+    return (moment - EPOCH) // timedelta(microseconds=1)
+
+def from_micros(value):
+    return EPOCH + timedelta(microseconds=value)
+
+def analytics_dir(root=None):
+    return Path(root or settings.ANALYTICS_DIR) / TABLE
+
+def get_watermark(name=WATERMARK):
+    return JobWatermark.objects.filter(name=name).values_list("value", flat=True).first() or 0
+
+
+# ------------------------------------------
+# EXPORT
+# ------------------------------------------
+
+class PartWriter:
+    """
+    Buffers rows and writes them as month=YYYY-MM/part-<tag>-<seq>/, one .npy
+    file per column. A part is written under a .tmp name and renamed into
+    place, so readers never see half of one. Parts are only cut between
+    orders, so every order's lines live in a single part.
+    """
+
+    def __init__(self, root, tag, rows_per_part=ROWS_PER_PART):
+        self.root = root
+        self.tag = tag
+        self.rows_per_part = rows_per_part
+        self.month = None
+        self.columns = {name: [] for name in COLUMNS}
+        self.parts = 0
+        self.rows = 0
+
+    def clear_stale(self):
+        # Parts from an earlier run with the same starting watermark were
+        # never committed; that run is being redone.
+        for stale in list(self.root.glob(f"month=*/part-{self.tag}-*")):
+            shutil.rmtree(stale)
+
+    def add_order(self, month, rows):
+        buffered = len(self.columns["order_id"])
+        if buffered and (month != self.month or buffered >= self.rows_per_part):
+            self.flush()
+        self.month = month
+        for row in rows:
+            for name, value in zip(COLUMNS, row):
+                self.columns[name].append(value)
+
+    def flush(self):
+        if not self.columns["order_id"]:
+            return
+
+        final = self.root / f"month={self.month}" / f"part-{self.tag}-{self.parts:04d}"
+        tmp = final.with_name(final.name + ".tmp")
+        tmp.mkdir(parents=True, exist_ok=True)
+        for name, dtype in COLUMNS.items():
+            values = self.columns[name]
+            if name == "created_at":
+                column = np.array(values, dtype=np.int64).view(dtype)
+            else:
+                column = np.array(values, dtype=dtype)
+            np.save(tmp / f"{name}.npy", column)
+        os.replace(tmp, final)
+
+        self.parts += 1
+        self.rows += len(self.columns["order_id"])
+        self.columns = {name: [] for name in COLUMNS}
+
+def iter_orders(since, until, chunk_size=CHUNK_SIZE):
+    """Yields (local month, [column tuple, ...]) per order created in (since, until], oldest first."""
+    rows = (
+        OrderItem.objects
+        .filter(order__created_at__gt=since, order__created_at__lte=until)
+        .order_by("order__created_at", "order_id", "id")
+        .values_list(*ITEM_FIELDS)
+        .iterator(chunk_size=chunk_size)
+    )
+
+    current, lines, month = None, [], None
+    for order_id, user_id, product_id, category_id, created_at, quantity, unit_price, payment in rows:
+        if order_id != current:
+            if lines:
+                yield month, lines
+            day = timezone.localdate(created_at)
+            current, lines, month = order_id, [], day.strftime("%Y-%m")
+        lines.append((
+            order_id, user_id,
+            -1 if product_id is None else product_id,
+            -1 if category_id is None else category_id,
+            to_micros(created_at), day, quantity, int(quantity * unit_price * 100), payment == "paid",
+        ))
+    if lines:
+        yield month, lines
+
+def export_order_history(root=None, settle=SETTLE, rows_per_part=ROWS_PER_PART, watermark=WATERMARK):
+    """
+    Appends orders created since the last export to the columnar store and
+    moves the watermark. Each line carries its payment status as of the
+    export; a full re-export picks up later refunds.
+    Returns (rows, parts, new watermark datetime).
+    """
+    since = get_watermark(watermark)
+    until = timezone.now() - settle
+    if to_micros(until) <= since:
+        return 0, 0, from_micros(since)
+
+    writer = PartWriter(analytics_dir(root), since, rows_per_part)
+    writer.clear_stale()
+    for month, lines in iter_orders(from_micros(since), until):
+        writer.add_order(month, lines)
+    writer.flush()
+
+    # Only once every part is on disk; a crash before here reruns the same window.
+    JobWatermark.objects.update_or_create(name=watermark, defaults={"value": to_micros(until)})
+    return writer.rows, writer.parts, until
+
+def reset_order_history(root=None, watermark=WATERMARK):
+    shutil.rmtree(analytics_dir(root), ignore_errors=True)
+    JobWatermark.objects.filter(name=watermark).delete()
+
+
+# ------------------------------------------
+# OFFLINE QUERIES
+# ------------------------------------------
+
+def cents(value):
+    return Decimal(int(value)).scaleb(-2)
+
+def group_sum(keys, *values):
+    """Unique keys, then per key the sum of each of ``values`` (the row count if none are given)."""
+    unique, inverse = np.unique(keys, return_inverse=True)
+    sums = [np.bincount(inverse, weights=v, minlength=len(unique)) for v in values or [None]]
+    return (unique, *(np.rint(s).astype(np.int64) for s in sums))
+
+def add_totals(totals, keys, part, mask):
+    # totals[key] = (quantity, revenue cents), summed across parts
+    unique, quantity, revenue = group_sum(keys, part["quantity"][mask], part["revenue_cents"][mask])
+    for key, qty, rev in zip(unique.tolist(), quantity.tolist(), revenue.tolist()):
+        old = totals.get(key, (0, 0))
+        totals[key] = (old[0] + qty, old[1] + rev)
+
+def week_start(days):
+    # datetime64[D] counts from Thursday 1970-01-01; step back to Monday
+    return days - ((days.view(np.int64) + 3) % 7).astype("timedelta64[D]")
+
+
+class Part:
+    """Columns of one part, memory-mapped on first use."""
+
+    def __init__(self, path):
+        self.path = path
+        self.cache = {}
+
+    def __getitem__(self, name):
+        if name not in self.cache:
+            self.cache[name] = np.load(self.path / f"{name}.npy", mmap_mode="r")
+        return self.cache[name]
+
+
+class OrderHistory:
+    """
+    Read-only queries over the exported order lines. Nothing here touches
+    the database: month directories outside the date range are skipped by
+    name, and the rest are scanned part by part with NumPy, so memory is
+    bounded by the largest part rather than the whole history.
+    """
+
+    def __init__(self, root=None):
+        self.root = analytics_dir(root)
+
+    def parts(self, start=None, end=None):
+        for month_dir in sorted(self.root.glob("month=*")):
+            month = month_dir.name.split("=", 1)[1]
+            if (start and month < start.strftime("%Y-%m")) or (end and month > end.strftime("%Y-%m")):
+                continue
+            for path in sorted(month_dir.glob("part-*")):
+                if not path.name.endswith(".tmp"):
+                    yield Part(path)
+
+    def scan(self, start=None, end=None, paid_only=True):
+        """Yields (part, row mask) for rows on days in [start, end]."""
+        for part in self.parts(start, end):
+            mask = np.array(part["paid"]) if paid_only else np.ones(len(part["order_id"]), dtype=bool)
+            if start:
+                mask &= part["day"] >= np.datetime64(start, "D")
+            if end:
+                mask &= part["day"] <= np.datetime64(end, "D")
+            if mask.any():
+                yield part, mask
+
+    def revenue_by_period(self, period="month", start=None, end=None, paid_only=True):
+        """[(period start date, quantity, revenue)], oldest first."""
+        totals = {}
+        for part, mask in self.scan(start, end, paid_only):
+            days = part["day"][mask]
+            if period == "month":
+                keys = days.astype("datetime64[M]").astype("datetime64[D]")
+            elif period == "week":
+                keys = week_start(days)
+            else:
+                keys = days
+            add_totals(totals, keys, part, mask)
+
+        return [(day, qty, cents(rev)) for day, (qty, rev) in sorted(totals.items())]
+
+    def basket_sizes(self, start=None, end=None, paid_only=True, units=False):
+        """{basket size: orders}, counting lines per order, or units with ``units``."""
+        histogram = np.zeros(0, dtype=np.int64)
+        for part, mask in self.scan(start, end, paid_only):
+            weights = (part["quantity"][mask],) if units else ()
+            _, sizes = group_sum(part["order_id"][mask], *weights)
+            counts = np.bincount(sizes)
+            if len(counts) > len(histogram):
+                histogram = np.pad(histogram, (0, len(counts) - len(histogram)))
+            histogram[:len(counts)] += counts
+
+        return {size: int(n) for size, n in enumerate(histogram.tolist()) if n}
+
+    def category_mix(self, start=None, end=None, paid_only=True):
+        """[{category_id, quantity, revenue, share}] by revenue, share being of total revenue."""
+        totals = {}
+        for part, mask in self.scan(start, end, paid_only):
+            add_totals(totals, part["category_id"][mask], part, mask)
+
+        overall = sum(rev for _, rev in totals.values()) or 1
+        mix = [
+            {
+                "category_id": None if key == -1 else key,
+                "quantity": qty,
+                "revenue": cents(rev),
+                "share": rev / overall,
+            }
+            for key, (qty, rev) in totals.items()
+        ]
+        return sorted(mix, key=lambda row: (-row["revenue"], row["category_id"] or 0))
@@ -0,0 +1,103 @@
+import threading
+import time
+from collections import Counter
+from django.conf import settings
+from django.core.cache import caches
+
+DEFAULT_TTL = 300
+LOCK_TIMEOUT = 30
+WAIT_INTERVAL = 0.05
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _cache():
+    return caches[getattr(settings, "AGGREGATE_CACHE_ALIAS", "default")]
+
+def _count(event):
+    with _stats_lock:
+        _stats[event] += 1
+
+def cache_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+
+    lookups = stats.get("hit", 0) + stats.get("stale", 0) + stats.get("miss", 0)
+    stats["hit_rate"] = round((stats.get("hit", 0) + stats.get("stale", 0)) / lookups, 4) if lookups else 0.0
+    return stats
+
+def reset_cache_stats():
+    with _stats_lock:
+        _stats.clear()
+
+def _version_key(namespace):
+    return f"agg-version:{namespace}"
+
+def _version(cache, namespace):
+    version = cache.get(_version_key(namespace))
+    if version is None:
+        cache.add(_version_key(namespace), 1, timeout=None)
+        version = cache.get(_version_key(namespace), 1)
+    return version
+
+def namespace_version(namespace):
+    """Current version of ``namespace``; changes on every ``invalidate``."""
+    return _version(_cache(), namespace)
+
+def invalidate(namespace):
+    cache = _cache()
+    try:
+        cache.incr(_version_key(namespace))
+    except ValueError:
+        cache.set(_version_key(namespace), 2, timeout=None)
+    _count("invalidate")
+
+def _refresh(cache, key, compute, ttl):
+    value = compute()
+    # Keep the entry around for a second TTL past its freshness so that while
+    # one worker recomputes, everybody else can keep serving the old value.
+    cache.set(key, (value, time.time() + ttl), timeout=ttl * 2)
+    _count("recompute")
+    return value
+
+def cached(namespace, compute, ttl=DEFAULT_TTL, suffix=""):
+    cache = _cache()
+    key = f"agg:{namespace}:{_version(cache, namespace)}:{suffix}"
+    lock_key = f"{key}:lock"
+
+    entry = cache.get(key)
+    if entry is not None:
+        value, fresh_until = entry
+        if time.time() < fresh_until:
+            _count("hit")
+            return value
+
+        _count("stale")
+        if cache.add(lock_key, 1, timeout=LOCK_TIMEOUT):
+            try:
+                return _refresh(cache, key, compute, ttl)
+            finally:
+                cache.delete(lock_key)
+        return value
+
+    _count("miss")
+    if cache.add(lock_key, 1, timeout=LOCK_TIMEOUT):
+        try:
+            return _refresh(cache, key, compute, ttl)
+        finally:
+            cache.delete(lock_key)
+
+    # Someone else is computing this value: wait for it rather than piling
+    # the same aggregate onto the database, but never longer than the lock.
+    deadline = time.time() + LOCK_TIMEOUT
+    while time.time() < deadline:
+        time.sleep(WAIT_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            _count("waited")
+            return entry[0]
+        if cache.get(lock_key) is None:
+            break
+
+    return _refresh(cache, key, compute, ttl)
@@ -0,0 +1,158 @@
+import hashlib
+import json
+from decimal import Decimal
+from django.db import models, transaction
+from django.db.models import Case, When, F, OuterRef, Subquery
+from django.db.models.functions import Greatest
+from ..models import CartItem, Product
+from .checkout import shipping_fee_for
+
+LINE_FIELDS = (
+    "id", "quantity", "added_at",
+    "product_id", "product__name", "product__price", "product__image_url", "product__stock",
+    "product__category__name",
+)
+MAX_SYNC_LINES = 200
+
+
+class CartError(Exception):
+    pass
+
+
+def cart_lines(user):
+    return CartItem.objects.filter(user=user).order_by("added_at", "id").values_list(*LINE_FIELDS)
+
+def cart_snapshot(user):
+    """
+    The cart as the app renders it, from one joined query: each line with a
+    compact product projection and its subtotal, plus the totals and shipping
+    fee checkout would charge. Money is sent as strings, like the serializers.
+    """
+    return snapshot_from_rows(cart_lines(user))
+
+async def acart_snapshot(user):
+    return snapshot_from_rows([row async for row in cart_lines(user)])
+
+def snapshot_from_rows(rows):
+    lines = []
+    subtotal = Decimal("0.00")
+    for line_id, quantity, added_at, pid, name, price, image_url, stock, category_name in rows:
+        line_total = quantity * price
+        subtotal += line_total
+        lines.append({
+            "id": line_id,
+            "product": {
+                "id": pid, "name": name, "price": str(price), "image_url": image_url,
+                "stock": stock, "category_name": category_name,
+            },
+            "quantity": quantity,
+            "subtotal": str(line_total),
+            "added_at": added_at.isoformat(),
+        })
+
+    shipping_fee = shipping_fee_for(subtotal) if lines else Decimal("0.00")
+    return {
+        "items": lines,
+        "subtotal": str(subtotal),
+        "shipping_fee": str(shipping_fee),
+        "total": str(subtotal + shipping_fee),
+    }
+
+def snapshot_etag(snapshot):
+    # Any change to a line, a price or the totals changes the body, and so the tag.
+    body = json.dumps(snapshot, sort_keys=True, separators=(",", ":"))
+    return f'"{hashlib.sha256(body.encode()).hexdigest()[:32]}"'
+
+def parse_lines(lines, relative=False):
+    """
+    [{"product_id": .., "quantity": ..}, ...] as {product_id: quantity}.
+    Relative lines may be negative and repeat a product (they add up);
+    absolute ones may not.
+    """
+    if not isinstance(lines, list):
+        raise CartError("Expected a list of {product_id, quantity}")
+    if len(lines) > MAX_SYNC_LINES:
+        raise CartError(f"At most {MAX_SYNC_LINES} lines per request")
+
+    quantities = {}
+    for line in lines:
+        try:
+            pid, quantity = int(line["product_id"]), int(line["quantity"])
+        except (KeyError, TypeError, ValueError):
+            raise CartError("Each line needs an integer product_id and quantity")
+        if relative:
+            quantities[pid] = quantities.get(pid, 0) + quantity
+            continue
+        if quantity < 0:
+            raise CartError("Quantities cannot be negative")
+        if pid in quantities:
+            raise CartError(f"Product {pid} listed twice")
+        quantities[pid] = quantity
+    return quantities
+
+def _check_lines(user, wanted, relative):
+    """
+    One query for every product named: it must exist, and a line that grows
+    must fit its stock. Lowering a line is always allowed, even one left
+    above stock after the stock dropped. ``relative`` adds ``wanted`` to
+    what is already in the cart. Returns {product_id: new quantity}.
+
+    The check takes no locks, so two concurrent adds can both pass and
+    take the line past stock. That is deliberate: locking products here
+    would queue every cart change behind checkout, and stock is only
+    claimed by hold_cart and checkout, which lock and check it again.
+    """
+    in_cart = CartItem.objects.filter(user=user, product=OuterRef("pk")).values("quantity")[:1]
+    rows = (
+        Product.objects
+        .filter(pk__in=wanted.keys())
+        .annotate(in_cart=Subquery(in_cart))
+        .values_list("id", "name", "stock", "in_cart")
+    )
+
+    found, short = {}, []
+    for pid, name, stock, current in rows:
+        quantity = max(0, (current or 0) + wanted[pid]) if relative else wanted[pid]
+        if quantity > max(stock, current or 0):
+            short.append(f"{name} ({stock} left)")
+        found[pid] = quantity
+
+    missing = sorted(set(wanted) - set(found))
+    if missing:
+        raise CartError(f"Product not found: {', '.join(map(str, missing))}")
+    if short:
+        raise CartError(f"Not enough stock for: {', '.join(short)}")
+    return found
+
+@transaction.atomic
+def replace_cart(user, quantities):
+    """
+    Makes the cart exactly ``quantities`` ({product_id: quantity}): one upsert
+    on (user, product) and one delete for everything else.
+    """
+    _check_lines(user, quantities, relative=False)
+    keep = {pid: qty for pid, qty in quantities.items() if qty > 0}
+
+    CartItem.objects.bulk_create(
+        [CartItem(user=user, product_id=pid, quantity=qty) for pid, qty in keep.items()],
+        update_conflicts=True, unique_fields=["user", "product"], update_fields=["quantity"],
+    )
+    CartItem.objects.filter(user=user).exclude(product_id__in=keep.keys()).delete()
+
+@transaction.atomic
+def apply_cart_deltas(user, deltas):
+    """
+    Adds each {product_id: n} to the cart (n may be negative). Missing lines
+    are inserted at zero, every line moves with one F() update so concurrent
+    adds never lose a unit, and lines that reach zero are deleted.
+    """
+    _check_lines(user, deltas, relative=True)
+
+    CartItem.objects.bulk_create(
+        [CartItem(user=user, product_id=pid, quantity=0) for pid, n in deltas.items() if n > 0],
+        ignore_conflicts=True,
+    )
+    lines = CartItem.objects.filter(user=user, product_id__in=deltas.keys())
+    whens = [When(product_id=pid, then=Greatest(F("quantity") + n, 0)) for pid, n in deltas.items()]
+    lines.update(quantity=Case(*whens, default=F("quantity"), output_field=models.PositiveIntegerField()))
+    lines.filter(quantity=0).delete()
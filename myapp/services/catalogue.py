@@ -0,0 +1,149 @@
+import hashlib
+import json
+import time
+from datetime import timedelta
+from django.core.cache import cache
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+from ..models import CatalogueChange, Category, JobWatermark, Product
+
+SNAPSHOT_KEY = "catalogue:snapshot"
+CHECKED_KEY = "catalogue:snapshot:checked"
+LOCK_KEY = "catalogue:snapshot:lock"
+LOCK_TIMEOUT = 30
+# A snapshot is compared with the change log at most this often, so it can
+# lag a change by this long and a burst of edits costs one rebuild.
+REBUILD_INTERVAL = 2
+# Sequence values are handed out at insert, not commit, so a delta also
+# re-sends changes logged shortly before the client's version.
+SETTLE = timedelta(minutes=1)
+RETENTION = timedelta(days=7)
+PRUNED = "catalogue_changes_pruned"
+SUMMARY_FIELDS = ("id", "name", "price", "image_url", "category_id")
+
+
+# ------------------------------------------
+# CHANGE LOG
+# ------------------------------------------
+
+def record_changes(product_ids):
+    """
+    Logs ``product_ids`` (None for a category-only change) as changed in the
+    current transaction. Nothing is rebuilt here; the next snapshot check
+    after commit sees the new rows and rebuilds the snapshot once.
+    """
+    CatalogueChange.objects.bulk_create([CatalogueChange(product_id=pk) for pk in set(product_ids)])
+
+def current_version():
+    last = CatalogueChange.objects.aggregate(last=Max("id"))["last"]
+    if last is None:
+        last = JobWatermark.objects.filter(name=PRUNED).values_list("value", flat=True).first() or 0
+    return last
+
+def change_stamp():
+    # Max(id) alone misses a change that commits after a later one, its id
+    # being below the max; the count still moves.
+    stamp = CatalogueChange.objects.aggregate(last=Max("id"), count=Count("id"))
+    return stamp["last"], stamp["count"]
+
+def prune_changes(now=None):
+    """Drops changes older than RETENTION; deltas from before them get the full snapshot instead."""
+    cutoff = (now or timezone.now()) - RETENTION
+    last = CatalogueChange.objects.filter(created_at__lt=cutoff).aggregate(last=Max("id"))["last"]
+    if last:
+        CatalogueChange.objects.filter(pk__lte=last).delete()
+        JobWatermark.objects.update_or_create(name=PRUNED, defaults={"value": last})
+
+def on_product_change(sender, instance, **kwargs):
+    record_changes([instance.pk])
+
+def on_category_change(sender, instance, **kwargs):
+    record_changes([None])
+
+def on_category_delete(sender, instance, **kwargs):
+    # Its products lose their category through a SET NULL update that sends no signals.
+    record_changes([None, *Product.objects.filter(category=instance).values_list("id", flat=True)])
+
+
+# ------------------------------------------
+# SNAPSHOT AND DELTAS
+# ------------------------------------------
+
+def category_rows():
+    return list(Category.objects.order_by("id").values("id", "name"))
+
+def product_summaries(products):
+    # Stock is left out: it moves with every checkout and would rebuild the
+    # snapshot on each order. Product detail and the cart carry it live.
+    rows = products.order_by("-created_at", "-id").values_list(*SUMMARY_FIELDS)
+    return [
+        {"id": pk, "name": name, "price": str(price), "image_url": image_url, "category": category_id}
+        for pk, name, price, image_url, category_id in rows
+    ]
+
+def build_snapshot():
+    prune_changes()
+    # Read before the rows, so the version never claims more than the body holds.
+    stamp = change_stamp()
+    version = current_version()
+    data = {"version": version, "categories": category_rows(), "products": product_summaries(Product.objects.all())}
+    body = json.dumps(data, separators=(",", ":")).encode()
+    return {
+        "version": version,
+        "stamp": stamp,
+        "etag": f'"{version}-{hashlib.sha256(body).hexdigest()[:16]}"',
+        "body": body,
+    }
+
+def catalogue_snapshot():
+    """
+    {"version", "etag", "body", ...} for the whole catalogue, body being
+    ready-to-send JSON. Served from the cache and compared with the change
+    log in the database at most every REBUILD_INTERVAL; rebuilt by one
+    worker at a time once it is behind. The database is the reference, not
+    a cache counter, so a change made by another process is picked up even
+    where each process has its own cache.
+    """
+    entries = cache.get_many([SNAPSHOT_KEY, CHECKED_KEY])
+    snapshot = entries.get(SNAPSHOT_KEY)
+    if snapshot is not None and time.time() < entries.get(CHECKED_KEY, 0) + REBUILD_INTERVAL:
+        return snapshot
+
+    locked = False
+    if snapshot is not None:
+        if snapshot["stamp"] == change_stamp():
+            cache.set(CHECKED_KEY, time.time(), timeout=None)
+            return snapshot
+        locked = cache.add(LOCK_KEY, 1, timeout=LOCK_TIMEOUT)
+        if not locked:
+            return snapshot
+
+    try:
+        snapshot = build_snapshot()
+        cache.set_many({SNAPSHOT_KEY: snapshot, CHECKED_KEY: time.time()}, timeout=None)
+    finally:
+        if locked:
+            cache.delete(LOCK_KEY)
+    return snapshot
+
+def catalogue_delta(since):
+    """
+    What changed after version ``since``: the current categories, summaries
+    of changed products that still exist and the ids of deleted ones. None
+    if ``since`` is unknown or already pruned; the client reloads instead.
+    """
+    marker = CatalogueChange.objects.filter(pk=since).values_list("created_at", flat=True).first()
+    if marker is None:
+        return None
+
+    version = current_version()
+    changes = CatalogueChange.objects.filter(Q(pk__gt=since) | Q(created_at__gte=marker - SETTLE))
+    changed = set(changes.filter(product_id__isnull=False).values_list("product_id", flat=True))
+    products = product_summaries(Product.objects.filter(pk__in=changed))
+    return {
+        "version": version,
+        "since": since,
+        "categories": category_rows(),
+        "products": products,
+        "removed": sorted(changed - {p["id"] for p in products}),
+    }
@@ -0,0 +1,116 @@
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from ..models import Product, CartItem, Order, OrderItem, StockHold
+from .inventory import consume_holds, InsufficientStock
+from .wallet import debit, lock_wallet, replayed, WalletError
+from .features import record_order
+from .purchase_history import snapshot
+from .sales import record_sales, order_day, PAID
+
+FREE_SHIPPING_THRESHOLD = Decimal("50")
+SHIPPING_FEE = Decimal("5.00")
+
+
+class CheckoutError(Exception):
+    pass
+
+
+def shipping_fee_for(total):
+    return SHIPPING_FEE if total < FREE_SHIPPING_THRESHOLD else Decimal("0.00")
+
+def order_reference(order_id):
+    return f"Order #{order_id}"
+
+def replayed_order(user, payment):
+    """The order a wallet payment was taken for, from the ledger reference."""
+    order_id = payment.reference.removeprefix(order_reference(""))
+    order = Order.objects.filter(user=user, pk=order_id).first() if order_id.isdigit() else None
+    if order is None:
+        raise CheckoutError("Idempotency key already used")
+    return order
+
+@transaction.atomic
+def place_order_from_cart(user, address, payment, idempotency_key=None):
+    if payment == "wallet":
+        # Wallet first, before anything is written: a retry with a key that
+        # already paid gets that order back, and the lock makes a concurrent
+        # retry wait here instead of building a second order. Every wallet
+        # checkout takes this lock before the product locks below.
+        try:
+            previous = replayed(lock_wallet(user), idempotency_key, "payment")
+        except WalletError as e:
+            raise CheckoutError(str(e))
+        if previous:
+            return replayed_order(user, previous)
+
+    cart_items = list(CartItem.objects.filter(user=user).select_related("product"))
+    if not cart_items:
+        raise CheckoutError("Cart empty")
+
+    quantities = {}
+    for item in cart_items:
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+
+    # Lock every affected product in a single query, in pk order so two
+    # concurrent checkouts always acquire the row locks in the same order.
+    # That includes products only held, whose stock goes back: all of them
+    # are locked before consume_holds locks the holds, as hold_cart does.
+    held = StockHold.objects.filter(user=user, expires_at__gt=timezone.now()).values("product_id")
+    products = {
+        p.id: p
+        for p in Product.objects.select_for_update().filter(Q(pk__in=quantities.keys()) | Q(pk__in=held)).order_by("pk")
+    }
+
+    lines = []
+    total = Decimal("0")
+    for item in cart_items:
+        product = products.get(item.product_id)
+        if product is None:
+            raise CheckoutError("Product no longer available")
+
+        subtotal = item.quantity * product.price
+        lines.append((product, item.quantity, subtotal))
+        total += subtotal
+
+    is_paid = PAID if payment in ("paypal", "wallet") else "unpaid"
+
+    order = Order.objects.create(
+        user=user,
+        address=address,
+        total_amount=total,
+        shipping_fee=shipping_fee_for(total),
+        status="pending",
+        payment_status=is_paid,
+    )
+
+    OrderItem.objects.bulk_create([
+        OrderItem(
+            order=order,
+            product=product,
+            product_name=product.name,
+            unit_price=product.price,
+            quantity=quantity,
+            subtotal=subtotal,
+            **snapshot(order, product),
+        )
+        for product, quantity, subtotal in lines
+    ])
+
+    try:
+        consume_holds(user, quantities, order_reference(order.id))
+        if payment == "wallet":
+            debit(user, order.total_amount, order_reference(order.id), idempotency_key)
+    except (InsufficientStock, WalletError) as e:
+        raise CheckoutError(str(e))
+
+    record_order(order, quantities)
+    if order.payment_status == PAID:
+        record_sales(order_day(order), [
+            (product.id, product.category_id, quantity, subtotal) for product, quantity, subtotal in lines
+        ])
+
+    CartItem.objects.filter(user=user).delete()
+
+    return order
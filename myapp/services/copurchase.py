@@ -0,0 +1,181 @@
+import heapq
+from collections import defaultdict
+from datetime import timedelta
+from functools import reduce
+from itertools import combinations
+from operator import or_
+from django.db import models, transaction
+from django.db.models import Case, When, F, Q, Sum
+from django.utils import timezone
+from ..models import Order, OrderItem, CartItem, ProductNeighbor, JobWatermark
+
+TOP_N = 20
+MAX_PAIRS = 5_000_000
+ORDER_CHUNK_SIZE = 5000
+WATERMARK = "copurchase"
+# Order ids are handed out at insert but become visible at commit, so an
+# order with a lower id can appear after a higher one. Only orders older
+# than this are counted; by then everything inserted before them has
+# committed, and an id watermark never passes an order still in flight.
+SETTLE = timedelta(minutes=5)
+
+
+class PairCounter:
+    """
+    Counts how many orders contain each unordered product pair.
+
+    Memory is capped at ``max_pairs`` entries with lossy counting: when the
+    table fills up, the rarest pairs are dropped and ``floor`` records the
+    largest count that may have been lost, so every kept count is low by at
+    most ``floor``. Frequent pairs, the ones that make it into a top-N list,
+    survive.
+    """
+
+    def __init__(self, max_pairs=MAX_PAIRS):
+        self.max_pairs = max_pairs
+        self.counts = defaultdict(int)
+        self.floor = 0
+        self.orders = 0
+
+    def add_order(self, product_ids):
+        self.orders += 1
+        for pair in combinations(sorted(set(product_ids)), 2):
+            self.counts[pair] += 1
+
+        if len(self.counts) > self.max_pairs:
+            self.prune()
+
+    def prune(self):
+        while len(self.counts) > self.max_pairs * 3 // 4:
+            self.floor += 1
+            self.counts = defaultdict(int, ((k, v) for k, v in self.counts.items() if v > self.floor))
+
+    def top_neighbors(self, top_n=TOP_N):
+        heaps = defaultdict(list)
+        for (a, b), count in self.counts.items():
+            for product, neighbor in ((a, b), (b, a)):
+                heap = heaps[product]
+                if len(heap) < top_n:
+                    heapq.heappush(heap, (count, -neighbor))
+                elif (count, -neighbor) > heap[0]:
+                    heapq.heapreplace(heap, (count, -neighbor))
+
+        for product, heap in heaps.items():
+            for count, neighbor in heap:
+                yield product, -neighbor, count
+
+
+def settled_orders(after_order_id=0, settle=None, now=None):
+    """Orders after the given id, up to the first one placed within ``settle`` (default SETTLE)."""
+    cutoff = (now or timezone.now()) - (SETTLE if settle is None else settle)
+    orders = Order.objects.filter(pk__gt=after_order_id)
+    first_recent = orders.filter(created_at__gte=cutoff).order_by("pk").values_list("pk", flat=True).first()
+    return orders if first_recent is None else orders.filter(pk__lt=first_recent)
+
+def iter_baskets(orders, chunk_size=ORDER_CHUNK_SIZE):
+    """Yields (order_id, [product_id, ...]) for ``orders``, in id order."""
+    last = 0
+    while True:
+        ids = list(orders.filter(pk__gt=last).order_by("pk").values_list("pk", flat=True)[:chunk_size])
+        if not ids:
+            return
+
+        baskets = defaultdict(list)
+        rows = (
+            OrderItem.objects
+            .filter(order_id__gte=ids[0], order_id__lte=ids[-1], product__isnull=False)
+            .values_list("order_id", "product_id")
+        )
+        for order_id, product_id in rows:
+            baskets[order_id].append(product_id)
+
+        for order_id in ids:
+            yield order_id, baskets.get(order_id, [])
+        last = ids[-1]
+
+def count_pairs(after_order_id=0, max_pairs=MAX_PAIRS, settle=None):
+    counter = PairCounter(max_pairs)
+    last = after_order_id
+    for last, product_ids in iter_baskets(settled_orders(after_order_id, settle)):
+        counter.add_order(product_ids)
+    return counter, last
+
+def _set_watermark(value):
+    JobWatermark.objects.update_or_create(name=WATERMARK, defaults={"value": value})
+
+def get_watermark():
+    return JobWatermark.objects.filter(name=WATERMARK).values_list("value", flat=True).first() or 0
+
+def rebuild_index(top_n=TOP_N, max_pairs=MAX_PAIRS, batch_size=5000, settle=None):
+    counter, last = count_pairs(0, max_pairs, settle)
+
+    with transaction.atomic():
+        ProductNeighbor.objects.all().delete()
+        batch = []
+        for product_id, neighbor_id, score in counter.top_neighbors(top_n):
+            batch.append(ProductNeighbor(product_id=product_id, neighbor_id=neighbor_id, score=score))
+            if len(batch) >= batch_size:
+                ProductNeighbor.objects.bulk_create(batch)
+                batch = []
+        ProductNeighbor.objects.bulk_create(batch)
+        _set_watermark(last)
+
+    return counter
+
+def _trim(product_ids, top_n):
+    # Each touched product keeps its top_n neighbours, as a rebuild would.
+    rows = (
+        ProductNeighbor.objects.filter(product_id__in=product_ids)
+        .order_by("product_id", "-score", "neighbor_id").values_list("pk", "product_id")
+    )
+    kept, dropped = defaultdict(int), []
+    for pk, product_id in rows.iterator():
+        kept[product_id] += 1
+        if kept[product_id] > top_n:
+            dropped.append(pk)
+    ProductNeighbor.objects.filter(pk__in=dropped).delete()
+
+def update_index(top_n=TOP_N, max_pairs=MAX_PAIRS, batch_size=500, settle=None):
+    # Folds orders placed since the last run into the stored scores and trims
+    # the lists it touched back to top_n.
+    counter, last = count_pairs(get_watermark(), max_pairs, settle)
+    directed = [((a, b), c) for (a, b), c in counter.counts.items()]
+    directed += [((b, a), c) for (a, b), c in counter.counts.items()]
+
+    with transaction.atomic():
+        for i in range(0, len(directed), batch_size):
+            batch = directed[i:i + batch_size]
+            ProductNeighbor.objects.bulk_create(
+                [ProductNeighbor(product_id=p, neighbor_id=n, score=0) for (p, n), _ in batch],
+                ignore_conflicts=True,
+            )
+            whens = [When(product_id=p, neighbor_id=n, then=F("score") + c) for (p, n), c in batch]
+            (
+                ProductNeighbor.objects
+                .filter(reduce(or_, [Q(product_id=p, neighbor_id=n) for (p, n), _ in batch]))
+                .update(score=Case(*whens, default=F("score"), output_field=models.PositiveIntegerField()))
+            )
+        if counter.orders:
+            _trim({p for (p, _), _ in directed}, top_n)
+            _set_watermark(last)
+
+    return counter
+
+def get_related(product_id, limit=10):
+    return (
+        ProductNeighbor.objects
+        .filter(product_id=product_id, neighbor__stock__gt=0)
+        .select_related("neighbor")
+        .order_by("-score", "neighbor_id")[:limit]
+    )
+
+def get_cart_related(user):
+    cart_ids = CartItem.objects.filter(user=user).values("product_id")
+    rows = (
+        ProductNeighbor.objects
+        .filter(product_id__in=cart_ids)
+        .exclude(neighbor_id__in=cart_ids)
+        .values("neighbor_id")
+        .annotate(together=Sum("score"))
+    )
+    return {row["neighbor_id"]: row["together"] for row in rows}
@@ -0,0 +1,97 @@
+from datetime import timedelta
+from django.db import models
+from django.db.models import Case, When, F, Q, Sum
+from django.utils import timezone
+from ..models import JobWatermark, UserProductStat, ProductPopularity
+from .cache import cached, invalidate
+
+CATEGORY_DAYS = 180
+PRODUCT_DAYS = 365
+POPULARITY_DAYS = 30
+POPULARITY_TTL = 300
+# How long a worker goes without reading the rebuild stamp from the database.
+STAMP_TTL = 10
+REBUILT = "popularity_rebuilt"
+
+
+def since_day(days):
+    return timezone.localdate(timezone.now() - timedelta(days=days))
+
+def _increment(model, fixed, quantities):
+    # Insert missing rows at zero, then add to all of them with one F() update,
+    # so concurrent checkouts on the same product never lose a count.
+    model.objects.bulk_create(
+        [model(product_id=pid, quantity=0, **fixed) for pid in quantities],
+        ignore_conflicts=True,
+    )
+    whens = [When(product_id=pid, then=F("quantity") + qty) for pid, qty in quantities.items()]
+    model.objects.filter(product_id__in=quantities.keys(), **fixed).update(
+        quantity=Case(*whens, default=F("quantity"), output_field=models.PositiveIntegerField())
+    )
+
+def record_order(order, quantities):
+    if not quantities:
+        return
+
+    day = timezone.localdate(order.created_at)
+    _increment(UserProductStat, {"user_id": order.user_id, "day": day}, quantities)
+    _increment(ProductPopularity, {"day": day}, quantities)
+
+def get_user_features(user, top_k=5, category_days=CATEGORY_DAYS, product_days=PRODUCT_DAYS):
+    # A single indexed range scan on (user, day) yields both the 365-day
+    # product counts and the 180-day category totals.
+    since_categories = since_day(category_days)
+
+    rows = (
+        UserProductStat.objects
+        .filter(user=user, day__gte=since_day(product_days))
+        .values("product_id", "product__category_id")
+        .annotate(
+            qty=Sum("quantity"),
+            recent_qty=Sum("quantity", filter=Q(day__gte=since_categories)),
+        )
+    )
+
+    user_qty_by_product = {}
+    category_qty = {}
+    for row in rows:
+        user_qty_by_product[row["product_id"]] = int(row["qty"] or 0)
+        if row["recent_qty"]:
+            cid = row["product__category_id"]
+            category_qty[cid] = category_qty.get(cid, 0) + row["recent_qty"]
+
+    return rank_categories(category_qty, top_k), user_qty_by_product
+
+def rank_categories(category_qty, top_k=5):
+    # Uncategorised purchases take a slot in the ranking but are never returned,
+    # same as the LIMIT-then-skip in get_user_top_categories.
+    top = sorted(category_qty.items(), key=lambda kv: kv[1], reverse=True)[:top_k]
+    return {cid for cid, _ in top if cid is not None}
+
+def get_popularity(days=POPULARITY_DAYS, top_n=30):
+    qs = (
+        ProductPopularity.objects
+        .filter(day__gte=since_day(days))
+        .values("product_id")
+        .annotate(qty=Sum("quantity"))
+        .order_by("-qty")[:top_n]
+    )
+
+    return {row["product_id"]: row["qty"] or 0 for row in qs}
+
+def _rebuild_stamp():
+    return JobWatermark.objects.filter(name=REBUILT).values_list("value", flat=True).first() or 0
+
+def get_cached_popularity(days=POPULARITY_DAYS, top_n=30):
+    # Same answer for every user within the window, so share it process-wide.
+    # Keyed on the rebuild stamp in the database, so a rebuild reaches every
+    # worker within STAMP_TTL even where each process has its own cache.
+    stamp = cached("popularity-stamp", _rebuild_stamp, ttl=STAMP_TTL)
+    return cached(
+        "popularity", lambda: get_popularity(days, top_n), ttl=POPULARITY_TTL, suffix=f"{days}:{top_n}:{stamp}"
+    )
+
+def invalidate_popularity():
+    JobWatermark.objects.get_or_create(name=REBUILT)
+    JobWatermark.objects.filter(name=REBUILT).update(value=F("value") + 1)
+    invalidate("popularity")
@@ -0,0 +1,137 @@
+from collections import defaultdict
+from datetime import timedelta
+from django.db import models, transaction
+from django.db.models import Case, When, F, Q
+from django.utils import timezone
+from ..models import Product, CartItem, StockHold, InventoryLog
+from .read_models import invalidate_products
+
+HOLD_MINUTES = 15
+SWEEP_BATCH_SIZE = 500
+
+
+class InsufficientStock(Exception):
+    pass
+
+
+def _stock_case(quantities, sign):
+    whens = [When(pk=pid, then=F("stock") + sign * qty) for pid, qty in quantities.items()]
+    return Case(*whens, default=F("stock"), output_field=models.PositiveIntegerField())
+
+def _log_movements(quantities, sign, reason, admin=None):
+    InventoryLog.objects.bulk_create([
+        InventoryLog(product_id=pid, change=sign * qty, reason=reason, admin=admin)
+        for pid, qty in quantities.items()
+    ])
+
+def decrement_stock(quantities, reason, admin=None):
+    # One guarded UPDATE for the whole batch: every row must still hold enough
+    # stock, otherwise the row count comes back short and the caller rolls back.
+    quantities = {pid: qty for pid, qty in quantities.items() if qty > 0}
+    if not quantities:
+        return
+
+    guard = Q()
+    for pid, qty in quantities.items():
+        guard |= Q(pk=pid, stock__gte=qty)
+
+    updated = (
+        Product.objects
+        .filter(pk__in=quantities.keys())
+        .filter(guard)
+        .update(stock=_stock_case(quantities, -1))
+    )
+
+    if updated != len(quantities):
+        raise InsufficientStock("Insufficient stock")
+
+    _log_movements(quantities, -1, reason, admin)
+    invalidate_products(quantities)
+
+def increment_stock(quantities, reason, admin=None):
+    quantities = {pid: qty for pid, qty in quantities.items() if qty > 0}
+    if not quantities:
+        return
+
+    Product.objects.filter(pk__in=quantities.keys()).update(stock=_stock_case(quantities, 1))
+    _log_movements(quantities, 1, reason, admin)
+    invalidate_products(quantities)
+
+def lock_products(product_ids):
+    """
+    Locks the products in pk order. Everything that moves stock and holds
+    together (hold_cart, checkout, the sweeper) locks the products this way
+    first and the holds after, so no two of them can wait on each other.
+    """
+    product_ids = set(product_ids)
+    if product_ids:
+        list(Product.objects.select_for_update().filter(pk__in=product_ids).order_by("pk").values_list("pk", flat=True))
+
+def _sum_by_product(holds):
+    quantities = defaultdict(int)
+    for hold in holds:
+        quantities[hold.product_id] += hold.quantity
+    return quantities
+
+def _release(holds, reason, lock=()):
+    # ``lock``: more products the caller is about to change
+    lock_products({*lock, *holds.values_list("product_id", flat=True)})
+    holds = list(holds.select_for_update())
+    if not holds:
+        return 0
+
+    StockHold.objects.filter(pk__in=[h.pk for h in holds]).delete()
+    increment_stock(_sum_by_product(holds), reason)
+    return len(holds)
+
+@transaction.atomic
+def hold_cart(user, minutes=HOLD_MINUTES):
+    quantities = defaultdict(int)
+    for product_id, quantity in CartItem.objects.filter(user=user).values_list("product_id", "quantity"):
+        quantities[product_id] += quantity
+
+    _release(StockHold.objects.filter(user=user), "Checkout hold replaced", lock=quantities)
+
+    if not quantities:
+        return None
+
+    decrement_stock(quantities, "Checkout hold")
+
+    expires_at = timezone.now() + timedelta(minutes=minutes)
+    StockHold.objects.bulk_create([
+        StockHold(user=user, product_id=pid, quantity=qty, expires_at=expires_at)
+        for pid, qty in quantities.items()
+    ])
+    return expires_at
+
+def consume_holds(user, quantities, reason):
+    # Turns the user's live holds into a sale: held units are already off the
+    # shelf, so only the shortfall is taken from stock and any surplus returned.
+    # The caller has locked the products of both (see lock_products).
+    holds = list(StockHold.objects.select_for_update().filter(user=user, expires_at__gt=timezone.now()))
+    held = _sum_by_product(holds)
+
+    if holds:
+        StockHold.objects.filter(pk__in=[h.pk for h in holds]).delete()
+
+    shortfall = {pid: qty - held.get(pid, 0) for pid, qty in quantities.items()}
+    surplus = {pid: qty - quantities.get(pid, 0) for pid, qty in held.items()}
+
+    decrement_stock(shortfall, reason)
+    increment_stock(surplus, "Checkout hold released")
+
+def release_expired_holds(now=None, batch_size=SWEEP_BATCH_SIZE):
+    now = now or timezone.now()
+    released = 0
+
+    while True:
+        with transaction.atomic():
+            ids = list(
+                StockHold.objects
+                .filter(expires_at__lte=now)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not ids:
+                return released
+            released += _release(StockHold.objects.filter(pk__in=ids, expires_at__lte=now), "Checkout hold expired")
@@ -0,0 +1,126 @@
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+
+# IN (%s, %s, ...) of any length is one statement; so are quoted literals.
+IN_LIST = re.compile(r"\(\s*%s(?:\s*,\s*%s)*\s*\)")
+LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+def normalize_sql(sql):
+    return LITERAL.sub("?", IN_LIST.sub("(...)", sql))
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense; not locked, the Registry is."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        running = 0
+        for bound, n in zip((*self.buckets, "+Inf"), self.counts):
+            running += n
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {running}'
+        yield f"{name}_sum{{{labels}}} {self.sum:.6g}"
+        yield f"{name}_count{{{labels}}} {self.count}"
+
+
+class QueryStats:
+    """
+    A connection.execute_wrapper that times every statement and counts
+    repeats. Statements are grouped verbatim while the request runs and
+    only normalized at the end, which keeps the per-query cost to a clock
+    read and a dict increment.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+            self.statements[sql] += 1
+
+    def repeats(self):
+        """(normalized statement, times run) for the statement run most often, or None."""
+        if not self.statements:
+            return None
+        grouped = Counter()
+        for sql, n in self.statements.items():
+            grouped[normalize_sql(sql)] += n
+        return grouped.most_common(1)[0]
+
+
+class Registry:
+    """Per-process request metrics. Each worker keeps its own; Prometheus sums them by instance."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = Counter()  # (view, method, status)
+        self.duration = defaultdict(lambda: Histogram(SECONDS_BUCKETS))
+        self.db_seconds = defaultdict(lambda: Histogram(SECONDS_BUCKETS))
+        self.db_queries = defaultdict(lambda: Histogram(QUERY_BUCKETS))
+        self.duplicates = Counter()
+
+    def record(self, view, method, status, seconds, queries=None, duplicate=False):
+        with self.lock:
+            self.requests[view, method, status] += 1
+            self.duration[view].observe(seconds)
+            if queries is not None:
+                self.db_seconds[view].observe(queries.seconds)
+                self.db_queries[view].observe(queries.count)
+                self.duplicates[view] += duplicate
+
+    def render(self):
+        """The Prometheus text exposition format, version 0.0.4."""
+        with self.lock:
+            out = [
+                "# HELP http_requests_total Requests served, by view, method and status.",
+                "# TYPE http_requests_total counter",
+            ]
+            for (view, method, status), n in sorted(self.requests.items()):
+                out.append(f'http_requests_total{{view="{view}",method="{method}",status="{status}"}} {n}')
+
+            for name, kind, help_text, series in (
+                ("http_request_duration_seconds", "histogram", "Wall time per request.", self.duration),
+                ("http_request_db_seconds", "histogram", "Time in the database per sampled request.", self.db_seconds),
+                ("http_request_db_queries", "histogram", "Queries per sampled request.", self.db_queries),
+            ):
+                out += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+                for view, histogram in sorted(series.items()):
+                    out += histogram.lines(name, f'view="{view}"')
+
+            out += [
+                "# HELP http_request_duplicate_queries_total Sampled requests that ran one statement "
+                "at least METRICS_DUPLICATE_THRESHOLD times (likely N+1).",
+                "# TYPE http_request_duplicate_queries_total counter",
+            ]
+            for view, n in sorted(self.duplicates.items()):
+                out.append(f'http_request_duplicate_queries_total{{view="{view}"}} {n}')
+        return "\n".join(out) + "\n"
+
+
+registry = Registry()
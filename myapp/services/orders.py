@@ -0,0 +1,55 @@
+import json
+from itertools import islice
+from datetime import datetime, time, timedelta
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from ..models import Order
+from ..serializers import OrderSerializer
+
+EXPORT_CHUNK_SIZE = 500
+
+
+def admin_orders():
+    # user and address in the same row, items in one query per page (or chunk)
+    return Order.objects.select_related("user", "address").prefetch_related("items")
+
+def parse_bound(value, end=False):
+    """
+    An ISO date or datetime as an aware datetime. A bare date means the start
+    of that day, or with ``end`` the start of the next one, so that
+    ``created_to=2024-05-31`` includes the whole of May 31st.
+    """
+    day = parse_date(value)
+    if day is not None:
+        moment = datetime.combine(day + timedelta(days=1) if end else day, time.min)
+    else:
+        moment = parse_datetime(value)
+        if moment is None:
+            raise ValueError(f"Invalid date: {value}")
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+def filter_orders(queryset, status=None, payment_status=None, created_from=None, created_to=None):
+    # status and payment_status each lead a composite index with the sort keys
+    if status:
+        queryset = queryset.filter(status=status)
+    if payment_status:
+        queryset = queryset.filter(payment_status=payment_status)
+    if created_from is not None:
+        queryset = queryset.filter(created_at__gte=created_from)
+    if created_to is not None:
+        queryset = queryset.filter(created_at__lt=created_to)
+    return queryset
+
+def export_orders(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yields one JSON line per order. Rows are fetched ``chunk_size`` at a time
+    with their items prefetched per chunk, so memory stays flat however many
+    orders there are. Each chunk goes through one ``many=True`` serializer,
+    which builds its fields once rather than once per order.
+    """
+    rows = queryset.order_by("-created_at", "-id").iterator(chunk_size=chunk_size)
+    while chunk := list(islice(rows, chunk_size)):
+        for data in OrderSerializer(chunk, many=True).data:
+            yield json.dumps(data, default=str) + "\n"
@@ -0,0 +1,229 @@
+import csv
+import io
+import json
+from decimal import Decimal, InvalidOperation
+from django.db import transaction
+from ..models import Category, Product
+from .ai_jobs import enqueue_summaries
+from .read_models import invalidate_catalogue, invalidate_categories
+from .catalogue import record_changes
+
+CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+FORMATS = ("csv", "jsonl")
+EXPORT_FIELDS = ("sku", "name", "category", "price", "stock", "description", "ai_summary", "image_url")
+UPDATE_FIELDS = ["name", "description", "category", "price", "stock", "image_url", "ai_summary", "updated_at"]
+
+
+def detect_format(filename, default="csv"):
+    name = (filename or "").lower()
+    if name.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    if name.endswith(".csv"):
+        return "csv"
+    return default
+
+class ImportFileError(Exception):
+    """The file itself cannot be read on: not UTF-8, or CSV that does not parse."""
+
+
+def iter_rows(stream, fmt):
+    """
+    Yields (line_number, dict) from a binary or text stream without reading
+    it whole. Raises ImportFileError where the file stops being readable;
+    rows before that point have already been yielded.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format: {fmt}")
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+
+    line_number = 0
+    try:
+        if fmt == "csv":
+            # strict: an unterminated quote is an error, not the rest of the file read into one field
+            reader = csv.DictReader(stream, strict=True)
+            for row in reader:
+                line_number = reader.line_num
+                yield line_number, row
+            return
+
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                row = {"_error": f"invalid JSON: {e}"}
+            yield line_number, row if isinstance(row, dict) else {"_error": "expected a JSON object"}
+    except UnicodeDecodeError:
+        raise ImportFileError(f"After line {line_number}: the file is not UTF-8 text")
+    except csv.Error as e:
+        raise ImportFileError(f"After line {line_number}: malformed CSV ({e})")
+
+def clean_row(row):
+    """Returns (values, error) for one input row. Unknown columns are ignored."""
+    if "_error" in row:
+        return None, row["_error"]
+
+    def text(name, limit=None):
+        value = row.get(name)
+        value = "" if value is None else str(value).strip()
+        if limit and len(value) > limit:
+            raise ValueError(f"{name} longer than {limit} characters")
+        return value
+
+    try:
+        sku = text("sku", 64)
+        name = text("name", 200)
+        if not sku or not name:
+            raise ValueError("sku and name are required")
+
+        price = Decimal(text("price"))
+        if not price.is_finite() or price < 0 or price != price.quantize(Decimal("0.01")):
+            raise ValueError("price must be a non-negative amount with at most 2 decimals")
+
+        stock = int(text("stock") or 0)
+        if stock < 0:
+            raise ValueError("stock must not be negative")
+
+        return {
+            "sku": sku,
+            "name": name,
+            "category": text("category", 100),
+            "price": price,
+            "stock": stock,
+            "description": text("description"),
+            "ai_summary": text("ai_summary"),
+            "image_url": text("image_url", 200),
+        }, None
+    except (ValueError, InvalidOperation) as e:
+        return None, str(e) or "invalid value"
+
+
+class ProductImporter:
+    """
+    Upserts products by SKU in chunks: one query to find which SKUs exist,
+    one INSERT ... ON CONFLICT DO UPDATE per chunk, and one to queue AI
+    summaries for new or changed descriptions. Categories come from a map
+    loaded once; unknown names are created in bulk.
+    """
+
+    def __init__(self, chunk_size=CHUNK_SIZE, summaries=True):
+        self.chunk_size = chunk_size
+        self.summaries = summaries
+        self.categories = {name.casefold(): pk for pk, name in Category.objects.values_list("id", "name")}
+        self.rows = self.created = self.updated = self.queued = 0
+        self.errors = []
+        self.error_count = 0
+
+    def run(self, rows):
+        chunk = {}
+        for line_number, row in rows:
+            self.rows += 1
+            values, error = clean_row(row)
+            if error:
+                self.error_count += 1
+                if len(self.errors) < MAX_REPORTED_ERRORS:
+                    self.errors.append({"line": line_number, "error": error})
+                continue
+
+            # a SKU repeated in the file: the last row wins
+            chunk[values["sku"]] = values
+            if len(chunk) >= self.chunk_size:
+                self.write(chunk)
+                chunk = {}
+
+        if chunk:
+            self.write(chunk)
+        return self
+
+    def category_ids(self, names):
+        # names match case-insensitively; a new one is created as first spelled
+        missing = {}
+        for name in names:
+            if name and name.casefold() not in self.categories:
+                missing.setdefault(name.casefold(), name)
+        if missing:
+            Category.objects.bulk_create([Category(name=n) for n in missing.values()], ignore_conflicts=True)
+            invalidate_categories()
+            record_changes([None])
+            for pk, name in Category.objects.filter(name__in=missing.values()).values_list("id", "name"):
+                self.categories[name.casefold()] = pk
+        return {n: self.categories.get(n.casefold()) for n in names if n}
+
+    @transaction.atomic
+    def write(self, chunk):
+        existing = {
+            sku: (description, summary)
+            for sku, description, summary in
+            Product.objects.filter(sku__in=chunk.keys()).values_list("sku", "description", "ai_summary")
+        }
+        categories = self.category_ids({values["category"] for values in chunk.values()})
+
+        products = []
+        for sku, values in chunk.items():
+            # without a summary in the file, keep the current one until the worker replaces it
+            summary = values["ai_summary"] or existing.get(sku, ("", ""))[1]
+            products.append(Product(
+                sku=sku, name=values["name"], description=values["description"],
+                category_id=categories.get(values["category"]), price=values["price"], stock=values["stock"],
+                image_url=values["image_url"], ai_summary=summary,
+            ))
+
+        Product.objects.bulk_create(products, update_conflicts=True, unique_fields=["sku"], update_fields=UPDATE_FIELDS)
+        invalidate_catalogue()
+        record_changes(Product.objects.filter(sku__in=chunk.keys()).values_list("id", flat=True))
+
+        self.created += len(chunk) - len(existing)
+        self.updated += len(existing)
+
+        if self.summaries:
+            stale = [
+                sku for sku, values in chunk.items()
+                if values["description"] and not values["ai_summary"]
+                and (sku not in existing or existing[sku][0] != values["description"])
+            ]
+            if stale:
+                enqueue_summaries(Product.objects.filter(sku__in=stale).values_list("id", flat=True))
+                self.queued += len(stale)
+
+    def report(self):
+        return {
+            "rows": self.rows,
+            "created": self.created,
+            "updated": self.updated,
+            "errors": self.error_count,
+            "summaries_queued": self.queued,
+            "error_details": self.errors,
+        }
+
+
+def export_rows(fmt, chunk_size=2000):
+    """Yields the catalogue as CSV or JSONL text, one chunk of rows at a time."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format: {fmt}")
+
+    columns = [f if f != "category" else "category__name" for f in EXPORT_FIELDS]
+    rows = Product.objects.order_by("id").values_list(*columns).iterator(chunk_size=chunk_size)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    if fmt == "csv":
+        writer.writerow(EXPORT_FIELDS)
+
+    count = 0
+    for row in rows:
+        row = ["" if v is None else v for v in row]
+        if fmt == "csv":
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(dict(zip(EXPORT_FIELDS, row)), default=str) + "\n")
+
+        count += 1
+        if count % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
@@ -0,0 +1,50 @@
+from django.db.models import F, Max, Min, OuterRef, Q, Subquery
+from ..models import Order, OrderItem, Product
+
+# Items whose copy of the order's user or time is missing or wrong. The
+# category is not compared: it keeps the category at purchase time.
+STALE = (
+    Q(user__isnull=True) | Q(created_at__isnull=True)
+    | ~Q(user=F("order__user")) | ~Q(created_at=F("order__created_at"))
+)
+
+
+def snapshot(order, product):
+    """The OrderItem fields copied from its order and product."""
+    return {"user_id": order.user_id, "created_at": order.created_at, "category_id": product.category_id}
+
+def backfill(chunk_size=5000, progress=None):
+    """
+    Rewrites the snapshot on stale items from their order and, for the
+    category, the product as it is now. One UPDATE per pk range, each its
+    own transaction, so locks stay short and a rerun picks up where an
+    interrupted one stopped. Returns items updated.
+    """
+    bounds = OrderItem.objects.filter(STALE).aggregate(lo=Min("pk"), hi=Max("pk"))
+    if bounds["lo"] is None:
+        return 0
+
+    order = Order.objects.filter(pk=OuterRef("order_id"))
+    updated = 0
+    for lo in range(bounds["lo"], bounds["hi"] + 1, chunk_size):
+        updated += OrderItem.objects.filter(STALE, pk__gte=lo, pk__lt=lo + chunk_size).update(
+            user_id=Subquery(order.values("user_id")[:1]),
+            created_at=Subquery(order.values("created_at")[:1]),
+            category_id=Subquery(Product.objects.filter(pk=OuterRef("product_id")).values("category_id")[:1]),
+        )
+        if progress:
+            progress(min(lo + chunk_size - 1, bounds["hi"]), updated)
+    return updated
+
+def find_stale():
+    """Yields (item id, field, stored, expected) for every copied field that disagrees with the order."""
+    rows = (
+        OrderItem.objects.filter(STALE)
+        .values_list("pk", "user_id", "created_at", "order__user_id", "order__created_at")
+        .order_by("pk")
+    )
+    for pk, user_id, created_at, order_user_id, order_created_at in rows.iterator():
+        if user_id != order_user_id:
+            yield pk, "user_id", user_id, order_user_id
+        if created_at != order_created_at:
+            yield pk, "created_at", created_at, order_created_at
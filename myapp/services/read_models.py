@@ -0,0 +1,75 @@
+from django.conf import settings
+from django.db import transaction
+from ..models import Category, Product, Wallet
+from .cache import cached, invalidate, namespace_version
+
+READ_TTL = 300
+
+
+# ------------------------------------------
+# CACHED READS
+# ------------------------------------------
+# Only with settings.READ_MODEL_CACHE, i.e. a cache every worker shares:
+# the invalidations below would not reach the other workers' own caches.
+
+def _read(namespace, compute, suffix=lambda: ""):
+    if not settings.READ_MODEL_CACHE:
+        return compute()
+    return cached(namespace, compute, ttl=READ_TTL, suffix=suffix())
+
+def category_list():
+    # imported here: the serializers queue AI jobs, and the job queue invalidates through this module
+    from ..serializers import CategorySerializer
+    return _read("categories", lambda: list(CategorySerializer(Category.objects.all(), many=True).data))
+
+def _product_data(pk):
+    from ..serializers import ProductSerializer
+    product = Product.objects.select_related("category").filter(pk=pk).first()
+    return None if product is None else dict(ProductSerializer(product).data)
+
+def product_detail(pk):
+    """
+    Serialized product, or None. Keyed on the product's own version and the
+    catalogue version, so one stock change drops one entry and a category
+    rename or bulk import drops them all.
+    """
+    return _read(f"product:{pk}", lambda: _product_data(pk), suffix=lambda: str(namespace_version("catalogue")))
+
+def _wallet_data(user_id):
+    wallet = Wallet.objects.filter(user_id=user_id).values("id", "balance", "wallet_address").first()
+    if wallet is not None:
+        wallet["balance"] = float(wallet["balance"])
+    return wallet
+
+def wallet_summary(user_id):
+    return _read(f"wallet:{user_id}", lambda: _wallet_data(user_id))
+
+
+# ------------------------------------------
+# INVALIDATION
+# ------------------------------------------
+# Deferred to commit: dropping an entry mid-transaction would let another
+# request re-cache the old row under the new version.
+
+def invalidate_products(product_ids):
+    product_ids = list(product_ids)
+    transaction.on_commit(lambda: [invalidate(f"product:{pk}") for pk in product_ids])
+
+def invalidate_catalogue():
+    transaction.on_commit(lambda: invalidate("catalogue"))
+
+def invalidate_categories():
+    # product details carry category_name
+    transaction.on_commit(lambda: (invalidate("categories"), invalidate("catalogue")))
+
+def invalidate_wallet(user_id):
+    transaction.on_commit(lambda: invalidate(f"wallet:{user_id}"))
+
+def on_category_change(sender, instance, **kwargs):
+    invalidate_categories()
+
+def on_product_change(sender, instance, **kwargs):
+    invalidate_products([instance.pk])
+
+def on_wallet_change(sender, instance, **kwargs):
+    invalidate_wallet(instance.user_id)
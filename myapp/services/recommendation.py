@@ -1,17 +1,25 @@
 from datetime import timedelta
 from django.utils import timezone
-from django.db.models import Sum
-from ..models import Product, OrderItem
+from django.db.models import F, Q, Sum
+from ..models import Product, OrderItem, UserRecommendation
+from .features import get_user_features, get_cached_popularity
+from .scoring import Candidates, rank_candidates
+from .copurchase import get_cart_related
 
 num = 30
+RECOMMENDATION_MAX_AGE = timedelta(hours=24)
+
+# The history helpers read the user and time copied onto OrderItem at
+# checkout, so each is one range scan of orderitem_user_created (or
+# orderitem_created) with no join to Order.
 
 def get_user_top_categories(user, days=180, top_k=5):
     since = timezone.now() - timedelta(days=days)
 
     qs = (
         OrderItem.objects
-        .filter(order__user=user, order__created_at__gte=since, product__isnull=False)
-        .values("product__category_id", "product__category__name")
+        .filter(user=user, created_at__gte=since, product__isnull=False)
+        .values("category_id", "category__name")
         .annotate(qty=Sum("quantity"))
         .order_by("-qty")[:top_k]
     )
@@ -20,9 +28,9 @@ def get_user_top_categories(user, days=180, top_k=5):
     top_category_names = []
 
     for row in qs:
-        if row["product__category_id"] is not None:
-            top_category_ids.add(row["product__category_id"])
-            top_category_names.append(row["product__category__name"])
+        if row["category_id"] is not None:
+            top_category_ids.add(row["category_id"])
+            top_category_names.append(row["category__name"])
 
     return top_category_ids, top_category_names
 
@@ -31,7 +39,7 @@ def get_user_bought_product_ids(user, days=365):
 
     return set(
         OrderItem.objects
-        .filter(order__user=user, order__created_at__gte=since, product__isnull=False)
+        .filter(user=user, created_at__gte=since, product__isnull=False)
         .values_list("product_id", flat=True)
         .distinct()
     )
@@ -41,7 +49,7 @@ def get_user_product_counts(user, days=365):
 
     qs = (
         OrderItem.objects
-        .filter(order__user=user, order__created_at__gte=since, product__isnull=False)
+        .filter(user=user, created_at__gte=since, product__isnull=False)
         .values("product_id")
         .annotate(qty=Sum("quantity"))
         .order_by("-qty")
@@ -54,18 +62,21 @@ def get_global_product_popularity(days=30, top_n=num):
 
     qs = (
         OrderItem.objects
-        .filter(order__created_at__gte=since, product__isnull=False)
-        .values("product_id")
+        .filter(created_at__gte=since, product__isnull=False)
+        # grouped on product_id + 0, which no index is sorted by: otherwise SQLite walks
+        # the whole product_id index for its order rather than range-scan orderitem_created
+        .values(pid=F("product_id") + 0)
         .annotate(qty=Sum("quantity"))
         .order_by("-qty")[:top_n]
     )
 
-    return {row["product_id"]: row["qty"] or 0 for row in qs}
+    return {row["pid"]: row["qty"] or 0 for row in qs}
 
-def get_score(p, top_category_ids=None, user_qty_by_product=None, global_qty=None):
+def get_score(p, top_category_ids=None, user_qty_by_product=None, global_qty=None, cart_related=None):
     top_category_ids = top_category_ids or set()
     user_qty_by_product = user_qty_by_product or {}
     global_qty = global_qty or {}
+    cart_related = cart_related or {}
 
     score = 0
     reasons = []
@@ -84,18 +95,19 @@ def get_score(p, top_category_ids=None, user_qty_by_product=None, global_qty=Non
         score += min(15, int(pop ** 0.5))
         reasons.append("Popular recently")
 
-    return score, reasons
+    together = cart_related.get(p.id, 0)
+    if together > 0:
+        score += min(10, together)
+        reasons.append("Often bought together with items in your cart")
 
-def handle_recommendation(candidates, top_category_ids, user_qty_by_product, global_qty, excluded_ids, pre_limit=None):
-    if excluded_ids:
-        candidates = candidates.exclude(id__in=excluded_ids)
-
-    if pre_limit is not None:
-        candidates = candidates[:pre_limit]
+    return score, reasons
 
+def score_with_loop(candidates, top_category_ids, user_qty_by_product, global_qty, cart_related=None):
+    # Reference implementation: one model instance and one get_score call per
+    # candidate. Kept for equivalence tests and the scoring benchmark.
     items = []
     for p in candidates:
-        score, reasons = get_score(p, top_category_ids, user_qty_by_product, global_qty)
+        score, reasons = get_score(p, top_category_ids, user_qty_by_product, global_qty, cart_related)
 
         if score > 0 :
             items.append({
@@ -110,53 +122,47 @@ def handle_recommendation(candidates, top_category_ids, user_qty_by_product, glo
     items.sort(key=lambda x: (x["score"], global_qty.get(x["product_id"], 0)), reverse=True)
     return items
 
-def recommend_for_user(user, limit=20, exclude_bought=True):
-    top_category_ids, _ = get_user_top_categories(user)
-    user_qty_by_product = get_user_product_counts(user)
-    global_qty = get_global_product_popularity()
+def handle_recommendation(candidates, top_category_ids, user_qty_by_product, global_qty, excluded_ids, pre_limit=None, limit=None, cart_related=None):
+    if excluded_ids:
+        candidates = candidates.exclude(id__in=excluded_ids)
 
-    excluded_ids = get_user_bought_product_ids(user) if exclude_bought else set()
-    global_ids = global_qty.keys()
+    if pre_limit is not None:
+        candidates = candidates[:pre_limit]
 
-    global_candidates = (
-        Product.objects
-        .filter(stock__gt=0, id__in=global_ids)
-        .select_related("category")
+    return rank_candidates(
+        Candidates.from_queryset(candidates), top_category_ids, user_qty_by_product, global_qty, limit, cart_related
     )
 
+def recommend_from_candidates(candidates, top_category_ids, user_qty_by_product, global_qty, limit=20, exclude_bought=True, cart_related=None):
+    # Pure function of its inputs (no queries), so the batch job can run it in
+    # worker processes over one shared in-stock candidate set.
+    cart_related = cart_related or {}
+    excluded_ids = set(user_qty_by_product) if exclude_bought else set()
+    global_candidates = candidates.with_ids(set(global_qty) | set(cart_related))
+
     if not top_category_ids and not user_qty_by_product:
-        global_items = handle_recommendation(
-            candidates=global_candidates, 
-            top_category_ids=set(), 
-            user_qty_by_product={}, 
-            global_qty=global_qty, 
-            excluded_ids=excluded_ids
+        return rank_candidates(
+            global_candidates.without_ids(excluded_ids), set(), {}, global_qty, limit, cart_related
         )
-        return global_items[:limit]
-    
+
     cat_limit = int(0.7 * limit)
     global_limit = limit - cat_limit
 
     recommended = []
 
     if top_category_ids and cat_limit > 0:
-        cat_candidates = (
-            Product.objects
-            .filter(stock__gt=0,category_id__in=top_category_ids)
-            .select_related("category")
+        cat_items = rank_candidates(
+            candidates.in_categories(top_category_ids).without_ids(excluded_ids),
+            top_category_ids, user_qty_by_product, global_qty, cat_limit, cart_related
         )
 
-        cat_items = handle_recommendation(
-            cat_candidates, top_category_ids, user_qty_by_product, global_qty, excluded_ids
-        )[:cat_limit]
-
         recommended.extend(cat_items)
         excluded_ids.update([x["product_id"] for x in cat_items])
-        
-    if global_qty and global_limit > 0:
-        global_items = handle_recommendation(
-            global_candidates, set(), {}, global_qty, excluded_ids
-        )[:global_limit]
+
+    if (global_qty or cart_related) and global_limit > 0:
+        global_items = rank_candidates(
+            global_candidates.without_ids(excluded_ids), set(), {}, global_qty, global_limit, cart_related
+        )
 
         recommended.extend(global_items)
 
@@ -165,3 +171,45 @@ def recommend_for_user(user, limit=20, exclude_bought=True):
         key=lambda x: (x["score"], global_qty.get(x["product_id"], 0)), 
         reverse=True
     )[:limit]
+
+def load_candidates(top_category_ids, global_ids, excluded_ids=()):
+    candidates = (
+        Product.objects
+        .filter(stock__gt=0)
+        .filter(Q(category_id__in=top_category_ids) | Q(id__in=global_ids))
+        .order_by("id")
+    )
+    if excluded_ids:
+        candidates = candidates.exclude(id__in=excluded_ids)
+    return Candidates.from_queryset(candidates)
+
+def recommend_for_user(user, limit=20, exclude_bought=True):
+    top_category_ids, user_qty_by_product = get_user_features(user)
+    global_qty = get_cached_popularity(top_n=num)
+    cart_related = get_cart_related(user)
+
+    if not top_category_ids and not global_qty and not cart_related:
+        return []
+
+    candidates = load_candidates(
+        top_category_ids, set(global_qty) | set(cart_related), user_qty_by_product.keys() if exclude_bought else ()
+    )
+    return recommend_from_candidates(
+        candidates, top_category_ids, user_qty_by_product, global_qty, limit, exclude_bought, cart_related
+    )
+
+def to_json_items(items):
+    return [{**item, "product_price": str(item["product_price"])} for item in items]
+
+def stored_recommendations(user, max_age=RECOMMENDATION_MAX_AGE):
+    return (
+        UserRecommendation.objects
+        .filter(user=user, generated_at__gte=timezone.now() - max_age)
+        .values_list("items", flat=True)
+    )
+
+def get_stored_recommendations(user, max_age=RECOMMENDATION_MAX_AGE):
+    return stored_recommendations(user, max_age).first()
+
+async def aget_stored_recommendations(user, max_age=RECOMMENDATION_MAX_AGE):
+    return await stored_recommendations(user, max_age).afirst()
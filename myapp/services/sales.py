@@ -0,0 +1,157 @@
+from collections import defaultdict
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+from django.db import models, transaction
+from django.db.models import Case, When, F, Q, Sum
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+from ..models import OrderItem, ProductSalesDaily, CategorySalesDaily
+
+PAID = "paid"
+GROUP_BY = {
+    # rollup table and its key field
+    "product": (ProductSalesDaily, "product_id"),
+    "category": (CategorySalesDaily, "category_id"),
+}
+PERIODS = {"day": None, "week": TruncWeek, "month": TruncMonth}
+CENT = Decimal("0.01")
+
+
+def order_day(order):
+    return timezone.localdate(order.created_at)
+
+def in_range(rows, start=None, end=None, field="day"):
+    if start:
+        rows = rows.filter(**{f"{field}__gte": start})
+    if end:
+        rows = rows.filter(**{f"{field}__lte": end})
+    return rows
+
+def _add(model, key, day, totals):
+    # Same insert-at-zero then single F() update as the recommendation
+    # features, so concurrent payments on one day never lose a sale.
+    model.objects.bulk_create([model(day=day, **{key: k}) for k in totals], ignore_conflicts=True)
+    match = {k: Q(day=day, **{key: k}) for k in totals}
+    model.objects.filter(reduce(or_, match.values())).update(
+        quantity=Case(
+            *[When(match[k], then=F("quantity") + qty) for k, (qty, _) in totals.items()],
+            default=F("quantity"), output_field=models.IntegerField(),
+        ),
+        revenue=Case(
+            *[When(match[k], then=F("revenue") + rev) for k, (_, rev) in totals.items()],
+            default=F("revenue"), output_field=models.DecimalField(max_digits=14, decimal_places=2),
+        ),
+    )
+
+def record_sales(day, lines, sign=1):
+    """
+    Adds (or with ``sign=-1`` takes back) paid lines, given as
+    (product_id, category_id, quantity, revenue), to both rollups for ``day``.
+    A line whose product has been deleted (product_id None) only counts
+    towards its category.
+    """
+    by_product = defaultdict(lambda: [0, Decimal("0")])
+    by_category = defaultdict(lambda: [0, Decimal("0")])
+    for product_id, category_id, quantity, revenue in lines:
+        keys = [(by_category, category_id)]
+        if product_id is not None:
+            keys.append((by_product, product_id))
+        for totals, key in keys:
+            totals[key][0] += sign * quantity
+            totals[key][1] += sign * revenue
+
+    if by_product:
+        _add(ProductSalesDaily, "product_id", day, by_product)
+    if by_category:
+        _add(CategorySalesDaily, "category_id", day, by_category)
+
+def order_lines(order):
+    # The category the line was bought under, as checkout rolls it up.
+    rows = OrderItem.objects.filter(order=order).values_list("product_id", "category_id", "quantity", "unit_price")
+    return [(pid, cid, qty, qty * price) for pid, cid, qty, price in rows]
+
+def sync_order_sales(order, was_paid):
+    """Call inside the transaction that saves ``order``, with its payment state before the change."""
+    is_paid = order.payment_status == PAID
+    if is_paid != was_paid:
+        record_sales(order_day(order), order_lines(order), 1 if is_paid else -1)
+
+def sales_report(start=None, end=None, group_by="product", period=None):
+    """
+    Quantity and revenue from the rollups, newest period first and then by
+    revenue. ``group_by`` is "product", "category" or None for plain totals;
+    ``period`` is None, "day", "week" or "month". Both bounds are inclusive.
+    """
+    # Plain totals read the category rollup, which has fewer rows per day.
+    rows = in_range(GROUP_BY[group_by or "category"][0].objects.all(), start, end)
+
+    fields, labels, order = [], {}, []
+    if period:
+        labels["period"] = PERIODS[period]("day") if PERIODS[period] else F("day")
+        order.append("-period")
+    order.append("-total_revenue")
+    if group_by:
+        # product__id / product_name is the shape the admin reports page reads
+        fields.append(f"{group_by}__id")
+        labels[f"{group_by}_name"] = F(f"{group_by}__name")
+        order.append(f"{group_by}__id")
+
+    rows = (
+        rows.values(*fields, **labels)
+        .annotate(total_quantity=Sum("quantity"), total_revenue=Sum("revenue"))
+        .filter(total_quantity__gt=0)
+        .order_by(*order)
+    )
+    return list(rows)
+
+def raw_totals(group_by, start=None, end=None):
+    """
+    {(key, day): (quantity, revenue)} aggregated straight from paid
+    OrderItems. Categories come from the category copied onto each line at
+    checkout; lines whose product was deleted stay in their category, and
+    only drop out of the product totals along with the product's rollup rows.
+    """
+    key = "product_id" if group_by == "product" else "category_id"
+    rows = OrderItem.objects.filter(order__payment_status=PAID)
+    if group_by == "product":
+        rows = rows.filter(product__isnull=False)
+    rows = rows.annotate(day=TruncDate("order__created_at"))
+    rows = in_range(rows, start, end, "order__created_at__date")
+
+    rows = rows.values(key, "day").annotate(qty=Sum("quantity"), revenue=Sum(F("quantity") * F("unit_price"))).order_by()
+    return {(row[key], row["day"]): (row["qty"], Decimal(row["revenue"]).quantize(CENT)) for row in rows}
+
+def rollup_totals(group_by, start=None, end=None):
+    model, key = GROUP_BY[group_by]
+    rows = in_range(model.objects.exclude(quantity=0, revenue=0), start, end)
+    return {(k, day): (qty, rev) for k, day, qty, rev in rows.values_list(key, "day", "quantity", "revenue")}
+
+def find_drift(start=None, end=None):
+    """
+    Yields (group_by, key, day, rollup, raw) wherever the rollups disagree
+    with OrderItem. Both sides use the category the line was bought under,
+    so recategorising or deleting a product is not drift. Lines from before
+    0019 need backfill_order_item_history first.
+    """
+    for group_by in GROUP_BY:
+        stored = rollup_totals(group_by, start, end)
+        raw = raw_totals(group_by, start, end)
+        for key, day in sorted(stored.keys() | raw.keys(), key=lambda kd: (kd[1], kd[0] or 0)):
+            if stored.get((key, day)) != raw.get((key, day)):
+                yield group_by, key, day, stored.get((key, day)), raw.get((key, day))
+
+@transaction.atomic
+def backfill(start=None, end=None, batch_size=5000):
+    """Recomputes both rollups from OrderItem for the given days. Returns rows written."""
+    written = 0
+    for group_by, (model, key) in GROUP_BY.items():
+        in_range(model.objects.all(), start, end).delete()
+
+        rows = [
+            model(day=day, quantity=qty, revenue=rev, **{key: k})
+            for (k, day), (qty, rev) in raw_totals(group_by, start, end).items()
+        ]
+        model.objects.bulk_create(rows, batch_size=batch_size)
+        written += len(rows)
+    return written
@@ -0,0 +1,127 @@
+import numpy as np
+
+CANDIDATE_FIELDS = ("id", "category_id", "price", "name", "image_url")
+
+CATEGORY_SCORE = 25
+BOUGHT_SCORE_PER_UNIT = 5
+BOUGHT_SCORE_CAP = 20
+POPULAR_SCORE_CAP = 15
+TOGETHER_SCORE_CAP = 10
+
+
+class Candidates:
+    """Column arrays for candidate products, in queryset order."""
+
+    def __init__(self, rows):
+        rows = list(rows)
+        n = len(rows)
+        self.ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=n)
+        self.category_ids = np.fromiter((-1 if r[1] is None else r[1] for r in rows), dtype=np.int64, count=n)
+        self.prices = self._objects([r[2] for r in rows])
+        self.names = self._objects([r[3] for r in rows])
+        self.image_urls = self._objects([r[4] for r in rows])
+
+    @staticmethod
+    def _objects(values):
+        column = np.empty(len(values), dtype=object)
+        column[:] = values
+        return column
+
+    @classmethod
+    def from_queryset(cls, queryset):
+        return cls(queryset.values_list(*CANDIDATE_FIELDS))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def subset(self, mask):
+        subset = Candidates.__new__(Candidates)
+        for column in ("ids", "category_ids", "prices", "names", "image_urls"):
+            setattr(subset, column, getattr(self, column)[mask])
+        return subset
+
+    def in_categories(self, category_ids):
+        return self.subset(np.isin(self.category_ids, np.fromiter(category_ids, dtype=np.int64)))
+
+    def with_ids(self, ids):
+        return self.subset(np.isin(self.ids, np.fromiter(ids, dtype=np.int64)))
+
+    def without_ids(self, ids):
+        if not ids:
+            return self
+        return self.subset(~np.isin(self.ids, np.fromiter(ids, dtype=np.int64)))
+
+
+def lookup(ids, mapping):
+    """Vectorised ``mapping.get(id, 0)`` for every id."""
+    if not mapping or not len(ids):
+        return np.zeros(len(ids), dtype=np.int64)
+
+    keys = np.fromiter(mapping.keys(), dtype=np.int64, count=len(mapping))
+    values = np.fromiter((int(v) for v in mapping.values()), dtype=np.int64, count=len(mapping))
+    order = np.argsort(keys)
+    keys, values = keys[order], values[order]
+
+    pos = np.minimum(np.searchsorted(keys, ids), len(keys) - 1)
+    return np.where(keys[pos] == ids, values[pos], 0)
+
+def rank_candidates(candidates, top_category_ids, user_qty_by_product, global_qty, limit=None, cart_related=None):
+    """
+    Array version of scoring every candidate with ``get_score`` and sorting by
+    (score, popularity) descending. Ties keep queryset order, like the stable
+    Python sort, and reason strings are only built for the returned items.
+    """
+    if not len(candidates):
+        return []
+
+    if top_category_ids:
+        in_top = np.isin(candidates.category_ids, np.fromiter(top_category_ids, dtype=np.int64))
+    else:
+        in_top = np.zeros(len(candidates), dtype=bool)
+
+    bought = lookup(candidates.ids, user_qty_by_product)
+    pop = lookup(candidates.ids, global_qty)
+    together = lookup(candidates.ids, cart_related)
+
+    scores = (
+        in_top * CATEGORY_SCORE
+        + np.minimum(BOUGHT_SCORE_CAP, BOUGHT_SCORE_PER_UNIT * bought)
+        + np.minimum(POPULAR_SCORE_CAP, np.floor(np.sqrt(pop)).astype(np.int64))
+        + np.minimum(TOGETHER_SCORE_CAP, together)
+    )
+
+    eligible = np.flatnonzero(scores > 0)
+    # One integer key that orders like the (score, popularity) tuple.
+    key = scores[eligible] * (int(pop.max()) + 1) + pop[eligible]
+
+    if limit is not None and len(eligible) > limit:
+        if limit <= 0:
+            return []
+        kth = np.partition(key, len(key) - limit)[len(key) - limit]
+        keep = key >= kth
+        eligible, key = eligible[keep], key[keep]
+
+    winners = eligible[np.lexsort((eligible, -key))][:limit]
+
+    items = []
+    for i in winners.tolist():
+        reasons = []
+        if in_top[i]:
+            reasons.append("You often buy items from this category")
+        if bought[i] > 0:
+            reasons.append(f"You bought this before (x{int(bought[i])})")
+        if pop[i] > 0:
+            reasons.append("Popular recently")
+        if together[i] > 0:
+            reasons.append("Often bought together with items in your cart")
+
+        items.append({
+            "product_id": int(candidates.ids[i]),
+            "product_name": candidates.names[i],
+            "product_img": candidates.image_urls[i],
+            "product_price": candidates.prices[i],
+            "score": int(scores[i]),
+            "reasons": reasons,
+        })
+
+    return items
@@ -0,0 +1,159 @@
+import re
+from django.db import connection, connections
+from django.db.models import Q
+from ..models import Product
+
+SEARCH_FIELDS = ("name", "description", "ai_summary")
+SEARCH_CONFIG = "english"
+FTS_TABLE = "myapp_product_fts"
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+# External-content FTS5 table over the product text columns. The triggers keep
+# it in sync on every write, including bulk_create() and update().
+FTS_TABLE_SQL = f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+    name, description, ai_summary, content='myapp_product', content_rowid='id'
+)"""
+FTS_TRIGGERS = {
+    f"{FTS_TABLE}_ai": f"""AFTER INSERT ON myapp_product BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, description, ai_summary)
+        VALUES (new.id, new.name, new.description, new.ai_summary);
+    END""",
+    f"{FTS_TABLE}_ad": f"""AFTER DELETE ON myapp_product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description, ai_summary)
+        VALUES ('delete', old.id, old.name, old.description, old.ai_summary);
+    END""",
+    f"{FTS_TABLE}_au": f"""AFTER UPDATE OF name, description, ai_summary ON myapp_product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description, ai_summary)
+        VALUES ('delete', old.id, old.name, old.description, old.ai_summary);
+        INSERT INTO {FTS_TABLE}(rowid, name, description, ai_summary)
+        VALUES (new.id, new.name, new.description, new.ai_summary);
+    END""",
+}
+
+
+def search_vector():
+    from django.contrib.postgres.search import SearchVector
+    # Must stay identical to the expression in migration 0011 for the GIN index to be used.
+    return SearchVector(*SEARCH_FIELDS, config=SEARCH_CONFIG)
+
+def ensure_fts_index(using="default", **kwargs):
+    """
+    post_migrate hook for SQLite. Migrations that rebuild myapp_product
+    (SQLite's way of altering a table) drop its triggers, so recreate any
+    that are missing and rebuild the index from the table when they were.
+    """
+    connection = connections[using]
+    if connection.vendor != "sqlite" or "myapp_product" not in connection.introspection.table_names():
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(FTS_TABLE_SQL)
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'myapp_product'"
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        missing = [name for name in FTS_TRIGGERS if name not in existing]
+
+        for name in missing:
+            cursor.execute(f"CREATE TRIGGER {name} {FTS_TRIGGERS[name]}")
+        if missing:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+def fts_match(query):
+    # Every word must appear, the last one as a prefix so that partially
+    # typed words match. Quoting each token keeps FTS5 syntax out of user input.
+    tokens = _TOKEN.findall(query)
+    if not tokens:
+        return ""
+    quoted = [f'"{t}"' for t in tokens]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+class FtsResults:
+    """
+    Sliceable stand-in for a queryset of SQLite full-text results.
+
+    FTS5 can only rank inside a query on its own table, so a slice runs one
+    MATCH query ordered by bm25 (name weighted highest) with the filters as a
+    rowid subquery, then loads that page of products by primary key.
+    """
+
+    def __init__(self, queryset, match):
+        self.queryset = queryset
+        self.match = match
+
+    def __getitem__(self, k):
+        if not isinstance(k, slice):
+            return self[k:k + 1][0]
+
+        start = k.start or 0
+        limit = -1 if k.stop is None else max(0, k.stop - start)
+        sql = f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s"
+        params = [self.match]
+
+        if self.queryset.query.where:
+            filter_sql, filter_params = self.queryset.values("id").query.sql_with_params()
+            # unary + keeps SQLite from pushing the IN into FTS5, which would
+            # rerun the MATCH once per filtered id
+            sql += f" AND +rowid IN ({filter_sql})"
+            params += filter_params
+
+        sql += f" ORDER BY bm25({FTS_TABLE}, 10.0, 1.0, 2.0), rowid LIMIT %s OFFSET %s"
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params + [limit, start])
+            ids = [row[0] for row in cursor.fetchall()]
+
+        products = self.queryset.in_bulk(ids)
+        return [products[pk] for pk in ids if pk in products]
+
+    def __iter__(self):
+        return iter(self[0:None])
+
+def filter_products(queryset, category=None, min_price=None, max_price=None, in_stock=False):
+    if category is not None:
+        queryset = queryset.filter(category_id=category)
+    if min_price is not None:
+        queryset = queryset.filter(price__gte=min_price)
+    if max_price is not None:
+        queryset = queryset.filter(price__lte=max_price)
+    if in_stock:
+        # stock > 0, exactly the condition of the partial index
+        queryset = queryset.filter(stock__gt=0)
+    return queryset
+
+def search_products(query="", **filters):
+    """
+    Products matching the full-text query and filters, best match first.
+    Without a query the filtered catalogue is returned newest first.
+    """
+    queryset = filter_products(Product.objects.select_related("category"), **filters)
+    query = query.strip()
+
+    if not query:
+        return queryset.order_by("-created_at", "-id")
+
+    if connection.vendor == "postgresql":
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+        search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type="websearch")
+        return (
+            queryset
+            .annotate(search=search_vector())
+            .filter(search=search_query)
+            .annotate(rank=SearchRank(search_vector(), search_query))
+            .order_by("-rank", "id")
+        )
+
+    if connection.vendor == "sqlite":
+        match = fts_match(query)
+        if not match:
+            return queryset.none()
+        return FtsResults(queryset, match)
+
+    # Other backends: unindexed substring match.
+    words = _TOKEN.findall(query)
+    for word in words:
+        queryset = queryset.filter(
+            Q(name__icontains=word) | Q(description__icontains=word) | Q(ai_summary__icontains=word)
+        )
+    return queryset.order_by("-created_at", "-id")
@@ -0,0 +1,84 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from ..models import Wallet, WalletTransaction
+from .read_models import invalidate_wallet
+
+KEY_LENGTH = WalletTransaction._meta.get_field("idempotency_key").max_length
+CREDIT_TYPES = {"deposit", "refund"}
+DEBIT_TYPES = {"payment", "withdrawal"}
+
+
+class WalletError(Exception):
+    pass
+
+
+class InsufficientBalance(WalletError):
+    pass
+
+
+def parse_idempotency_key(header):
+    """The Idempotency-Key header, stripped, or None if there is none."""
+    key = (header or "").strip()
+    if not key:
+        return None
+    if len(key) > KEY_LENGTH or not all(" " <= c <= "~" for c in key):
+        raise WalletError(f"Idempotency-Key must be at most {KEY_LENGTH} printable ASCII characters")
+    return key
+
+def signed_amount(type, amount):
+    return amount if type in CREDIT_TYPES else -amount
+
+def lock_wallet(user):
+    try:
+        return Wallet.objects.select_for_update().get(user=user)
+    except Wallet.DoesNotExist:
+        raise WalletError("No wallet found")
+
+def replayed(wallet, idempotency_key, type):
+    """
+    The transaction an earlier request made with this key on this wallet,
+    or None. A key belongs to one transaction type: reusing a top-up key
+    for a payment is an error, not a replay.
+    """
+    if not idempotency_key:
+        return None
+    existing = wallet.transactions.filter(idempotency_key=idempotency_key).first()
+    if existing and existing.type != type:
+        raise WalletError("Idempotency key already used for a different transaction")
+    return existing
+
+@transaction.atomic
+def apply_transaction(user, amount, type, reference="", idempotency_key=None):
+    # The wallet row stays locked until commit, so the balance check, the
+    # balance update and the ledger insert happen as one step per wallet.
+    wallet = lock_wallet(user)
+
+    existing = replayed(wallet, idempotency_key, type)
+    if existing:
+        return existing
+
+    new_balance = wallet.balance + signed_amount(type, amount)
+    if new_balance < 0:
+        raise InsufficientBalance("Insufficient balance")
+
+    Wallet.objects.filter(pk=wallet.pk).update(
+        balance=F("balance") + signed_amount(type, amount),
+        updated_at=timezone.now(),
+    )
+    invalidate_wallet(wallet.user_id)
+
+    return WalletTransaction.objects.create(
+        wallet=wallet,
+        amount=amount,
+        type=type,
+        reference=reference,
+        idempotency_key=idempotency_key or None,
+        balance_after=new_balance,
+    )
+
+def credit(user, amount, reference="", idempotency_key=None, type="deposit"):
+    return apply_transaction(user, amount, type, reference, idempotency_key)
+
+def debit(user, amount, reference="", idempotency_key=None, type="payment"):
+    return apply_transaction(user, amount, type, reference, idempotency_key)
@@ -1,3 +1,1489 @@
-from django.test import TestCase
+import json
+import os
+import random
+import shutil
+import tempfile
+from decimal import Decimal
+from datetime import timedelta
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import Count, QuerySet, Sum
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from .models import (
+    Category, Product, CartItem, Order, OrderItem, Address, StockHold, InventoryLog, Wallet,
+    UserProductStat, ProductPopularity, UserRecommendation, ProductNeighbor, AISummaryJob,
+    AISummaryCache, ProductSalesDaily, CategorySalesDaily, CatalogueChange,
+)
+from .services.inventory import hold_cart, release_expired_holds
+from asgiref.sync import async_to_sync
+from unittest import mock
+from .services import ai_cache
+from .services.ai_jobs import run_worker, enqueue_summaries
+from .services.copurchase import PairCounter, rebuild_index, update_index, get_watermark
+from .services.cache import cached, invalidate, cache_stats, reset_cache_stats
+from .services import copurchase, features
+from .services.features import get_user_features, get_popularity, get_cached_popularity, invalidate_popularity
+from .services.sales import find_drift, backfill, sales_report
+from .services.analytics import OrderHistory, export_order_history
+from .services import catalogue
+from .benchmarks.plans import QueryLog, explain
+from .services.purchase_history import backfill as backfill_history, find_stale
+from .benchmarks.runner import check
+from .middleware import RequestMetricsMiddleware
+from .services.metrics import QueryStats, normalize_sql, registry as metrics
+from . import urls as app_urls
+from .services.recommendation import (
+    get_user_top_categories, get_user_product_counts, get_global_product_popularity, recommend_for_user,
+    handle_recommendation, score_with_loop, to_json_items,
+)
 
-# Create your tests here.
+
+def make_products(n, category=None, price="4.50", stock=100):
+    return Product.objects.bulk_create([
+        Product(name=f"Product {i}", category=category, price=Decimal(price), stock=stock)
+        for i in range(n)
+    ])
+
+
+class CheckoutTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_cache_stats()
+        self.user = User.objects.create_user(username="alice", password="pw")
+        self.address = Address.objects.create(
+            user=self.user, line1="1 Jalan", city="KL", state="WP", postal_code="50000", phone="0123"
+        )
+        self.category = Category.objects.create(name="Dairy")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def fill_cart(self, products, quantity=2):
+        CartItem.objects.bulk_create([
+            CartItem(user=self.user, product=p, quantity=quantity) for p in products
+        ])
+
+    def checkout(self, payment="paypal"):
+        return self.client.post(
+            "/api/orders/place/", {"address_id": self.address.id, "payment": payment}, format="json"
+        )
+
+
+class PlaceOrderTests(CheckoutTestCase):
+    def count_checkout_queries(self, lines):
+        CartItem.objects.filter(user=self.user).delete()
+        self.fill_cart(make_products(lines, self.category))
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.checkout()
+        self.assertEqual(response.status_code, 201)
+        return len(ctx.captured_queries)
+
+    def test_query_count_is_constant_in_cart_size(self):
+        small = self.count_checkout_queries(1)
+        large = self.count_checkout_queries(80)
+        self.assertEqual(small, large)
+
+    def test_query_count_is_pinned(self):
+        self.fill_cart(make_products(40, self.category))
+        with self.assertNumQueries(19):
+            self.checkout()
+
+    def test_order_lines_totals_and_stock(self):
+        products = make_products(3, self.category, price="10.00", stock=5)
+        self.fill_cart(products, quantity=2)
+
+        response = self.checkout()
+
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get(pk=response.data["order_id"])
+        self.assertEqual(order.total_amount, Decimal("60.00"))
+        self.assertEqual(order.shipping_fee, Decimal("0.00"))
+        self.assertEqual(order.items.count(), 3)
+        self.assertFalse(CartItem.objects.filter(user=self.user).exists())
+        self.assertEqual(
+            list(Product.objects.filter(pk__in=[p.pk for p in products]).values_list("stock", flat=True)),
+            [3, 3, 3],
+        )
+
+    def test_insufficient_stock_rolls_back(self):
+        plenty, scarce = make_products(2, self.category, stock=5)
+        Product.objects.filter(pk=scarce.pk).update(stock=1)
+        self.fill_cart([plenty, scarce], quantity=2)
+
+        response = self.checkout()
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertEqual(CartItem.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(Product.objects.get(pk=plenty.pk).stock, 5)
+
+    def test_empty_cart(self):
+        response = self.checkout()
+        self.assertEqual(response.status_code, 400)
+
+
+class CartReadTests(CheckoutTestCase):
+    def test_one_query_for_any_cart_size(self):
+        self.fill_cart(make_products(30, self.category, price="1.25"), quantity=1)
+
+        with self.assertNumQueries(1):
+            data = self.client.get("/api/cart/").json()
+
+        self.assertEqual(len(data["items"]), 30)
+        self.assertEqual(
+            data["items"][0]["product"],
+            {"id": data["items"][0]["product"]["id"], "name": "Product 0", "price": "1.25", "image_url": "",
+             "stock": 100, "category_name": "Dairy"},
+        )
+        self.assertEqual(data["items"][0]["subtotal"], "1.25")
+        self.assertEqual((data["subtotal"], data["shipping_fee"], data["total"]), ("37.50", "5.00", "42.50"))
+
+    def test_shipping_matches_checkout_rule(self):
+        self.fill_cart(make_products(2, price="25.00"), quantity=1)
+        data = self.client.get("/api/cart/").json()
+        self.assertEqual((data["subtotal"], data["shipping_fee"], data["total"]), ("50.00", "0.00", "50.00"))
+
+    def test_unchanged_cart_is_not_modified(self):
+        product = make_products(1, self.category)[0]
+        self.fill_cart([product], quantity=1)
+        etag = self.client.get("/api/cart/")["ETag"]
+
+        response = self.client.get("/api/cart/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+        Product.objects.filter(pk=product.pk).update(price=Decimal("5.00"))
+        response = self.client.get("/api/cart/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+class CartSyncTests(CheckoutTestCase):
+    def setUp(self):
+        super().setUp()
+        self.products = make_products(4, self.category, stock=5)
+        self.fill_cart(self.products[:2], quantity=2)
+
+    def sync(self, **body):
+        return self.client.put("/api/cart/sync/", body, format="json")
+
+    def cart(self):
+        return dict(CartItem.objects.filter(user=self.user).values_list("product_id", "quantity"))
+
+    def test_replace_whole_cart(self):
+        p0, p1, p2, p3 = [p.id for p in self.products]
+        # check, upsert, delete and the new cart, inside one savepoint
+        with self.assertNumQueries(6):
+            response = self.sync(items=[
+                {"product_id": p0, "quantity": 5}, {"product_id": p2, "quantity": 1}, {"product_id": p3, "quantity": 0},
+            ])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.cart(), {p0: 5, p2: 1})
+        self.assertEqual([line["quantity"] for line in response.json()["items"]], [5, 1])
+
+    def test_deltas(self):
+        p0, p1, p2, _ = [p.id for p in self.products]
+        response = self.sync(deltas=[
+            {"product_id": p0, "quantity": 1}, {"product_id": p0, "quantity": 1},
+            {"product_id": p1, "quantity": -5}, {"product_id": p2, "quantity": 3},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.cart(), {p0: 4, p2: 3})
+        self.assertEqual(response.json()["subtotal"], "31.50")
+
+    def test_rejects_whole_request(self):
+        p0, p1 = self.products[0].id, self.products[1].id
+        for body in (
+            {"items": [{"product_id": p0, "quantity": 6}]},
+            {"deltas": [{"product_id": p1, "quantity": 4}]},
+            {"items": [{"product_id": 999999, "quantity": 1}]},
+            {"items": [{"product_id": p0, "quantity": -1}]},
+            {"items": [{"product_id": p0, "quantity": 1}, {"product_id": p0, "quantity": 2}]},
+            {"items": [{"product_id": p0}]},
+            {},
+        ):
+            with self.subTest(body=body):
+                self.assertEqual(self.sync(**body).status_code, 400)
+        self.assertEqual(self.cart(), {p0: 2, p1: 2})
+
+    def test_line_above_stock_can_still_be_lowered(self):
+        p0, p1 = self.products[0].id, self.products[1].id
+        Product.objects.filter(pk__in=[p0, p1]).update(stock=1)
+
+        self.assertEqual(self.sync(deltas=[{"product_id": p0, "quantity": -1}]).status_code, 200)
+        self.assertEqual(self.sync(deltas=[{"product_id": p0, "quantity": 1}]).status_code, 400)
+        self.assertEqual(self.sync(items=[{"product_id": p0, "quantity": 1}, {"product_id": p1, "quantity": 2}]).status_code, 200)
+        self.assertEqual(self.cart(), {p0: 1, p1: 2})
+
+    def test_add_increments_existing_line(self):
+        self.client.post("/api/cart/", {"product_id": self.products[0].id, "quantity": 3}, format="json")
+        self.assertEqual(self.cart()[self.products[0].id], 5)
+
+
+# The app's routes as served over ASGI, for AsyncViewTests.
+urlpatterns = app_urls.async_urlpatterns + app_urls.urlpatterns
+
+
+class AsyncViewTests(CheckoutTestCase):
+    """Every async view answers exactly what its sync counterpart does."""
+
+    def setUp(self):
+        super().setUp()
+        self.products = make_products(3, self.category)
+        self.fill_cart(self.products[:2])
+        Wallet.objects.create(user=self.user, balance=Decimal("7.50"), wallet_address="w-alice")
+        # session logins: the async views read the session, not DRF's force_authenticate
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.async_client.force_login(self.user)
+
+    def get_async(self, path, headers=None):
+        with override_settings(ROOT_URLCONF=__name__):
+            return async_to_sync(self.async_client.get)(path, headers=headers)
+
+    def assertSameResponse(self, path):
+        sync, served = self.client.get(path), self.get_async(path)
+        self.assertEqual((served.status_code, served.json()), (sync.status_code, sync.json()))
+        return served
+
+    def test_reads_match_the_sync_views(self):
+        for path in (
+            "/api/products/?page_size=2", "/api/products/?fields=id,name", "/api/products/?fields=nope",
+            f"/api/products/{self.products[0].pk}/", "/api/products/999999/",
+            "/api/cart/", "/api/wallet/", "/api/recommendation/", "/api/check-auth/",
+        ):
+            with self.subTest(path=path):
+                self.assertSameResponse(path)
+
+    def test_product_pages_follow_the_cursor(self):
+        first = self.assertSameResponse("/api/products/?page_size=2").json()
+        last = self.assertSameResponse(first["next"]).json()
+        self.assertEqual(len(last["results"]), 1)
+        self.assertIsNone(last["next"])
+        self.assertEqual(self.get_async("/api/products/?cursor=bad").status_code, 404)
+
+    def test_cart_etag_and_anonymous_access(self):
+        etag = self.get_async("/api/cart/")["ETag"]
+        self.assertEqual(etag, self.client.get("/api/cart/")["ETag"])
+        self.assertEqual(self.get_async("/api/cart/", headers={"If-None-Match": etag}).status_code, 304)
+
+        async_to_sync(self.async_client.alogout)()
+        self.assertEqual(self.get_async("/api/cart/").status_code, 403)
+        self.assertEqual(self.get_async("/api/check-auth/").json(), {"authenticated": False})
+
+    def test_writes_go_to_the_sync_views(self):
+        with override_settings(ROOT_URLCONF=__name__):
+            response = async_to_sync(self.async_client.post)(
+                "/api/cart/", {"product_id": self.products[2].pk, "quantity": 1}, content_type="application/json"
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(CartItem.objects.filter(user=self.user).count(), 3)
+
+
+@override_settings(METRICS_SAMPLE_RATE=1, METRICS_DUPLICATE_THRESHOLD=3)
+class RequestMetricsTests(CheckoutTestCase):
+    def setUp(self):
+        super().setUp()
+        metrics.reset()
+
+    def test_server_timing_and_counts(self):
+        make_products(2, self.category)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/api/products/")
+
+        self.assertRegex(response["Server-Timing"], rf'^app;dur=[\d.]+, db;dur=[\d.]+;desc="{len(ctx)} queries"$')
+        text = metrics.render()
+        self.assertIn('http_requests_total{view="myapp.views.ProductListCreate",method="GET",status="200"} 1', text)
+        self.assertIn('http_request_db_queries_count{view="myapp.views.ProductListCreate"} 1', text)
+
+    def test_unsampled_requests_are_still_timed(self):
+        with override_settings(METRICS_SAMPLE_RATE=0):
+            response = self.client.get("/api/categories/")
+        self.assertRegex(response["Server-Timing"], r"^app;dur=[\d.]+$")
+        self.assertIn('http_request_duration_seconds_count{view="myapp.views.CategoryListCreate"} 1', metrics.render())
+        self.assertNotIn('http_request_db_queries_count{view="myapp.views.CategoryListCreate"}', metrics.render())
+
+    def test_repeated_statements_are_flagged(self):
+        self.assertEqual(
+            normalize_sql("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'x' LIMIT 21"),
+            "SELECT * FROM t WHERE id IN (...) AND name = ? LIMIT ?",
+        )
+        queries = QueryStats()
+        for sql in ("SELECT a FROM t WHERE id IN (%s)", "SELECT a FROM t WHERE id IN (%s, %s)", "SELECT b FROM u"):
+            queries(lambda *args: None, sql, (), False, {})
+        self.assertEqual(queries.repeats(), ("SELECT a FROM t WHERE id IN (...)", 2))
+
+        def n_plus_one(request):
+            for _ in range(3):
+                list(User.objects.filter(pk=self.user.pk))
+            return HttpResponse()
+
+        request = RequestFactory().get("/loop/")
+        request.resolver_match = None
+        with self.assertLogs("myapp.middleware", "WARNING"):
+            RequestMetricsMiddleware(n_plus_one)(request)
+        self.assertIn('http_request_duplicate_queries_total{view="unmatched"} 1', metrics.render())
+
+    def test_metrics_page_is_for_admins(self):
+        self.assertEqual(self.client.get("/api/admin/metrics/").status_code, 403)
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get("/api/admin/metrics/")
+        self.assertEqual(response["Content-Type"], "text/plain; version=0.0.4; charset=utf-8")
+        self.assertIn("# TYPE http_request_duration_seconds histogram", response.content.decode())
+
+    def test_async_views_are_measured(self):
+        async_client = self.async_client
+        async_client.force_login(self.user)
+        with override_settings(ROOT_URLCONF=__name__):
+            response = async_to_sync(async_client.get)("/api/check-auth/")
+        self.assertRegex(response["Server-Timing"], r'db;dur=[\d.]+;desc="[1-9]\d* queries"')
+
+
+class StockHoldTests(CheckoutTestCase):
+    def test_hold_takes_stock_and_checkout_consumes_it(self):
+        product, = make_products(1, self.category, stock=5)
+        self.fill_cart([product], quantity=2)
+
+        response = self.client.post("/api/orders/hold/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Product.objects.get(pk=product.pk).stock, 3)
+
+        self.assertEqual(self.checkout(payment="cod").status_code, 201)
+        self.assertEqual(Product.objects.get(pk=product.pk).stock, 3)
+        self.assertFalse(StockHold.objects.exists())
+
+    def test_sweeper_returns_expired_holds(self):
+        product, = make_products(1, self.category, stock=5)
+        self.fill_cart([product], quantity=4)
+        hold_cart(self.user)
+        StockHold.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(release_expired_holds(), 1)
+        self.assertEqual(Product.objects.get(pk=product.pk).stock, 5)
+        self.assertEqual(
+            list(InventoryLog.objects.filter(product=product).order_by("pk").values_list("change", flat=True)),
+            [-4, 4],
+        )
+
+    def locks_taken(self, action):
+        taken, select_for_update = [], QuerySet.select_for_update
+
+        def record(queryset, *args, **kwargs):
+            taken.append(queryset.model.__name__)
+            return select_for_update(queryset, *args, **kwargs)
+
+        with mock.patch.object(QuerySet, "select_for_update", record):
+            action()
+        return taken
+
+    def test_products_are_locked_before_holds_everywhere(self):
+        kept, dropped = make_products(2, self.category, stock=5)
+        self.fill_cart([kept, dropped], quantity=1)
+        hold_cart(self.user)
+        CartItem.objects.filter(product=dropped).delete()
+
+        self.assertEqual(self.locks_taken(lambda: hold_cart(self.user)), ["Product", "StockHold"])
+        self.assertEqual(self.locks_taken(lambda: self.checkout(payment="cod")), ["Product", "StockHold"])
+        self.assertEqual(Product.objects.get(pk=dropped.pk).stock, 5)
+
+        self.fill_cart([kept], quantity=1)
+        hold_cart(self.user)
+        StockHold.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.locks_taken(release_expired_holds), ["Product", "StockHold"])
+
+    def test_hold_rejects_when_stock_is_short(self):
+        product, = make_products(1, self.category, stock=1)
+        self.fill_cart([product], quantity=2)
+
+        response = self.client.post("/api/orders/hold/")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(StockHold.objects.exists())
+
+
+class WalletLedgerTests(CheckoutTestCase):
+    def setUp(self):
+        super().setUp()
+        self.wallet = Wallet.objects.create(user=self.user, balance=0, wallet_address="TF-TEST")
+
+    def topup(self, amount, key=None):
+        headers = {"HTTP_IDEMPOTENCY_KEY": key} if key else {}
+        return self.client.post("/api/wallet/topup/", {"amount": amount}, format="json", **headers)
+
+    def test_topup_retry_with_same_key_is_applied_once(self):
+        self.assertEqual(self.topup("10.00", key="abc").data["balance"], 10.0)
+        self.assertEqual(self.topup("10.00", key="abc").data["balance"], 10.0)
+
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal("10"))
+        self.assertEqual(self.wallet.transactions.count(), 1)
+
+    def test_insufficient_balance_leaves_cart_and_orders_untouched(self):
+        self.topup("5.00")
+        self.fill_cart(make_products(2, self.category, price="10.00"), quantity=1)
+
+        response = self.checkout(payment="wallet")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(CartItem.objects.filter(user=self.user).count(), 2)
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal("5"))
+
+    def test_wallet_checkout_records_payment_with_snapshot(self):
+        self.topup("50.00")
+        self.fill_cart(make_products(1, self.category, price="10.00"), quantity=2)
+
+        self.assertEqual(self.checkout(payment="wallet").status_code, 201)
+
+        payment = self.wallet.transactions.get(type="payment")
+        self.assertEqual(payment.amount, Decimal("20"))
+        self.assertEqual(payment.balance_after, Decimal("30"))
+
+    def checkout_with_key(self, key):
+        return self.client.post(
+            "/api/orders/place/", {"address_id": self.address.id, "payment": "wallet"}, format="json",
+            HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def test_checkout_retry_with_same_key_returns_the_paid_order(self):
+        self.topup("50.00")
+        self.fill_cart(make_products(1, self.category, price="10.00"), quantity=2)
+
+        first = self.checkout_with_key("K1")
+        retry = self.checkout_with_key("K1")
+
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.data["order_id"], first.data["order_id"])
+        self.assertEqual(Order.objects.count(), 1)
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal("30"))
+
+    def test_checkout_with_a_top_up_key_is_rejected_before_any_write(self):
+        self.topup("100.00", key="K1")
+        self.fill_cart(make_products(1, self.category, price="10.00"), quantity=2)
+
+        response = self.checkout_with_key("K1")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(CartItem.objects.filter(user=self.user).count(), 1)
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal("100"))
+
+    def test_unusable_idempotency_key_is_rejected(self):
+        self.topup("50.00")
+        self.fill_cart(make_products(1, self.category, price="10.00"), quantity=1)
+
+        for key in ("k" * 65, "caf\u00e9"):
+            with self.subTest(key=key):
+                self.assertEqual(self.topup("10.00", key=key).status_code, 400)
+                self.assertEqual(self.checkout_with_key(key).status_code, 400)
+        self.assertEqual(self.topup("10.00", key=" " + "k" * 64 + " ").status_code, 200)
+
+        self.assertFalse(Order.objects.exists())
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal("60"))
+
+    def test_recompute_balance_repairs_drift(self):
+        self.topup("20.00")
+        self.topup("5.00")
+        Wallet.objects.filter(pk=self.wallet.pk).update(balance=999)
+
+        call_command("recompute_balance", stdout=StringIO())
+
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal("25"))
+
+
+class RecommendationTestCase(CheckoutTestCase):
+    def setUp(self):
+        super().setUp()
+        self.fruit = Category.objects.create(name="Fruit")
+        self.dairy = make_products(3, self.category, stock=50)
+        self.apples = make_products(2, self.fruit, stock=50)
+
+        self.fill_cart(self.dairy, quantity=2)
+        self.checkout()
+        self.fill_cart(self.dairy[:1] + self.apples, quantity=1)
+        self.checkout()
+
+
+class RecommendationFeatureTests(RecommendationTestCase):
+    def test_store_matches_raw_aggregation(self):
+        top_category_ids, user_qty = get_user_features(self.user)
+
+        self.assertEqual(top_category_ids, get_user_top_categories(self.user)[0])
+        self.assertEqual(user_qty, get_user_product_counts(self.user))
+        self.assertEqual(get_popularity(), get_global_product_popularity())
+
+    def test_rebuild_matches_incremental_updates(self):
+        incremental = sorted(UserProductStat.objects.values_list("user_id", "product_id", "day", "quantity"))
+        popularity = sorted(ProductPopularity.objects.values_list("product_id", "day", "quantity"))
+
+        call_command("rebuild_recommendation_features", stdout=StringIO())
+
+        self.assertEqual(sorted(UserProductStat.objects.values_list("user_id", "product_id", "day", "quantity")), incremental)
+        self.assertEqual(sorted(ProductPopularity.objects.values_list("product_id", "day", "quantity")), popularity)
+
+    def test_recommendation_query_count(self):
+        # cold cache: features, popularity rebuild stamp and aggregate, neighbours, candidates
+        with self.assertNumQueries(5):
+            items = recommend_for_user(self.user, exclude_bought=False)
+
+        self.assertEqual(items[0]["product_id"], self.dairy[0].id)
+
+
+class BatchRecommendationTests(RecommendationTestCase):
+    def test_stored_recommendations_match_live(self):
+        live = to_json_items(recommend_for_user(self.user, exclude_bought=False))
+
+        for workers in ("1", "2"):
+            with self.subTest(workers=workers):
+                call_command("generate_recommendations", "--workers", workers, stdout=StringIO())
+                self.assertEqual(UserRecommendation.objects.get(user=self.user).items, live)
+
+    def test_view_serves_fresh_stored_list(self):
+        UserRecommendation.objects.create(user=self.user, items=[{"product_id": 1}], generated_at=timezone.now())
+        self.assertEqual(self.client.get("/api/recommendation/").json(), [{"product_id": 1}])
+
+        UserRecommendation.objects.filter(user=self.user).update(generated_at=timezone.now() - timedelta(days=2))
+        self.assertEqual(self.client.get("/api/recommendation/").json()[0]["product_id"], self.dairy[0].id)
+
+
+@mock.patch.object(copurchase, "SETTLE", timedelta(0))
+class CopurchaseIndexTests(RecommendationTestCase):
+    def neighbors(self):
+        return sorted(ProductNeighbor.objects.values_list("product_id", "neighbor_id", "score"))
+
+    def test_rebuild_counts_pairs(self):
+        rebuild_index()
+        d0, d1, d2 = [p.id for p in self.dairy]
+        a0 = self.apples[0].id
+
+        scores = {(p, n): s for p, n, s in self.neighbors()}
+        self.assertEqual(scores[(d0, d1)], 1)
+        self.assertEqual(scores[(d0, a0)], 1)
+        self.assertEqual(scores[(d1, d0)], 1)
+        self.assertNotIn((d1, a0), scores)
+        self.assertEqual(get_watermark(), Order.objects.latest("pk").pk)
+
+    def test_incremental_update_matches_rebuild(self):
+        rebuild_index()
+        self.fill_cart(self.dairy[:2] + self.apples[:1], quantity=1)
+        self.checkout()
+
+        update_index()
+        incremental = self.neighbors()
+        rebuild_index()
+        self.assertEqual(incremental, self.neighbors())
+
+        update_index()
+        self.assertEqual(incremental, self.neighbors())
+
+    def test_incremental_update_waits_for_orders_to_settle(self):
+        rebuild_index()
+        watermark = get_watermark()
+        self.fill_cart(self.dairy[1:], quantity=1)
+        self.checkout()
+
+        update_index(settle=timedelta(minutes=5))
+        self.assertEqual(get_watermark(), watermark)
+
+        # once the window has passed
+        Order.objects.filter(pk__gt=watermark).update(created_at=timezone.now() - timedelta(minutes=6))
+        update_index(settle=timedelta(minutes=5))
+        self.assertEqual(get_watermark(), Order.objects.latest("pk").pk)
+        d1, d2 = self.dairy[1].id, self.dairy[2].id
+        self.assertEqual(dict(((p, n), c) for p, n, c in self.neighbors())[(d1, d2)], 2)
+
+    def test_incremental_update_keeps_top_n(self):
+        rebuild_index()
+        self.fill_cart(self.dairy + self.apples, quantity=1)
+        self.checkout()
+
+        update_index(top_n=2)
+        self.assertLessEqual(max(ProductNeighbor.objects.values("product_id").annotate(n=Count("pk")).values_list("n", flat=True)), 2)
+
+    def test_lossy_counter_keeps_frequent_pairs(self):
+        counter = PairCounter(max_pairs=8)
+        for i in range(50):
+            counter.add_order([1, 2, 100 + i])
+
+        self.assertLessEqual(len(counter.counts), 8)
+        self.assertGreaterEqual(counter.counts[(1, 2)], 50 - counter.floor)
+
+    def test_related_endpoint_and_cart_boost(self):
+        rebuild_index()
+        d0, d1 = self.dairy[0].id, self.dairy[1].id
+
+        related = self.client.get(f"/api/products/{d0}/related/").json()
+        self.assertIn(d1, [r["product_id"] for r in related])
+
+        CartItem.objects.create(user=self.user, product=self.dairy[0], quantity=1)
+        reasons = {i["product_id"]: i["reasons"] for i in recommend_for_user(self.user, exclude_bought=False)}
+        self.assertIn("Often bought together with items in your cart", reasons[d1])
+        self.assertNotIn("Often bought together with items in your cart", reasons[d0])
+
+    def test_related_endpoint_limit_falls_back_or_clamps(self):
+        rebuild_index()
+        d0 = self.dairy[0].id
+
+        for limit, expected in (("abc", 4), ("-1", 1), ("0", 1), ("1", 1)):
+            with self.subTest(limit=limit):
+                response = self.client.get(f"/api/products/{d0}/related/", {"limit": limit})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.json()), expected)
+
+
+class CatalogueTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.category = Category.objects.create(name="Bakery")
+        self.products = make_products(23, self.category)
+        # a shared timestamp so that pages have to break ties on id
+        Product.objects.filter(pk__in=[p.pk for p in self.products[5:15]]).update(
+            created_at=self.products[5].created_at
+        )
+
+    def walk(self, url):
+        ids = []
+        while url:
+            with self.assertNumQueries(1):
+                data = self.client.get(url).json()
+            ids += [p["id"] for p in data["results"]]
+            url = data["next"]
+        return ids
+
+    def test_pages_cover_catalogue_once_in_order(self):
+        expected = list(Product.objects.order_by("-created_at", "-id").values_list("id", flat=True))
+        self.assertEqual(self.walk("/api/products/?page_size=4"), expected)
+
+    def test_sparse_fields_defer_columns(self):
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get("/api/products/?fields=id,name,category_name").json()
+
+        self.assertEqual(set(data["results"][0]), {"id", "name", "category_name"})
+        self.assertEqual(data["results"][0]["category_name"], "Bakery")
+        self.assertNotIn("description", ctx.captured_queries[0]["sql"])
+        self.assertEqual(self.client.get("/api/products/?fields=id,secret").status_code, 400)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get("/api/products/?cursor=nonsense").status_code, 404)
+
+
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.fruit = Category.objects.create(name="Fruit")
+        self.dairy = Category.objects.create(name="Dairy")
+        self.apples = Product.objects.create(
+            name="Green apples", description="Crisp and sour", category=self.fruit, price=Decimal("3.00"), stock=5
+        )
+        self.cider = Product.objects.create(
+            name="Cider", description="Pressed from apples", category=self.fruit, price=Decimal("8.00"), stock=0
+        )
+        self.yogurt = Product.objects.create(
+            name="Yogurt", ai_summary="Pairs well with apples", category=self.dairy, price=Decimal("2.00"), stock=9
+        )
+
+    def search(self, **params):
+        response = self.client.get("/api/products/search/", params)
+        self.assertEqual(response.status_code, 200)
+        return [p["id"] for p in response.json()["results"]]
+
+    def test_full_text_over_all_text_fields(self):
+        self.assertEqual(set(self.search(q="apples")), {self.apples.id, self.cider.id, self.yogurt.id})
+        self.assertEqual(self.search(q="green appl"), [self.apples.id])
+        self.assertEqual(self.search(q='sour" (*'), [self.apples.id])
+
+    def test_filters(self):
+        self.assertEqual(set(self.search(q="apples", category=self.fruit.id)), {self.apples.id, self.cider.id})
+        self.assertEqual(self.search(q="apples", in_stock="true", max_price="2.50"), [self.yogurt.id])
+        self.assertEqual(self.search(min_price="2.50", max_price="5"), [self.apples.id])
+        self.assertEqual(self.client.get("/api/products/search/", {"min_price": "cheap"}).status_code, 400)
+
+    def test_index_follows_writes(self):
+        self.cider.description = "Pressed from pears"
+        self.cider.save()
+        Product.objects.filter(pk=self.yogurt.pk).update(ai_summary="Plain")
+        self.apples.delete()
+
+        self.assertEqual(self.search(q="apples"), [])
+        self.assertEqual(self.search(q="pears"), [self.cider.id])
+
+
+class FlakySummarizer:
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = []
+
+    async def summarize(self, description):
+        self.calls.append(description)
+        if len(self.calls) <= self.failures:
+            raise ConnectionError("model unavailable")
+        return "Flaky summary."
+
+
+@override_settings(AI_SUMMARIZER="myapp.services.ai.FakeSummarizer")
+class AISummaryJobTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username="admin", is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_product_write_enqueues_and_worker_fills_summary(self):
+        response = self.client.post(
+            "/api/admin/products/add/",
+            {"name": "Oat milk", "description": "Creamy oat drink. Barista blend.", "price": "2.10", "stock": 4},
+            format="json",
+        )
+        product = Product.objects.get(pk=response.json()["id"])
+        self.assertEqual(product.ai_summary, "")
+        self.assertEqual(AISummaryJob.objects.get(product=product).status, "pending")
+
+        # re-enqueueing keeps a single pending job
+        enqueue_summaries([product.pk])
+        self.assertEqual(AISummaryJob.objects.filter(product=product).count(), 1)
+
+        call_command("run_ai_worker", "--once", stdout=StringIO())
+        product.refresh_from_db()
+        self.assertEqual(product.ai_summary, "Creamy oat drink.")
+        self.assertEqual(AISummaryJob.objects.get(product=product).status, "done")
+
+    def test_failures_back_off_then_succeed(self):
+        product, = make_products(1)
+        Product.objects.filter(pk=product.pk).update(description="Stone baked.")
+        enqueue_summaries([product.pk])
+        summarizer = FlakySummarizer(failures=1)
+
+        async_to_sync(run_worker)(once=True, summarizer=summarizer)
+        job = AISummaryJob.objects.get(product=product)
+        self.assertEqual((job.status, job.attempts), ("pending", 1))
+        self.assertIn("model unavailable", job.last_error)
+        self.assertGreater(job.run_after, timezone.now())
+
+        AISummaryJob.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        async_to_sync(run_worker)(once=True, summarizer=summarizer)
+        product.refresh_from_db()
+        self.assertEqual(product.ai_summary, "Flaky summary.")
+        self.assertEqual(AISummaryJob.objects.get(pk=job.pk).status, "done")
+
+
+class CountingSummarizer:
+    def __init__(self):
+        self.calls = []
+
+    async def summarize(self, description):
+        self.calls.append(description)
+        return f"Summary {len(self.calls)}."
+
+
+class AISummaryCacheTests(TestCase):
+    def setUp(self):
+        ai_cache.clear_lru()
+        self.summarizer = CountingSummarizer()
+
+    def summarize(self, descriptions):
+        products = make_products(len(descriptions))
+        for product, description in zip(products, descriptions):
+            Product.objects.filter(pk=product.pk).update(description=description)
+        enqueue_summaries([p.pk for p in products])
+        async_to_sync(run_worker)(once=True, summarizer=self.summarizer)
+        return list(Product.objects.filter(pk__in=[p.pk for p in products]).order_by("pk").values_list("ai_summary", flat=True))
+
+    def test_repeated_descriptions_cost_one_call(self):
+        summaries = self.summarize(["Sweet  red apples", "sweet red APPLES ", "Sourdough loaf", "Sweet red apples"])
+
+        self.assertEqual(len(self.summarizer.calls), 2)
+        self.assertEqual(summaries[0], summaries[1])
+        self.assertEqual(summaries[0], summaries[3])
+
+        # a later product, after the LRU is gone, is answered by the table
+        ai_cache.clear_lru()
+        self.assertEqual(self.summarize(["Sourdough loaf"]), [summaries[2]])
+        self.assertEqual(len(self.summarizer.calls), 2)
+
+        stats, = ai_cache.summary_cache_stats()
+        self.assertEqual((stats["model_calls"], stats["calls_saved"], stats["hit_rate"]), (2, 3, 0.6))
+        out = StringIO()
+        call_command("ai_summary_stats", stdout=out)
+        self.assertIn("60.0% (current)", out.getvalue())
+
+    def test_prompt_change_misses_old_entries(self):
+        self.summarize(["Sourdough loaf"])
+        with mock.patch.object(ai_cache, "SUMMARY_VERSION", "next-prompt"):
+            self.assertEqual(self.summarize(["Sourdough loaf"]), ["Summary 2."])
+
+        self.assertEqual(len(self.summarizer.calls), 2)
+        self.assertEqual(AISummaryCache.objects.filter(version="next-prompt").count(), 1)
+
+
+class ProductImportExportTests(TestCase):
+    CSV = (
+        "sku,name,category,price,stock,description\n"
+        "A-1,Whole milk,Dairy,1.20,30,Fresh whole milk.\n"
+        "A-2,Rye bread,bakery,2.50,10,\n"
+        "A-3,Bad price,Dairy,cheap,1,\n"
+        "A-1,Whole milk 1L,dairy,1.25,30,Fresh whole milk.\n"
+        "A-4,Croissant,Bakery,0.90,,Buttery.\n"
+    )
+
+    def setUp(self):
+        self.dairy = Category.objects.create(name="Dairy")
+        self.admin = User.objects.create_user(username="admin", is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def upload(self, content, name="products.csv"):
+        return self.client.post(
+            "/api/admin/products/bulk/", {"file": SimpleUploadedFile(name, content.encode())}, format="multipart"
+        ).json()
+
+    def test_bulk_upload_upserts_by_sku(self):
+        report = self.upload(self.CSV)
+
+        self.assertEqual((report["rows"], report["created"], report["errors"]), (5, 3, 1))
+        self.assertEqual(report["error_details"][0]["line"], 4)
+        milk = Product.objects.get(sku="A-1")
+        self.assertEqual((milk.name, milk.price, milk.category), ("Whole milk 1L", Decimal("1.25"), self.dairy))
+        self.assertEqual(Product.objects.get(sku="A-4").stock, 0)
+        # "bakery" and "Bakery" resolve to one new category
+        self.assertEqual(Category.objects.filter(name__iexact="bakery").count(), 1)
+        self.assertEqual(AISummaryJob.objects.filter(status="pending").count(), 2)
+
+        Product.objects.filter(sku="A-1").update(ai_summary="Milk, whole.")
+        AISummaryJob.objects.all().delete()
+        report = self.upload('{"sku": "A-1", "name": "Milk", "price": 1.3, "description": "Fresh whole milk."}\n'
+                             '{"sku": "A-4", "name": "Croissant", "price": "1", "description": "Flaky."}\n', "more.jsonl")
+
+        self.assertEqual((report["created"], report["updated"], report["summaries_queued"]), (0, 2, 1))
+        milk = Product.objects.get(sku="A-1")
+        self.assertEqual((milk.name, milk.ai_summary, milk.category), ("Milk", "Milk, whole.", None))
+        self.assertEqual(list(AISummaryJob.objects.values_list("product__sku", flat=True)), ["A-4"])
+
+    def test_export_round_trip(self):
+        self.upload(self.CSV)
+        response = self.client.get("/api/admin/products/export/", {"fmt": "jsonl"})
+        exported = b"".join(response.streaming_content).decode()
+        before = sorted(Product.objects.values_list("sku", "name", "category__name", "price", "stock", "description"))
+
+        Product.objects.all().delete()
+        path = self.tmp_file(exported)
+        call_command("import_products", path, stdout=StringIO())
+
+        self.assertEqual(
+            sorted(Product.objects.values_list("sku", "name", "category__name", "price", "stock", "description")), before
+        )
+
+    def test_unreadable_file_is_a_validation_error(self):
+        latin1 = "sku,name,price\nA-1,Milk,1.00\nA-2,Cr\u00e8me fra\u00eeche,2.00\n".encode("latin-1")
+        unterminated = b'sku,name,price\nA-1,Milk,1.00\nA-2,"Bread,2.00\nA-3,Eggs,3.00\n'
+
+        for content in (latin1, unterminated):
+            with self.subTest(content=content):
+                response = self.client.post(
+                    "/api/admin/products/bulk/", {"file": SimpleUploadedFile("p.csv", content)}, format="multipart"
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("After line", response.json()["error"])
+        self.assertFalse(Product.objects.filter(sku__in=["A-2", "A-3"]).exists())
+
+        fd, path = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(fd, "wb") as f:
+            f.write(latin1)
+        self.addCleanup(os.remove, path)
+        with self.assertRaisesMessage(CommandError, "not UTF-8"):
+            call_command("import_products", path, stdout=StringIO(), stderr=StringIO())
+
+    def tmp_file(self, content):
+        fd, path = tempfile.mkstemp(suffix=".jsonl")
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+
+class AdminOrderListTests(CheckoutTestCase):
+    def setUp(self):
+        super().setUp()
+        product = make_products(1, self.category)[0]
+        self.orders = []
+        for i in range(7):
+            order = Order.objects.create(
+                user=self.user, address=self.address, total_amount=Decimal("9.00"),
+                status="shipped" if i % 2 else "pending", payment_status="paid" if i < 4 else "unpaid",
+            )
+            OrderItem.objects.create(
+                order=order, product=product, product_name=product.name, unit_price=Decimal("4.50"),
+                quantity=2, subtotal=Decimal("9.00"),
+            )
+            self.orders.append(order)
+        Order.objects.filter(pk=self.orders[0].pk).update(created_at=timezone.now() - timedelta(days=10))
+        self.admin = User.objects.create_user(username="admin", is_staff=True)
+        self.client.force_authenticate(self.admin)
+
+    def test_pages_use_fixed_number_of_queries(self):
+        ids, url = [], "/api/admin/orders/?page_size=3"
+        while url:
+            # orders with user and address, then their items
+            with self.assertNumQueries(2):
+                data = self.client.get(url).json()
+            ids += [o["id"] for o in data["results"]]
+            url = data["next"]
+
+        self.assertEqual(ids, list(Order.objects.order_by("-created_at", "-id").values_list("id", flat=True)))
+        self.assertEqual(data["results"][-1]["user"], {"id": self.user.id, "username": "alice"})
+        self.assertEqual(len(data["results"][-1]["items"]), 1)
+
+    def test_filters(self):
+        def ids(**params):
+            return {o["id"] for o in self.client.get("/api/admin/orders/", params).json()["results"]}
+
+        self.assertEqual(ids(status="shipped", payment_status="paid"), {self.orders[1].id, self.orders[3].id})
+        recent = ids(created_from=(timezone.now() - timedelta(days=1)).date().isoformat())
+        self.assertNotIn(self.orders[0].id, recent)
+        self.assertEqual(len(recent), 6)
+        self.assertEqual(ids(created_to=timezone.now().date().isoformat()), {o.id for o in self.orders})
+        self.assertEqual(self.client.get("/api/admin/orders/", {"status": "lost"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/admin/orders/", {"created_from": "May"}).status_code, 400)
+
+    def test_ndjson_export_streams_every_match(self):
+        response = self.client.get("/api/admin/orders/", {"fmt": "ndjson", "payment_status": "unpaid"})
+        lines = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertEqual([o["id"] for o in lines], [o.id for o in reversed(self.orders[4:])])
+        self.assertEqual(lines[0]["items"][0]["quantity"], 2)
+
+
+class SalesRollupTests(CheckoutTestCase):
+    def setUp(self):
+        super().setUp()
+        self.fruit = Category.objects.create(name="Fruit")
+        self.milk = make_products(1, self.category, price="3.00")[0]
+        self.apple = make_products(1, self.fruit, price="2.00")[0]
+        self.admin = User.objects.create_user(username="admin", is_staff=True)
+
+        self.fill_cart([self.milk, self.apple], quantity=2)
+        self.paid = Order.objects.get(pk=self.checkout("paypal").data["order_id"])
+        self.fill_cart([self.milk], quantity=1)
+        self.unpaid = Order.objects.get(pk=self.checkout("cod").data["order_id"])
+        self.client.force_authenticate(self.admin)
+
+    def report(self, **params):
+        return self.client.get("/api/admin/reports/sales/", params).json()
+
+    def set_payment(self, order, payment_status):
+        self.client.put(f"/api/admin/orders/{order.pk}/", {"payment_status": payment_status}, format="json")
+
+    def test_checkout_and_admin_updates_keep_rollups_current(self):
+        self.assertEqual(
+            [(r["product__id"], r["total_quantity"], r["total_revenue"]) for r in self.report()],
+            [(self.milk.id, 2, 6.0), (self.apple.id, 2, 4.0)],
+        )
+
+        self.set_payment(self.unpaid, "paid")
+        self.set_payment(self.unpaid, "paid")  # no change, counted once
+        self.set_payment(self.paid, "refunded")
+
+        self.assertEqual(
+            [(r["product__id"], r["product_name"], r["total_quantity"]) for r in self.report()],
+            [(self.milk.id, self.milk.name, 1)],
+        )
+        self.assertEqual(list(find_drift()), [])
+
+    def test_date_range_and_grouping(self):
+        today = timezone.localdate()
+        ProductSalesDaily.objects.create(product=self.milk, day=today - timedelta(days=40), quantity=5, revenue=15)
+        CategorySalesDaily.objects.create(category=self.category, day=today - timedelta(days=40), quantity=5, revenue=15)
+
+        by_category = self.report(group_by="category", **{"from": (today - timedelta(days=7)).isoformat()})
+        self.assertEqual([(r["category__id"], r["total_quantity"]) for r in by_category], [(self.category.id, 2), (self.fruit.id, 2)])
+
+        monthly = self.report(group_by="none", period="month")
+        self.assertEqual([r["total_revenue"] for r in monthly], [10.0, 15.0])
+        self.assertEqual(self.report(period="day", to=(today - timedelta(days=1)).isoformat())[0]["total_quantity"], 5)
+
+        self.assertEqual(self.client.get("/api/admin/reports/sales/", {"group_by": "user"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/admin/reports/sales/", {"from": "2024-02-30"}).status_code, 400)
+
+    def test_checker_finds_drift_and_backfill_repairs_it(self):
+        ProductSalesDaily.objects.filter(product=self.apple).update(quantity=7)
+        CategorySalesDaily.objects.all().delete()
+
+        drift = list(find_drift())
+        self.assertEqual(len(drift), 3)
+        self.assertEqual(drift[0][:2], ("product", self.apple.id))
+        with self.assertRaises(CommandError):
+            call_command("check_sales_rollups", stdout=StringIO())
+
+        call_command("backfill_sales_rollups", stdout=StringIO())
+        self.assertEqual(list(find_drift()), [])
+        call_command("check_sales_rollups", stdout=StringIO())
+
+    def test_deleted_product_stays_in_its_category(self):
+        self.milk.delete()
+        self.set_payment(self.unpaid, "paid")
+
+        def by_category():
+            return [(r["category__id"], r["total_quantity"]) for r in self.report(group_by="category")]
+
+        self.assertEqual([r["product__id"] for r in self.report()], [self.apple.id])
+        self.assertEqual(by_category(), [(self.category.id, 3), (self.fruit.id, 2)])
+        self.assertEqual(list(find_drift()), [])
+
+        backfill()
+        self.assertEqual(by_category(), [(self.category.id, 3), (self.fruit.id, 2)])
+
+
+class OrderHistoryExportTests(CheckoutTestCase):
+    def setUp(self):
+        super().setUp()
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.milk, self.bread = make_products(2, self.category, price="3.00")
+        self.apple = make_products(1, price="2.00")[0]
+
+        self.fill_cart([self.milk, self.apple], quantity=2)
+        old = self.checkout("paypal").data["order_id"]
+        Order.objects.filter(pk=old).update(created_at=timezone.now() - timedelta(days=45))
+        self.fill_cart([self.milk], quantity=1)
+        self.checkout("cod")
+        self.fill_cart([self.milk, self.bread, self.apple], quantity=1)
+        self.checkout("paypal")
+        backfill()
+
+    def export(self):
+        return export_order_history(self.dir, settle=timedelta(0))
+
+    def test_queries_match_database_aggregates(self):
+        self.assertEqual(self.export()[0], 6)
+        history = OrderHistory(self.dir)
+
+        self.assertEqual(
+            [(day, qty, rev) for day, qty, rev in history.revenue_by_period("month")],
+            sorted((r["period"], r["total_quantity"], r["total_revenue"]) for r in sales_report(group_by=None, period="month")),
+        )
+        self.assertEqual(
+            [(r["category_id"], r["revenue"]) for r in history.category_mix()],
+            [(r["category__id"], r["total_revenue"]) for r in sales_report(group_by="category")],
+        )
+        self.assertEqual(history.basket_sizes(), {2: 1, 3: 1})
+        self.assertEqual(history.basket_sizes(paid_only=False), {1: 1, 2: 1, 3: 1})
+
+        recent = history.revenue_by_period("day", start=timezone.localdate() - timedelta(days=1))
+        self.assertEqual([rev for _, _, rev in recent], [Decimal("8.00")])
+
+    def test_export_is_incremental(self):
+        self.export()
+        self.assertEqual(self.export()[0], 0)
+
+        self.fill_cart([self.bread], quantity=4)
+        self.checkout("paypal")
+        self.assertEqual(self.export()[0], 1)
+        self.assertEqual(OrderHistory(self.dir).basket_sizes(units=True), {3: 1, 4: 2})
+
+
+class AggregateCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_cache_stats()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return {"value": self.calls}
+
+    def test_hit_after_miss(self):
+        self.assertEqual(cached("test", self.compute), {"value": 1})
+        self.assertEqual(cached("test", self.compute), {"value": 1})
+
+        stats = cache_stats()
+        self.assertEqual((stats["miss"], stats["hit"], stats["recompute"]), (1, 1, 1))
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_invalidate_forces_recompute(self):
+        cached("test", self.compute)
+        invalidate("test")
+
+        self.assertEqual(cached("test", self.compute), {"value": 2})
+
+    def test_stale_entry_is_refreshed_once(self):
+        cached("test", self.compute)
+        cache.set("agg:test:1:", ({"value": "old"}, 0), timeout=60)
+
+        self.assertEqual(cached("test", self.compute), {"value": 2})
+        self.assertEqual(cache_stats()["stale"], 1)
+
+    def test_recommendations_reuse_cached_popularity(self):
+        user = User.objects.create_user(username="bob")
+        product, = make_products(1)
+        ProductPopularity.objects.create(product=product, day=timezone.localdate(), quantity=3)
+        recommend_for_user(user)
+
+        # user features + cart neighbours + candidate products; popularity comes from the cache
+        with self.assertNumQueries(3):
+            recommend_for_user(user)
+
+
+    def test_popularity_rebuild_reaches_a_worker_with_its_own_cache(self):
+        product, = make_products(1)
+        ProductPopularity.objects.create(product=product, day=timezone.localdate(), quantity=3)
+        self.assertEqual(get_cached_popularity(), {product.pk: 3})
+
+        # as the rebuild command run elsewhere: rows and stamp, nothing in this cache
+        ProductPopularity.objects.update(quantity=8)
+        with mock.patch.object(features, "invalidate"):
+            invalidate_popularity()
+        self.assertEqual(get_cached_popularity(), {product.pk: 3})
+
+        invalidate("popularity-stamp")  # STAMP_TTL has passed
+        self.assertEqual(get_cached_popularity(), {product.pk: 8})
+
+
+@override_settings(READ_MODEL_CACHE=True)
+class ReadModelCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name="Bakery")
+        self.product, = make_products(1, self.category)
+        self.client = APIClient()
+
+    @override_settings(READ_MODEL_CACHE=False)
+    def test_reads_go_to_the_database_without_a_shared_cache(self):
+        user = User.objects.create_user(username="dave")
+        Wallet.objects.create(user=user, balance=0, wallet_address="w-dave")
+        self.client.force_authenticate(user)
+        self.client.get("/api/wallet/")
+        self.client.get(f"/api/products/{self.product.pk}/")
+
+        # as another worker would, with no invalidation reaching this process
+        Wallet.objects.filter(user=user).update(balance=3)
+        Product.objects.filter(pk=self.product.pk).update(stock=9)
+
+        self.assertEqual(self.client.get("/api/wallet/").json()["balance"], 3.0)
+        self.assertEqual(self.client.get(f"/api/products/{self.product.pk}/").json()["stock"], 9)
+
+    def test_category_list_is_cached_until_a_category_changes(self):
+        self.client.get("/api/categories/")
+        with self.assertNumQueries(0):
+            self.assertEqual([c["name"] for c in self.client.get("/api/categories/").json()], ["Bakery"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name="Fruit")
+        self.assertEqual(len(self.client.get("/api/categories/").json()), 2)
+
+    def test_product_detail_follows_stock_and_category_changes(self):
+        url = f"/api/products/{self.product.pk}/"
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).json()["stock"], 100)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.stock = 7
+            self.product.save()
+        self.assertEqual(self.client.get(url).json()["stock"], 7)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = "Bread"
+            self.category.save()
+        self.assertEqual(self.client.get(url).json()["category_name"], "Bread")
+
+    def test_missing_product_is_not_found(self):
+        self.assertEqual(self.client.get("/api/products/999999/").status_code, 404)
+
+    def test_wallet_summary_follows_ledger(self):
+        user = User.objects.create_user(username="carol")
+        Wallet.objects.create(user=user, balance=0, wallet_address="w-carol")
+        self.client.force_authenticate(user)
+        self.assertEqual(self.client.get("/api/wallet/").json()["balance"], 0.0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/api/wallet/topup/", {"amount": "12.50"}, format="json")
+        self.assertEqual(self.client.get("/api/wallet/").json()["balance"], 12.5)
+
+
+@mock.patch.object(catalogue, "REBUILD_INTERVAL", 0)
+class CatalogueSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name="Bakery")
+        self.products = make_products(3, self.category)
+        self.client = APIClient()
+
+    def get(self, **params):
+        return self.client.get("/api/catalogue/", params)
+
+    def edit(self, product, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            for name, value in fields.items():
+                setattr(product, name, value)
+            product.save()
+
+    def test_snapshot_is_served_without_queries(self):
+        first = self.get()
+        data = json.loads(first.content)
+        self.assertEqual(data["categories"], [{"id": self.category.pk, "name": "Bakery"}])
+        self.assertEqual(
+            data["products"][0],
+            {"id": self.products[2].pk, "name": "Product 2", "price": "4.50", "image_url": "", "category": self.category.pk},
+        )
+
+        # between checks against the change log
+        with mock.patch.object(catalogue, "REBUILD_INTERVAL", 60), self.assertNumQueries(0):
+            response = self.client.get("/api/catalogue/", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["Cache-Control"], "public, no-cache")
+
+    def test_changes_rebuild_once_with_a_new_etag(self):
+        etag = self.get()["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            for product in self.products:
+                product.price = Decimal("9.99")
+                product.save()
+
+        with mock.patch.object(catalogue, "build_snapshot", wraps=catalogue.build_snapshot) as build:
+            response = self.get()
+            self.get()
+        self.assertEqual(build.call_count, 1)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual({p["price"] for p in json.loads(response.content)["products"]}, {"9.99"})
+
+    def test_change_from_another_process_is_picked_up(self):
+        etag = self.get()["ETag"]
+        # as another worker with its own cache would: rows and log, no signals here
+        Product.objects.filter(pk=self.products[0].pk).update(name="Elsewhere")
+        CatalogueChange.objects.create(product_id=self.products[0].pk)
+
+        response = self.get()
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertIn("Elsewhere", {p["name"] for p in json.loads(response.content)["products"]})
+
+    def test_recent_snapshot_is_kept_through_a_burst(self):
+        self.get()
+        self.edit(self.products[0], name="Renamed")
+
+        with mock.patch.object(catalogue, "REBUILD_INTERVAL", 60):
+            names = {p["name"] for p in json.loads(self.get().content)["products"]}
+        self.assertNotIn("Renamed", names)
+        self.assertIn("Renamed", {p["name"] for p in json.loads(self.get().content)["products"]})
+
+    def test_delta_since_version(self):
+        self.edit(self.products[0], name="Seen")
+        version = json.loads(self.get().content)["version"]
+        self.edit(self.products[1], price=Decimal("1.00"))
+        with self.captureOnCommitCallbacks(execute=True):
+            gone = self.products[2].pk
+            self.products[2].delete()
+
+        delta = self.get(since=version).json()
+        self.assertEqual(delta["since"], version)
+        self.assertEqual([p["id"] for p in delta["products"] if p["price"] == "1.00"], [self.products[1].pk])
+        self.assertEqual(delta["removed"], [gone])
+        self.assertEqual(delta["version"], json.loads(self.get().content)["version"])
+
+    def test_unknown_version_gets_the_full_snapshot(self):
+        data = self.get(since=999999).json()
+        self.assertNotIn("since", data)
+        self.assertEqual(len(data["products"]), 3)
+        self.assertEqual(self.get(since="x").status_code, 400)
+
+    def test_deleting_a_category_reaches_its_products(self):
+        self.edit(self.products[0], name="Seen")
+        version = json.loads(self.get().content)["version"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.delete()
+
+        delta = self.get(since=version).json()
+        self.assertEqual(delta["categories"], [])
+        self.assertEqual({p["category"] for p in delta["products"]}, {None})
+        self.assertEqual(len(delta["products"]), 3)
+
+    def test_old_changes_are_pruned(self):
+        self.edit(self.products[0], name="Old")
+        old = catalogue.current_version()
+        CatalogueChange.objects.update(created_at=timezone.now() - timedelta(days=30))
+        self.edit(self.products[1], name="New")
+
+        catalogue.prune_changes()
+        self.assertFalse(CatalogueChange.objects.filter(pk__lte=old).exists())
+        self.assertNotIn("since", self.get(since=old).json())
+
+
+class BenchmarkSuiteTests(TestCase):
+    def test_run_saves_every_endpoint(self):
+        path = os.path.join(tempfile.mkdtemp(), "results.json")
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        call_command(
+            "bench_api", "--users", "2", "--products", "20", "--orders", "20", "--iterations", "1",
+            "--output", path, "--max-queries", "1000", stdout=StringIO(), stderr=StringIO(),
+        )
+
+        with open(path) as f:
+            endpoints = json.load(f)["endpoints"]
+        self.assertIn("POST /api/orders/place/ (wallet)", endpoints)
+        self.assertIn("GET /api/admin/reports/sales/", endpoints)
+        self.assertEqual(sum(e["errors"] for e in endpoints.values()), 0)
+        self.assertFalse(User.objects.filter(username__startswith="bench-").exists())
+
+    def test_check_against_baseline(self):
+        def doc(p95, queries, errors=0):
+            return {"endpoints": {"GET /x": {"requests": 10, "errors": errors, "p95_ms": p95, "queries_mean": queries}}}
+
+        self.assertEqual(check(doc(11, 3), doc(10, 3), max_regression=0.25, max_query_increase=0), [])
+        self.assertEqual(len(check(doc(14, 3), doc(10, 3), max_regression=0.25)), 1)
+        self.assertEqual(len(check(doc(10, 4), doc(10, 3), max_query_increase=0.5)), 1)
+        self.assertEqual(len(check(doc(10, 3, errors=1))), 1)
+
+
+class QueryPlanAuditTests(CheckoutTestCase):
+    def statements(self, fn):
+        log = QueryLog()
+        with connection.execute_wrapper(log):
+            fn()
+        return [explain(statement) for statement in log.statements.values()]
+
+    def test_hot_lookups_use_the_composite_indexes(self):
+        make_products(2, self.category)
+        statement, = self.statements(
+            lambda: list(Order.objects.filter(user=self.user).order_by("-created_at", "-id").values_list("id"))
+        )
+        self.assertIn("order_user_created", "\n".join(statement.plan))
+
+        for lookup in (get_user_product_counts, get_user_top_categories):
+            with self.subTest(lookup=lookup.__name__):
+                statement, = self.statements(lambda: lookup(self.user))
+                self.assertIn("orderitem_user_created", "\n".join(statement.plan))
+                self.assertNotIn("myapp_order ", "\n".join(statement.plan) + " ")
+                self.assertEqual(statement.scans, [])
+
+        statement, = self.statements(get_global_product_popularity)
+        self.assertIn("orderitem_created", "\n".join(statement.plan))
+
+        statement, = self.statements(lambda: list(Product.objects.filter(stock__gt=0, category=self.category)))
+        self.assertIn("product_instock_category", "\n".join(statement.plan))
+
+    def test_full_scans_are_reported(self):
+        statement, = self.statements(lambda: list(Product.objects.filter(description__contains="milk")))
+        self.assertEqual(statement.scans, ["myapp_product"])
+        self.assertFalse(statement.whole_table)
+
+        statement, = self.statements(lambda: list(Category.objects.all()))
+        self.assertTrue(statement.whole_table)
+
+    def test_order_list_queries_do_not_grow_with_orders(self):
+        products = make_products(2, self.category)
+
+        def count():
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get("/api/orders/").status_code, 200)
+            return len(queries)
+
+        self.fill_cart(products)
+        self.checkout()
+        one = count()
+        for _ in range(3):
+            self.fill_cart(products)
+            self.checkout()
+        self.assertEqual(count(), one)
+
+    def test_audit_passes_on_the_app(self):
+        out = StringIO()
+        call_command(
+            "audit_query_plans", "--users", "2", "--products", "20", "--orders", "20", "--strict",
+            stdout=out, stderr=StringIO(),
+        )
+        self.assertIn("0 with a full table scan", out.getvalue())
+        self.assertFalse(User.objects.filter(username__startswith="bench-").exists())
+
+
+class PurchaseHistoryTests(RecommendationTestCase):
+    def test_checkout_copies_user_time_and_category(self):
+        for item in OrderItem.objects.select_related("order", "product"):
+            self.assertEqual(item.user_id, item.order.user_id)
+            self.assertEqual(item.created_at, item.order.created_at)
+            self.assertEqual(item.category_id, item.product.category_id)
+
+    def test_category_is_kept_from_purchase_time(self):
+        Product.objects.filter(pk__in=[p.pk for p in self.apples]).update(category=self.category)
+
+        self.assertIn(self.fruit.id, get_user_top_categories(self.user)[0])
+        call_command("check_order_item_history", stdout=StringIO())
+
+    def test_check_and_backfill(self):
+        intruder = User.objects.create_user(username="mallory")
+        OrderItem.objects.update(created_at=None, category=None)
+        OrderItem.objects.filter(pk=OrderItem.objects.first().pk).update(user=intruder, created_at=timezone.now())
+        stale = list(find_stale())
+        self.assertEqual(len(stale), OrderItem.objects.count() + 1)  # the intruder's row is wrong twice
+        with self.assertRaises(CommandError):
+            call_command("check_order_item_history", stdout=StringIO())
+
+        self.assertEqual(backfill_history(chunk_size=2), OrderItem.objects.count())
+        call_command("check_order_item_history", stdout=StringIO())
+        self.assertEqual(backfill_history(), 0)
+        self.test_checkout_copies_user_time_and_category()
+
+    def test_helpers_match_the_joined_queries(self):
+        since = timezone.now() - timedelta(days=365)
+        joined = (
+            OrderItem.objects.filter(order__user=self.user, order__created_at__gte=since)
+            .values("product_id").annotate(qty=Sum("quantity"))
+        )
+        self.assertEqual(get_user_product_counts(self.user), {r["product_id"]: r["qty"] for r in joined})
+        self.assertEqual(get_global_product_popularity(), {r["product_id"]: r["qty"] for r in joined})
+        self.assertEqual(get_user_top_categories(self.user), ({self.category.id, self.fruit.id}, ["Dairy", "Fruit"]))
+
+
+class ScoringEngineTests(TestCase):
+    def setUp(self):
+        rng = random.Random(7)
+        categories = [Category.objects.create(name=f"C{i}") for i in range(5)]
+        Product.objects.bulk_create([
+            Product(
+                name=f"P{i}", price=Decimal(rng.randint(100, 2000)) / 100, stock=rng.randint(0, 3),
+                category=rng.choice(categories + [None]),
+            )
+            for i in range(400)
+        ])
+        ids = list(Product.objects.values_list("id", flat=True))
+
+        self.top_category_ids = {categories[0].id, categories[3].id}
+        # small ranges so that many candidates tie on (score, popularity)
+        self.user_qty = {pid: rng.randint(1, 5) for pid in rng.sample(ids, 60)}
+        self.global_qty = {pid: rng.choice([1, 4, 4, 9, 300]) for pid in rng.sample(ids, 120)}
+        self.excluded = set(rng.sample(ids, 30))
+        self.cart_related = {pid: rng.randint(1, 14) for pid in rng.sample(ids, 80)}
+        self.candidates = Product.objects.filter(stock__gt=0).order_by("id")
+
+    def test_matches_get_score_ordering(self):
+        for cart_related in (None, self.cart_related):
+            expected = score_with_loop(
+                self.candidates.exclude(id__in=self.excluded), self.top_category_ids, self.user_qty, self.global_qty,
+                cart_related,
+            )
+
+            for limit in (None, 0, 1, 7, 50, 1000):
+                with self.subTest(limit=limit, cart=bool(cart_related)):
+                    items = handle_recommendation(
+                        self.candidates, self.top_category_ids, self.user_qty, self.global_qty, self.excluded,
+                        limit=limit, cart_related=cart_related,
+                    )
+                    self.assertEqual(items, expected[:limit])
+
+    def test_no_signals(self):
+        self.assertEqual(handle_recommendation(self.candidates, set(), {}, {}, set()), [])
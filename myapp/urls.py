@@ -1,7 +1,9 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
 from .views import *
+from . import async_views
 
 router = DefaultRouter()
 router.register("cart", CartViewSet, basename="cart")
@@ -16,7 +18,10 @@ urlpatterns = [
 
     # Products
     path("api/products/", ProductListCreate.as_view()),
+    path("api/products/search/", ProductSearch.as_view()),
     path("api/products/<int:pk>/", ProductDetail.as_view()),
+    path("api/products/<int:pk>/related/", related_products),
+    path("api/catalogue/", catalogue),
 
     # Address
     path("api/addresses/", AddressListCreate.as_view()),
@@ -24,17 +29,22 @@ urlpatterns = [
     # Orders
     path("api/orders/", OrderList.as_view()),
     path("api/orders/place/", place_order),
+    path("api/orders/hold/", hold_order_stock),
 
     # Recommendation
     path("api/recommendation/", recommend),
 
     # Admin 
     path("api/admin/products/add/", ProductListCreate.as_view()),
+    path("api/admin/products/bulk/", admin_product_bulk_import),
+    path("api/admin/products/export/", admin_product_export),
     path("api/admin/products/<int:pk>/", ProductDetail.as_view()),
     path("api/", include(router.urls)),
     path("api/admin/orders/", admin_order_list, name="admin-order-list"),
     path("api/admin/orders/<int:pk>/", admin_order_detail, name="admin-order-detail"),
     path("api/admin/reports/sales/", product_sales_report, name="product-sales-report"),
+    path("api/admin/cache/stats/", admin_cache_stats, name="admin-cache-stats"),
+    path("api/admin/metrics/", admin_metrics, name="admin-metrics"),
 
     # Wallet
     path("api/wallet/", get_wallet),
@@ -48,3 +58,17 @@ urlpatterns = [
     path("api/check-auth/", check_auth),
     
 ] 
+
+# Served over ASGI (settings.ASYNC_API) the read-heavy endpoints run as
+# coroutines; listed first so they win over the sync routes for the same paths.
+async_urlpatterns = [
+    path("api/products/", async_views.product_list),
+    path("api/products/<int:pk>/", async_views.product),
+    path("api/cart/", async_views.cart),
+    path("api/wallet/", async_views.wallet),
+    path("api/recommendation/", async_views.recommendations),
+    path("api/check-auth/", async_views.check_auth),
+]
+
+if settings.ASYNC_API:
+    urlpatterns = async_urlpatterns + urlpatterns
@@ -1,14 +1,14 @@
 from django.shortcuts import render, get_object_or_404
 from rest_framework import generics, viewsets, status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser, BasePermission, SAFE_METHODS
 from decimal import Decimal
 import uuid
 from django.contrib.auth.models import User
 from .serializers import ProductSerializer, UserSerializer
-from django.db.models import Sum, F
-from .models import Category, Product, CartItem, Order, OrderItem, Address, Wallet, WalletTransaction
+from django.db.models import F
+from .models import Category, Product, CartItem, Order, Address, Wallet
 from .serializers import (
     CategorySerializer,
     ProductSerializer,
@@ -16,11 +16,31 @@ from .serializers import (
     OrderSerializer,
     AddressSerializer
 )
-from .services.recommendation import recommend_for_user
+from .services.recommendation import recommend_for_user, get_stored_recommendations
+from .services.checkout import place_order_from_cart, CheckoutError
+from .services.inventory import hold_cart, InsufficientStock
+from .services.wallet import credit, parse_idempotency_key, WalletError
+from .services.cache import cache_stats
+from .services.metrics import registry as metrics
+from .services.copurchase import get_related
+from .pagination import KeysetPagination, OffsetPagination
+from .services.search import search_products
+from .services.product_io import ProductImporter, ImportFileError, iter_rows, export_rows, detect_format, FORMATS
+from .services.orders import admin_orders, filter_orders, parse_bound, export_orders
+from .services.read_models import category_list, product_detail, wallet_summary
+from .services.catalogue import catalogue_snapshot, catalogue_delta
+from .services.cart import cart_snapshot, snapshot_etag, parse_lines, replace_cart, apply_cart_deltas, CartError
+from .services.sales import sales_report, sync_order_sales, GROUP_BY, PERIODS, PAID
+from django.db import transaction
+from datetime import date
+from django.utils.http import parse_etags
+from django.http import HttpResponse, StreamingHttpResponse
+from rest_framework.exceptions import ValidationError
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate, login, logout
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.views.decorators.http import require_GET
 from django.utils.decorators import method_decorator
 import json
 
@@ -52,6 +72,9 @@ class CategoryListCreate(generics.ListCreateAPIView):
     serializer_class = CategorySerializer
     permission_classes = [IsAdminOrReadOnly]
 
+    def list(self, request, *args, **kwargs):
+        return Response(category_list())
+
 
 class CategoryDetail(generics.RetrieveUpdateDestroyAPIView):
     queryset = Category.objects.all()
@@ -65,9 +88,38 @@ class CategoryDetail(generics.RetrieveUpdateDestroyAPIView):
 
 @method_decorator(csrf_protect, name="dispatch")
 class ProductListCreate(generics.ListCreateAPIView):
-    queryset = Product.objects.all().order_by("-created_at")
     serializer_class = ProductSerializer
     permission_classes = [IsAdminOrReadOnly]
+    pagination_class = KeysetPagination
+
+    def get_requested_fields(self):
+        # ?fields=id,name,price on GET; None means every field
+        param = self.request.query_params.get("fields")
+        if self.request.method != "GET" or not param:
+            return None
+
+        fields = [f.strip() for f in param.split(",") if f.strip()]
+        unknown = set(fields) - set(ProductSerializer().fields)
+        if unknown:
+            raise ValidationError({"fields": f"Unknown fields: {', '.join(sorted(unknown))}"})
+        return fields
+
+    def get_queryset(self):
+        fields = self.get_requested_fields()
+        if fields is None:
+            return Product.objects.select_related("category")
+
+        # Load only the columns behind the requested fields, plus the cursor keys.
+        serializer_fields = ProductSerializer().fields
+        columns = {"id", "created_at"} | {serializer_fields[f].source.replace(".", "__") for f in fields}
+        queryset = Product.objects.only(*columns)
+        if "category_name" in fields:
+            queryset = queryset.select_related("category")
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault("fields", self.get_requested_fields())
+        return super().get_serializer(*args, **kwargs)
 
 
 class ProductDetail(generics.RetrieveUpdateDestroyAPIView):
@@ -75,6 +127,76 @@ class ProductDetail(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = ProductSerializer
     permission_classes = [IsAdminOrReadOnly]
 
+    def retrieve(self, request, *args, **kwargs):
+        data = product_detail(kwargs["pk"])
+        if data is None:
+            return Response({"detail": "Not found."}, status=404)
+        return Response(data)
+
+
+class ProductSearch(generics.ListAPIView):
+    serializer_class = ProductSerializer
+    pagination_class = OffsetPagination
+
+    def get_queryset(self):
+        params = self.request.query_params
+        filters = {"in_stock": params.get("in_stock", "").lower() in ("1", "true", "yes")}
+        errors = {}
+
+        for name, cast in (("category", int), ("min_price", Decimal), ("max_price", Decimal)):
+            value = params.get(name)
+            if value in (None, ""):
+                continue
+            try:
+                filters[name] = cast(value)
+            except (ValueError, ArithmeticError):
+                errors[name] = "Invalid value"
+        if errors:
+            raise ValidationError(errors)
+
+        return search_products(params.get("q", ""), **filters)
+
+
+@api_view(["GET"])
+def related_products(request, pk):
+    limit = OffsetPagination.get_int(request, "limit", 10, 1, 50)
+    return Response([
+        {
+            "product_id": n.neighbor.id,
+            "product_name": n.neighbor.name,
+            "product_img": n.neighbor.image_url,
+            "product_price": n.neighbor.price,
+            "score": n.score,
+        }
+        for n in get_related(pk, limit)
+    ])
+
+
+@require_GET
+def catalogue(request):
+    """
+    Categories and product summaries as one prebuilt JSON body. A plain view,
+    so no session or ORM work happens while the snapshot is current.
+    ?since=<version> answers with just the products changed after it, or
+    the full snapshot when that version is too old to diff against.
+    """
+    since = request.GET.get("since")
+    if since:
+        try:
+            delta = catalogue_delta(int(since))
+        except ValueError:
+            return JsonResponse({"detail": "since must be a version number"}, status=400)
+        if delta is not None:
+            return JsonResponse(delta, headers={"Cache-Control": "no-cache"})
+
+    snapshot = catalogue_snapshot()
+    # public: the same body for everyone, revalidated on every page load
+    headers = {"ETag": snapshot["etag"], "Cache-Control": "public, no-cache"}
+    if_none_match = parse_etags(request.headers.get("If-None-Match", ""))
+    if snapshot["etag"] in if_none_match or "*" in if_none_match:
+        return HttpResponse(status=304, headers=headers)
+    return HttpResponse(snapshot["body"], content_type="application/json", headers=headers)
+
 
 # ------------------------------------------
 # CART
@@ -84,9 +206,20 @@ class CartViewSet(viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
 
     def list(self, request):
-        items = CartItem.objects.filter(user=request.user)
-        serializer = CartItemSerializer(items, many=True)
-        return Response(serializer.data)
+        """
+        Lines with a compact product projection, plus subtotal, shipping_fee
+        and total. Polled by the app, so an unchanged cart answers a matching
+        If-None-Match with 304 and no body.
+        """
+        snapshot = cart_snapshot(request.user)
+        etag = snapshot_etag(snapshot)
+        # no-cache: browsers keep the body but revalidate on every poll
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+        if_none_match = parse_etags(request.headers.get("If-None-Match", ""))
+        if etag in if_none_match or "*" in if_none_match:
+            return Response(status=304, headers=headers)
+        return Response(snapshot, headers=headers)
 
     def create(self, request):
         product_id = request.data.get("product_id")
@@ -106,12 +239,33 @@ class CartViewSet(viewsets.ViewSet):
             defaults={"quantity": quantity},   
         )
 
-        if not created: 
-            item.quantity += quantity
-            item.save()
+        if not created:
+            # in SQL, so two quick adds of the same product both count
+            CartItem.objects.filter(pk=item.pk).update(quantity=F("quantity") + quantity)
+            item.refresh_from_db(fields=["quantity"])
 
         return Response(CartItemSerializer(item).data, status=201)
     
+    @action(detail=False, methods=["put"])
+    def sync(self, request):
+        """
+        Several cart changes in one request. {"items": [{product_id, quantity}]}
+        makes the cart exactly that (quantity 0 drops a line); {"deltas": [...]}
+        adds to what is there instead. Responds with the new cart, as GET does.
+        """
+        try:
+            if "deltas" in request.data:
+                apply_cart_deltas(request.user, parse_lines(request.data["deltas"], relative=True))
+            elif "items" in request.data:
+                replace_cart(request.user, parse_lines(request.data["items"]))
+            else:
+                return Response({"error": "Send items or deltas"}, status=400)
+        except CartError as e:
+            return Response({"error": str(e)}, status=400)
+
+        snapshot = cart_snapshot(request.user)
+        return Response(snapshot, headers={"ETag": snapshot_etag(snapshot)})
+
     def partial_update(self, request, pk=None):
         try:
             item = CartItem.objects.get(pk=pk, user=request.user)
@@ -165,7 +319,12 @@ class OrderList(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user).order_by("-created_at")
+        # newest first along order_user_created; user, address and items without a query per order
+        return (
+            Order.objects.filter(user=self.request.user)
+            .select_related("user", "address").prefetch_related("items")
+            .order_by("-created_at", "-id")
+        )
 
 
 @api_view(["POST"])
@@ -183,65 +342,31 @@ def place_order(request):
     except Address.DoesNotExist:
         return Response({"error": "Invalid address"}, status=404)
 
-    cart_items = CartItem.objects.filter(user=user)
-    if not cart_items.exists():
-        return Response({"error": "Cart empty"}, status=400)
-    
-    if payment == "paypal" or payment =="wallet":
-        is_paid = "paid"
-    else:
-        is_paid = "unpaid"
-
-    # --- Create order ---
-    order = Order.objects.create(
-        user=user,
-        address=address,
-        total_amount=0,
-        status="pending",
-        payment_status=is_paid,
-    )
-
-    total = 0
-    for item in cart_items:
-        subtotal = item.quantity * item.product.price
-        OrderItem.objects.create(
-            order=order,
-            product=item.product,
-            product_name=item.product.name,
-            unit_price=item.product.price,
-            quantity=item.quantity,
-            subtotal=subtotal,
-        )
-        # reduce stock
-        if payment == "paypal":
-            item.product.stock -= item.quantity
-            item.product.save()
+    try:
+        key = parse_idempotency_key(request.headers.get("Idempotency-Key"))
+    except WalletError as e:
+        return Response({"error": str(e)}, status=400)
 
-        total += subtotal
+    try:
+        order = place_order_from_cart(user, address, payment, key)
+    except CheckoutError as e:
+        return Response({"error": str(e)}, status=400)
 
-    shipping_fee = Decimal("5.00") if total < 50 else Decimal("0.00")
-    
-    order.total_amount = total
-    order.shipping_fee = shipping_fee
-    order.save()
+    return Response({"message": "Order placed", "order_id": order.id}, status=201)
 
-    cart_items.delete()
 
-    if payment == "wallet":
-        wallet = Wallet.objects.get(user=user)
-        if wallet.balance < order.total_amount:
-            return Response({"detail": "Insufficient balance"}, status=400)
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def hold_order_stock(request):
+    try:
+        expires_at = hold_cart(request.user)
+    except InsufficientStock as e:
+        return Response({"error": str(e)}, status=400)
 
-        wallet.balance -= order.total_amount
-        wallet.save()
+    if expires_at is None:
+        return Response({"error": "Cart empty"}, status=400)
 
-        WalletTransaction.objects.create(
-            wallet=wallet,
-            amount=order.total_amount,
-            type="payment",
-            reference=f"Order #{order.id}"
-        )
-    return Response({"message": "Order placed", "order_id": order.id}, status=201)
+    return Response({"message": "Stock held", "expires_at": expires_at})
 
 
 # ------------------------------------------
@@ -251,15 +376,10 @@ def place_order(request):
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def get_wallet(request):
-    try: 
-        wallet = Wallet.objects.get(user=request.user)
-        return Response({
-            "id": wallet.id,
-            "balance": float(wallet.balance),
-            "wallet_address": wallet.wallet_address
-        })
-    except Wallet.DoesNotExist:
+    wallet = wallet_summary(request.user.id)
+    if wallet is None:
         return Response({"detail": "No wallet found"}, status=404)
+    return Response(wallet)
 
 
 @api_view(["POST"])
@@ -291,22 +411,12 @@ def topup_wallet(request):
         return Response({"detail": "Invalid amount"}, status=400)
     
     try:
-        wallet = Wallet.objects.get(user=request.user)
-    except Wallet.DoesNotExist:
-        return Response({"detail": "No wallet found"}, status=400)
-    
-    wallet.balance += amount
-    wallet.save()
-
-    WalletTransaction.objects.create(
-        wallet=wallet,
-        amount=amount,
-        type="deposit",
-        reference="Manual top-up"
-    )
+        entry = credit(request.user, amount, "Manual top-up", parse_idempotency_key(request.headers.get("Idempotency-Key")))
+    except WalletError as e:
+        return Response({"detail": str(e)}, status=400)
 
     return Response({
-        "balance": float(wallet.balance),
+        "balance": float(entry.balance_after),
         "message": f"Successfully added {amount} TFT"
     })
 
@@ -374,6 +484,9 @@ def check_auth(request):
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def recommend(request):
+    stored = get_stored_recommendations(request.user)
+    if stored is not None:
+        return Response(stored)
     return Response(recommend_for_user(user=request.user, exclude_bought=False))
 
 
@@ -384,28 +497,60 @@ def recommend(request):
 @api_view(["GET"])
 @permission_classes([IsAdminUser])
 def admin_order_list(request):
-    orders = Order.objects.all().order_by("-created_at")
-    serializer = OrderSerializer(orders, many=True)
-    return Response(serializer.data)
+    """
+    Newest orders first, a page at a time (?cursor=, ?page_size=).
+    Filters: ?status=, ?payment_status=, ?created_from= and ?created_to=
+    (ISO dates or datetimes). ?fmt=ndjson streams every matching order instead.
+    """
+    params = request.query_params
+    filters = {"status": params.get("status"), "payment_status": params.get("payment_status")}
+    errors = {}
+
+    for name, choices in (("status", Order.STATUS_CHOICES), ("payment_status", Order.PAYMENT_STATUS)):
+        if filters[name] and filters[name] not in dict(choices):
+            errors[name] = "Invalid value"
+    for name in ("created_from", "created_to"):
+        if params.get(name):
+            try:
+                filters[name] = parse_bound(params[name], end=name == "created_to")
+            except ValueError:
+                errors[name] = "Invalid date"
+    if errors:
+        return Response(errors, status=400)
+
+    orders = filter_orders(admin_orders(), **filters)
+
+    if params.get("fmt") == "ndjson":
+        response = StreamingHttpResponse(export_orders(orders), content_type="application/x-ndjson")
+        response["Content-Disposition"] = 'attachment; filename="orders.ndjson"'
+        return response
+
+    paginator = KeysetPagination()
+    page = paginator.paginate_queryset(orders, request)
+    return paginator.get_paginated_response(OrderSerializer(page, many=True).data)
 
 @api_view(["PUT"])
 @permission_classes([IsAdminUser])
 def admin_order_detail(request, pk):
-    try:
-        order = Order.objects.get(pk=pk)
-    except Order.DoesNotExist:
-        return Response({"error": "Order not found"}, status=404)
-
     new_status = request.data.get("status")
     new_payment_status = request.data.get("payment_status")
 
-    if new_status:
-        order.status = new_status
-        order.save()
+    with transaction.atomic():
+        try:
+            # locked so two admins flipping payment status can't both count the sale
+            order = Order.objects.select_for_update().get(pk=pk)
+        except Order.DoesNotExist:
+            return Response({"error": "Order not found"}, status=404)
+        was_paid = order.payment_status == PAID
+
+        if new_status:
+            order.status = new_status
+            order.save()
 
-    if new_payment_status:
-        order.payment_status = new_payment_status
-        order.save()
+        if new_payment_status:
+            order.payment_status = new_payment_status
+            order.save()
+            sync_order_sales(order, was_paid)
 
     return Response({"message": "Order updated", "order": OrderSerializer(order).data})
 
@@ -414,20 +559,80 @@ def admin_order_detail(request, pk):
 @permission_classes([IsAdminUser])
 def product_sales_report(request):
     """
-    Returns total quantity sold and total revenue per product.
+    Total quantity sold and revenue from paid orders, answered from the daily
+    rollups. ?from= and ?to= are inclusive dates. ?group_by=product (default),
+    category or none; ?period=day, week or month adds a row per period.
     """
-    sales = (
-        OrderItem.objects
-        .filter(order__payment_status="paid")
-        .values("product__id", "product_name")
-        .annotate(
-            total_quantity=Sum("quantity"),
-            total_revenue=Sum(F("quantity") * F("unit_price"))
-        )
-        .order_by("-total_revenue")
+    params = request.query_params
+    group_by = params.get("group_by", "product")
+    period = params.get("period") or None
+    errors = {}
+
+    if group_by not in GROUP_BY and group_by != "none":
+        errors["group_by"] = "Invalid value"
+    if period and period not in PERIODS:
+        errors["period"] = "Invalid value"
+    bounds = {}
+    for name in ("from", "to"):
+        if params.get(name):
+            try:
+                bounds[name] = date.fromisoformat(params[name])
+            except ValueError:
+                errors[name] = "Invalid date"
+    if errors:
+        return Response(errors, status=400)
+
+    sales = sales_report(
+        bounds.get("from"), bounds.get("to"), None if group_by == "none" else group_by, period
     )
     return Response(sales)
 
+@api_view(["POST"])
+@permission_classes([IsAdminUser])
+def admin_product_bulk_import(request):
+    """
+    Upsert products by sku from an uploaded CSV/JSONL file (multipart field "file").
+    ?fmt=csv|jsonl overrides the file extension.
+    """
+    upload = request.FILES.get("file")
+    if upload is None:
+        return Response({"error": "Upload a CSV or JSONL file as 'file'"}, status=400)
+
+    fmt = request.query_params.get("fmt") or detect_format(upload.name)
+    if fmt not in FORMATS:
+        return Response({"error": f"Unsupported format: {fmt}"}, status=400)
+
+    importer = ProductImporter()
+    try:
+        importer.run(iter_rows(upload, fmt))
+    except ImportFileError as e:
+        # rows before the unreadable part are already saved; the report says how many
+        return Response({"error": str(e), **importer.report()}, status=400)
+    return Response(importer.report())
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def admin_product_export(request):
+    fmt = request.query_params.get("fmt", "csv")
+    if fmt not in FORMATS:
+        return Response({"error": f"Unsupported format: {fmt}"}, status=400)
+
+    content_type = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    response = StreamingHttpResponse(export_rows(fmt), content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="products.{fmt}"'
+    return response
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def admin_cache_stats(request):
+    return Response(cache_stats())
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def admin_metrics(request):
+    # this process's numbers only; scrape every worker
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
 class AdminCustomerViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
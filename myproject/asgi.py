@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myproject.settings')
+# route the read-heavy endpoints to their async views (see settings.ASYNC_API)
+os.environ.setdefault('ASYNC_API', 'True')
 
 application = get_asgi_application()
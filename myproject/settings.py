@@ -19,9 +19,15 @@ load_dotenv()
 
 GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
 
+# Summarizer used by the run_ai_worker queue; FakeSummarizer works offline.
+AI_SUMMARIZER = os.getenv('AI_SUMMARIZER', 'myapp.services.ai.GeminiSummarizer')
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Columnar order history written by export_order_history, read offline.
+ANALYTICS_DIR = os.getenv('ANALYTICS_DIR', BASE_DIR / 'analytics')
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
@@ -50,6 +56,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'myapp.middleware.RequestMetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -106,6 +113,65 @@ DATABASES = {
     'default': dj_database_url.parse(os.getenv('DATABASE_URL', 'sqlite:///db.sqlite3'))
 }
 
+# SQLite only allows one writer; take the write lock when the transaction
+# starts so concurrent checkouts queue up instead of failing with "database is locked".
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    DATABASES['default'].setdefault('OPTIONS', {}).update({
+        'transaction_mode': 'IMMEDIATE',
+        'timeout': 20,
+    })
+
+
+# Cache
+# Set REDIS_URL (e.g. redis://localhost:6379/0) in production so every worker
+# shares one cache. Without it each process falls back to local memory, which
+# is what tests and local runs use. CACHE_BACKEND/CACHE_LOCATION override both.
+
+REDIS_URL = os.getenv('REDIS_URL')
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.redis.RedisCache' if REDIS_URL
+            else 'django.core.cache.backends.locmem.LocMemCache',
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', REDIS_URL or 'grocery'),
+    }
+}
+
+# Sessions
+# With a shared cache, sessions are read from it and written through to the
+# database. A per-process cache would keep a session alive in one worker after
+# it was logged out in another, so without REDIS_URL they stay in the database.
+
+SESSION_ENGINE = os.getenv(
+    'SESSION_ENGINE',
+    'django.contrib.sessions.backends.cached_db' if REDIS_URL else 'django.contrib.sessions.backends.db',
+)
+
+# Read-model cache
+# Category lists, product detail (with live stock) and wallet balances are
+# cached for a few minutes and dropped on commit of a change, which only
+# reaches every worker through a shared cache. Without REDIS_URL they are read
+# from the database, like sessions.
+
+READ_MODEL_CACHE = os.getenv('READ_MODEL_CACHE', str(bool(REDIS_URL))) == 'True'
+
+# Serving mode
+# asgi.py turns this on, so under uvicorn workers the read-heavy endpoints
+# are routed to the coroutines in myapp.async_views. WSGI keeps the sync views.
+
+ASYNC_API = os.getenv('ASYNC_API', 'False') == 'True'
+
+# Request metrics
+# Every request is timed and counted. METRICS_SAMPLE_RATE of them also have
+# their queries counted, timed and checked for one statement repeated
+# METRICS_DUPLICATE_THRESHOLD times or more (usually an N+1 loop).
+
+METRICS_SAMPLE_RATE = float(os.getenv('METRICS_SAMPLE_RATE', '0.1'))
+METRICS_DUPLICATE_THRESHOLD = int(os.getenv('METRICS_DUPLICATE_THRESHOLD', '5'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -1,4 +1,4 @@
-import { createContext, useContext, useEffect, useState, useCallback } from "react";
+import { createContext, useContext, useEffect, useState, useCallback, useRef } from "react";
 import { getCookie } from "../utils/cookieUtils";
 import axios from "axios";
 
@@ -12,6 +12,7 @@ export default function CartProvider({ children }) {
   const [cart, setCart] = useState([]);
   const [orders, setOrders] = useState([]);
   const [adminOrders, setAdminOrders] = useState([]);
+  const [adminOrdersCursors, setAdminOrdersCursors] = useState({ next: null, previous: null });
   const [productIdToDelete, setProductIdToDelete] = useState(null);
   const [showLogin, setShowLogin] = useState(null);
   const [showSignup, setShowSignup] = useState(null);
@@ -22,9 +23,11 @@ export default function CartProvider({ children }) {
   const [walletLoading, setWalletLoading] = useState(true);
   const [alert, setAlert] = useState({ message: "", type: "" });
 
-  const total = cart.reduce((sum, item) => sum + item.product.price * item.quantity, 0);
-  const SHIPPING_FEE = total >= 50 ? 0 : 5;
-  const finalTotal = total + SHIPPING_FEE;
+  const [cartTotals, setCartTotals] = useState({ subtotal: 0, shipping_fee: 0, total: 0 });
+  // computed by the server with the same shipping rule checkout applies
+  const total = Number(cartTotals.subtotal);
+  const SHIPPING_FEE = Number(cartTotals.shipping_fee);
+  const finalTotal = Number(cartTotals.total);
   const MYR_TO_USD = 0.25;
   const fallback_img = "https://placehold.co/400x200/111827/9ca3af?text=No+Image";
 
@@ -58,8 +61,26 @@ export default function CartProvider({ children }) {
     axios.get("/api/categories/").then((res) => setCategories(res.data));
   }, []);
 
-  const fetchProducts = useCallback(() => {
-    axios.get("/api/products/").then((res) => setProducts(res.data));
+  const fetchProducts = useCallback(async () => {
+    // The catalogue is cursor-paginated; follow `next` until the last page.
+    let url = "/api/products/?page_size=200";
+    let all = [];
+    while (url) {
+      const res = await axios.get(url);
+      const data = res.data;
+      all = all.concat(Array.isArray(data) ? data : data.results || []);
+      url = Array.isArray(data) ? null : data.next;
+    }
+    setProducts(all);
+  }, []);
+
+  const fetchCatalogue = useCallback(() => {
+    // Categories and product summaries in one prebuilt, ETag'd response.
+    // The admin products page loads the full rows through fetchProducts.
+    axios.get("/api/catalogue/").then((res) => {
+      setCategories(res.data.categories);
+      setProducts(res.data.products);
+    });
   }, []);
 
   const refreshCart = useCallback(() => {
@@ -69,16 +90,16 @@ export default function CartProvider({ children }) {
         return res.json();
       })
       .then((data) => {
-        Array.isArray(data) ? setCart(data) : setCart([]);
+        setCart(data && Array.isArray(data.items) ? data.items : []);
+        setCartTotals(data || { subtotal: 0, shipping_fee: 0, total: 0 });
       })
       .catch(() => setCart([]));
   }, []);
 
   useEffect(() => {
     checkAuth();
-    fetchCategories();
-    fetchProducts();
-  }, [checkAuth, fetchWallet, fetchProducts, fetchCategories]);
+    fetchCatalogue();
+  }, [checkAuth, fetchCatalogue]);
 
   useEffect(() => {
     if (isAuthenticated) {
@@ -287,6 +308,17 @@ export default function CartProvider({ children }) {
     refreshCart();
   }, [refreshCart]);
   
+  const holdCart = useCallback(async () => {
+    const res = await fetch("/api/orders/hold/", {
+      method: "POST",
+      headers: { "X-CSRFToken": getCookie("csrftoken") },
+      credentials: "include",
+    });
+    if (!res.ok) {
+      setAlert({ message: "Some items in your cart are out of stock", type: "error" });
+    }
+  }, []);
+
   const fetchOrders = useCallback(async () => {
     const res = await fetch("/api/orders/", {
       headers: { "X-CSRFToken": getCookie("csrftoken") },
@@ -297,16 +329,39 @@ export default function CartProvider({ children }) {
     setOrders(Array.isArray(data) ? data : data.results || []);
   }, []);
 
-  const fetchAdminOrders = useCallback(async () => {
-    const res = await fetch("/api/admin/orders/", {
+  // Admin orders are cursor-paginated and the API only links forward, so the
+  // pages already visited are kept to step back through.
+  const adminOrdersPage = useRef({ url: "/api/admin/orders/", next: null, visited: [] });
+
+  const loadAdminOrders = useCallback(async (url, visited) => {
+    const res = await fetch(url, {
       headers: { "X-CSRFToken": getCookie("csrftoken") },
       credentials: "include",
     });
     const data = await res.json();
+    const next = Array.isArray(data) ? null : data.next;
 
+    adminOrdersPage.current = { url, next, visited };
     setAdminOrders(Array.isArray(data) ? data : data.results || []);
+    setAdminOrdersCursors({ next, previous: visited[visited.length - 1] ?? null });
   }, []);
 
+  // Reloads the page on screen, e.g. after an edit.
+  const fetchAdminOrders = useCallback(() => {
+    const { url, visited } = adminOrdersPage.current;
+    return loadAdminOrders(url, visited);
+  }, [loadAdminOrders]);
+
+  const fetchNextAdminOrders = useCallback(() => {
+    const { url, next, visited } = adminOrdersPage.current;
+    if (next) return loadAdminOrders(next, [...visited, url]);
+  }, [loadAdminOrders]);
+
+  const fetchPreviousAdminOrders = useCallback(() => {
+    const { visited } = adminOrdersPage.current;
+    if (visited.length) return loadAdminOrders(visited[visited.length - 1], visited.slice(0, -1));
+  }, [loadAdminOrders]);
+
   return (
     <CartContext.Provider
       value={{
@@ -322,9 +377,13 @@ export default function CartProvider({ children }) {
         deleteProduct,
         fetchCategories,
         fetchProducts,
+        fetchCatalogue,
         fetchOrders,
         fetchAdminOrders,
+        fetchNextAdminOrders,
+        fetchPreviousAdminOrders,
         placeOrder,
+        holdCart,
         fallback_img,
         formatOrderNumber,
         convertToUSD,
@@ -333,6 +392,7 @@ export default function CartProvider({ children }) {
         products, setProducts,
         orders, setOrders,
         adminOrders, setAdminOrders,
+        adminOrdersCursors,
         recommended, setRecommended,
         productIdToDelete, setProductIdToDelete,
         checkAuth, handleLogout,
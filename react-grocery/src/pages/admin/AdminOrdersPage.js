@@ -7,7 +7,14 @@ export default function AdminOrdersPage() {
   const [editingOrder, setEditingOrder] = useState(null);
   const [newStatus, setNewStatus] = useState("");
   const [newPaymentStatus, setNewPaymentStatus] = useState("");
-  const { adminOrders, fetchAdminOrders, formatOrderNumber } = useCart();
+  const {
+    adminOrders,
+    adminOrdersCursors,
+    fetchAdminOrders,
+    fetchNextAdminOrders,
+    fetchPreviousAdminOrders,
+    formatOrderNumber,
+  } = useCart();
 
   useEffect(() => {
     fetchAdminOrders();
@@ -153,6 +160,25 @@ export default function AdminOrdersPage() {
       ) : (
         <p className="orders-empty">You have no orders yet.</p>
       )}
+
+      {(adminOrdersCursors.previous || adminOrdersCursors.next) && (
+        <div className="orders-pagination">
+          <button
+            className="page-btn"
+            onClick={fetchPreviousAdminOrders}
+            disabled={!adminOrdersCursors.previous}
+          >
+            Previous
+          </button>
+          <button
+            className="page-btn"
+            onClick={fetchNextAdminOrders}
+            disabled={!adminOrdersCursors.next}
+          >
+            Next
+          </button>
+        </div>
+      )}
     </div>
   );
 }
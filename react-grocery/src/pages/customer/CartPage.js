@@ -4,14 +4,9 @@ import { useCart } from "../../contexts/CartContext";
 import "./CartPage.css";
 
 export default function CartPage() {
-  const { cart, refreshCart, removeFromCart, updateQuantity, formatPrice } = useCart();
+  const { cart, total, refreshCart, removeFromCart, updateQuantity, formatPrice } = useCart();
   const navigate = useNavigate();
 
-  const total = cart.reduce(
-    (sum, item) => sum + item.product.price * item.quantity,
-    0
-  );
-
   useEffect(() => {
     refreshCart();
   }, [refreshCart]);
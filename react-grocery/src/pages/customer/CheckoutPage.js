@@ -1,4 +1,4 @@
-import { useState } from "react";
+import { useEffect, useState } from "react";
 import { useNavigate } from "react-router-dom";
 import { useCart } from "../../contexts/CartContext";
 import { getCookie } from "../../utils/cookieUtils";
@@ -15,9 +15,13 @@ export default function CheckoutPage() {
     phone: "",
     payment: "",
   });
-  const { cart, total, SHIPPING_FEE, finalTotal, formatPrice, placeOrder, setAlert } = useCart();
+  const { cart, total, SHIPPING_FEE, finalTotal, formatPrice, placeOrder, holdCart, setAlert } = useCart();
   const navigate = useNavigate();
 
+  useEffect(() => {
+    holdCart();
+  }, [holdCart]);
+
   const handleSubmit = async (e) => {
     e.preventDefault();
 
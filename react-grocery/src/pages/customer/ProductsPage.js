@@ -1,5 +1,6 @@
-import { useState, useRef } from "react";
+import { useState, useRef, useEffect } from "react";
 import { Link } from "react-router-dom";
+import axios from "axios";
 import { useCart } from "../../contexts/CartContext";
 import "./ProductsPage.css";
 
@@ -8,13 +9,34 @@ export default function ProductsPage() {
   const [selectedCategory, setSelectedCategory] = useState("");
   const { addToCart, products, recommended, categories, fallback_img, formatPrice } = useCart();
 
+  const [searchResults, setSearchResults] = useState(null);
+
   const scrollRef = useRef(null);
 
-  const filteredProducts = products.filter((p) => {
-    const matchesName = p.name.toLowerCase().includes(searchTerm.toLowerCase());
-    const matchesCategory = selectedCategory ? p.category === Number(selectedCategory) : true;
-    return matchesName && matchesCategory;
-  });
+  // Search and category filtering run on the server; debounce typing.
+  useEffect(() => {
+    if (!searchTerm.trim() && !selectedCategory) {
+      setSearchResults(null);
+      return;
+    }
+
+    let cancelled = false;
+    const timer = setTimeout(() => {
+      axios
+        .get("/api/products/search/", {
+          params: { q: searchTerm, category: selectedCategory || undefined, page_size: 100 },
+        })
+        .then((res) => !cancelled && setSearchResults(res.data.results))
+        .catch(() => !cancelled && setSearchResults([]));
+    }, 250);
+
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [searchTerm, selectedCategory]);
+
+  const filteredProducts = searchResults ?? products;
 
   return (
     <div className="products-page">